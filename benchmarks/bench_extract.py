@@ -0,0 +1,79 @@
+"""Микро-бенчмарк извлечения popular_destinations из HTML-страницы
+
+Запуск из корня проекта:
+    python benchmarks/bench_extract.py --destinations 2000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from main import extract_destinations_data, iter_json_array
+
+
+def legacy_extract(html_content):
+    """The original ']}]' based extractor, kept for comparison"""
+    start_index = html_content.find('"popular_destinations":')
+    json_str = html_content[start_index:]
+    end_index = json_str.find(']}]')
+    json_str = json_str[:end_index + 3]
+    return json.loads('{' + json_str + '}')['popular_destinations']
+
+
+def make_page(n_destinations, origins_per_destination=10, padding_kb=512):
+    """Build a page shaped like aviasales.ru with an embedded destinations blob"""
+    destinations = []
+    for i in range(n_destinations):
+        destinations.append({
+            'destination_city': {'name': f'Город {i}', 'iata': f'C{i:02d}'[:3]},
+            'destination_country': {'name': f'Страна {i % 50}', 'iata': 'XX'},
+            'prices': [{
+                'origin_name': f'Вылет {j}',
+                'origin_iata': f'O{j:02d}'[:3],
+                'depart_date': '2025-04-30',
+                'return_date': '2025-05-09',
+                'price': {'value': 1000 + (i * 37 + j * 11) % 50000, 'currency': 'rub'},
+            } for j in range(origins_per_destination)],
+        })
+    blob = json.dumps({'popular_destinations': destinations}, ensure_ascii=False)
+    padding = '<div class="filler"></div>' * (padding_kb * 1024 // 26)
+    return f'<html><body>{padding}<script>window.__DATA__={blob};</script>{padding}</body></html>'
+
+
+def measure(func, page, repeat):
+    """Return the best wall time of func(page) over repeat runs"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(page)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--destinations', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    page = make_page(args.destinations)
+    size_mb = len(page.encode('utf-8')) / 2 ** 20
+    assert legacy_extract(page) == extract_destinations_data(page)
+
+    candidates = {
+        'legacy ]}] heuristic': legacy_extract,
+        'raw_decode in place': extract_destinations_data,
+        'streaming items': lambda p: sum(1 for _ in iter_json_array(p)),
+    }
+    print(f"page: {size_mb:.1f} MB, {args.destinations} destinations")
+    for name, func in candidates.items():
+        seconds = measure(func, page, args.repeat)
+        print(f"{name:<22} {seconds * 1000:8.2f} ms  {size_mb / seconds:8.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Сравнение исходного DataFrame и типизированной схемы из dashboards/schema.py
+
+Запуск из корня проекта:
+    python benchmarks/bench_load.py --rows 1000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'dashboards'))
+
+from aggregates import get_geo_group
+from schema import DESTINATION_TO_REST, read_final_dataframe
+
+SOURCE = os.path.join(os.path.dirname(__file__), '..', 'data', 'popular_destinations_9may.csv')
+
+
+def make_frame(rows, seed=0):
+    """final_dataframe-подобная таблица нужного размера на основе реальных данных"""
+    base = pd.read_csv(SOURCE)
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    df['price'] = (df['price'] * rng.uniform(0.8, 1.2, rows)).round(2)
+    df['Type_of_rest'] = df['destination_city'].map(DESTINATION_TO_REST)
+    return df
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'final_dataframe.csv')
+        make_frame(args.rows).to_csv(path, index=False)
+
+        start = time.perf_counter()
+        plain = pd.read_csv(path)
+        plain_load = time.perf_counter() - start
+        plain_geo = best_of(lambda: plain['origin_name'].apply(get_geo_group), 1)
+        plain['geo_group'] = plain['origin_name'].apply(get_geo_group)
+
+        start = time.perf_counter()
+        typed = read_final_dataframe(path)
+        typed_load = time.perf_counter() - start
+
+    print(f"rows: {args.rows:,}")
+    print(f"{'':<28}{'default':>12}{'typed':>12}")
+    print(f"{'memory, MB':<28}{plain.memory_usage(deep=True).sum() / 2**20:12.1f}"
+          f"{typed.memory_usage(deep=True).sum() / 2**20:12.1f}")
+    print(f"{'load + geo_group, ms':<28}{(plain_load + plain_geo) * 1000:12.1f}{typed_load * 1000:12.1f}")
+    queries = {
+        'filter origin & price, ms': lambda df: df[(df['origin_name'] == 'Москва') & (df['price'] <= 20000)],
+        'groupby origin mean, ms': lambda df: df.groupby('origin_name', observed=True)['price'].mean(),
+        'crosstab geo x rest, ms': lambda df: pd.crosstab(df['geo_group'], df['Type_of_rest']),
+    }
+    for name, query in queries.items():
+        print(f"{name:<28}{best_of(lambda: query(plain), args.repeat) * 1000:12.1f}"
+              f"{best_of(lambda: query(typed), args.repeat) * 1000:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""Нагрузочный прогон дашборда: параллельные сессии против локального сервера Streamlit
+
+Запуск из корня проекта:
+    python benchmarks/bench_sessions.py --rows 1000 100000 1000000 --concurrency 1 8 32
+
+Для каждого размера синтетических данных поднимается `streamlit run
+dashboards/app.py` в headless-режиме. Сессии подключаются к нему по тому же
+websocket-протоколу, что и браузер. Каждая сессия по сценарию переключает
+страницы, двигает ползунки цены и бюджета, меняет область и масштаб карты
+маршрутов, списки городов и состав сравнения. Для каждого уровня
+параллельности печатаются p50/p95/p99 задержки перезапуска скрипта,
+пропускная способность и прирост памяти сервера на одну сессию.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import websocket
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from bench_load import make_frame
+
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dashboards', 'app.py'))
+WIDGET_TYPES = ('radio', 'selectbox', 'multiselect', 'slider', 'button')
+
+
+class Session:
+    """Одна сессия браузера: websocket и текущие значения виджетов"""
+
+    def __init__(self, port, timeout=300):
+        self.ws = websocket.create_connection(f'ws://127.0.0.1:{port}/_stcore/stream',
+                                              subprotocols=['streamlit'], timeout=timeout)
+        self.widgets = {}  # подпись → (тип, proto элемента)
+        self.states = {}   # id виджета → WidgetState
+        self.errors = []
+
+    def rerun(self, label=None, value=None):
+        """Изменить виджет с подписью label и дождаться конца перезапуска; возвращает секунды"""
+        if label is not None:
+            kind, widget = self.widgets[label]
+            state = WidgetState(id=widget.id)
+            if kind == 'button':
+                state.trigger_value = True
+            elif kind == 'slider':
+                state.double_array_value.data[:] = [value]
+            elif kind == 'multiselect':
+                state.string_array_value.data[:] = value
+            else:
+                state.string_value = value
+            self.states[widget.id] = state
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+
+        start = time.perf_counter()
+        self.ws.send_binary(message.SerializeToString())
+        self.widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                break
+            if kind != 'delta' or forward.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = forward.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type in WIDGET_TYPES:
+                widget = getattr(element, element_type)
+                self.widgets[widget.label] = (element_type, widget)
+            elif element_type == 'exception':
+                self.errors.append(element.exception.message)
+        elapsed = time.perf_counter() - start
+
+        # как и браузер, дальше отправляем только состояния видимых виджетов;
+        # нажатие кнопки срабатывает один раз
+        visible = {widget.id for kind, widget in self.widgets.values() if kind != 'button'}
+        self.states = {widget_id: state for widget_id, state in self.states.items() if widget_id in visible}
+        return elapsed
+
+    def options(self, label):
+        return list(self.widgets[label][1].options)
+
+    def close(self):
+        self.ws.close()
+
+
+def scenario(session, rng, rounds):
+    """Сценарий пользователя: пары (действие, задержка)"""
+    timings = [('open', session.rerun())]
+
+    def act(name, label, value=None):
+        timings.append((name, session.rerun(label, value)))
+
+    for _ in range(rounds):
+        act('page:Данные', 'Разделы:', 'Данные')
+        slider = session.widgets['Минимальная цена'][1]
+        act('price slider', 'Минимальная цена', rng.uniform(slider.min, slider.max))
+
+        act('page:EDA', 'Разделы:', 'EDA')
+        act('route view', 'Область карты', rng.choice(session.options('Область карты')))
+        slider = session.widgets['Масштаб'][1]
+        act('route zoom', 'Масштаб', float(rng.randint(int(slider.min), int(slider.max))))
+
+        act('page:Тренды', 'Разделы:', 'Тренды')
+        act('city select', 'Выберите город для анализа:', rng.choice(session.options('Выберите город для анализа:')))
+        origins = session.options('Сравните города отправления')
+        act('compare multiselect', 'Сравните города отправления', rng.sample(origins, min(len(origins), rng.randint(2, 4))))
+        act('origin select', 'Город вылета', rng.choice(session.options('Город вылета')))
+        slider = session.widgets['Ваш бюджет (руб)'][1]
+        act('budget slider', 'Ваш бюджет (руб)', float(rng.randint(int(slider.min), int(slider.max))))
+        act('budget button', 'Показать доступные направления')
+        act('top origin select', 'Город отправления', rng.choice(session.options('Город отправления')))
+        act('top rest select', 'Тип отдыха', rng.choice(session.options('Тип отдыха')))
+
+        act('page:Главная', 'Разделы:', 'Главная')
+    return timings
+
+
+def rss_bytes(pid):
+    """Текущий RSS процесса (только Linux); None, если узнать нельзя"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class Server:
+    """Дашборд, запущенный в отдельном процессе на свободном порту"""
+
+    def __init__(self, data_path, working_set_dir):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ, DASHBOARD_DATA=data_path, DASHBOARD_WORKING_SET_DIR=working_set_dir)
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP, '--server.headless', 'true',
+             '--server.port', str(self.port), '--browser.gatherUsageStats', 'false'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 120
+        while True:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/_stcore/health', timeout=1):
+                    break
+            except OSError:
+                if time.time() > deadline or self.process.poll() is not None:
+                    self.stop()
+                    raise RuntimeError('streamlit server did not start')
+                time.sleep(0.2)
+
+    def rss(self):
+        return rss_bytes(self.process.pid)
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_load(server, concurrency, rounds, seed):
+    """concurrency сессий одновременно; все остаются открытыми до конца замера"""
+    baseline = server.rss()
+    peak = [baseline or 0]
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.wait(0.1):
+            peak[0] = max(peak[0], server.rss() or 0)
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    sessions = []
+
+    def user(i):
+        session = Session(server.port)
+        sessions.append(session)
+        return scenario(session, random.Random(seed + i), rounds)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        timings = [t for result in pool.map(user, range(concurrency)) for t in result]
+    wall = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    errors = [error for session in sessions for error in session.errors]
+    for session in sessions:
+        session.close()
+
+    latencies = np.array([seconds for _, seconds in timings]) * 1000
+    by_action = {}
+    for name, seconds in timings:
+        by_action.setdefault(name, []).append(seconds * 1000)
+    return {
+        'concurrency': concurrency,
+        'reruns': len(timings),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'throughput_per_s': len(timings) / wall,
+        'memory_per_session_mb': (peak[0] - baseline) / concurrency / 2**20 if baseline else None,
+        'errors': len(errors),
+        'by_action': {name: {'p50_ms': float(np.percentile(values, 50)),
+                             'p95_ms': float(np.percentile(values, 95))}
+                      for name, values in by_action.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--rounds', type=int, default=2, help='проходов сценария на сессию')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='сохранить результаты в файл JSON')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'rows':>10}{'sessions':>10}{'reruns':>8}{'p50, ms':>10}{'p95, ms':>10}{'p99, ms':>10}"
+          f"{'reruns/s':>10}{'MB/session':>12}{'errors':>8}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'final_dataframe.csv')
+            make_frame(rows, seed=args.seed).to_csv(path, index=False)
+            server = Server(path, os.path.join(tmp, 'working_set'))
+            try:
+                # первая сессия загружает данные (её первый перезапуск — холодная загрузка)
+                # и проходит все страницы, чтобы лениво создаваемое не попало в память сессий
+                warmup = Session(server.port)
+                cold_load = warmup.rerun()
+                scenario(warmup, random.Random(args.seed), rounds=1)
+                warmup.close()
+                for concurrency in args.concurrency:
+                    result = run_load(server, concurrency, args.rounds, args.seed)
+                    result.update(rows=rows, cold_load_s=cold_load)
+                    results.append(result)
+                    memory = result['memory_per_session_mb']
+                    print(f"{rows:>10,}{concurrency:>10}{result['reruns']:>8}{result['p50_ms']:>10.0f}"
+                          f"{result['p95_ms']:>10.0f}{result['p99_ms']:>10.0f}"
+                          f"{result['throughput_per_s']:>10.1f}"
+                          f"{'n/a' if memory is None else f'{memory:.1f}':>12}{result['errors']:>8}")
+            finally:
+                server.stop()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Бюджет холодного старта дашборда: время импорта и первой отрисовки
+
+Запуск из корня проекта:
+    python benchmarks/bench_startup.py --rows 100000
+
+Каждый замер идёт в отдельном процессе Python, как при старте новой реплики.
+Скрипт завершается с кодом 1, если импорт модулей дашборда или первая
+отрисовка главной страницы дольше бюджета либо если при старте уже
+импортирована тяжёлая библиотека, которая нужна только отдельным страницам.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from bench_load import make_frame
+
+DASHBOARDS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dashboards'))
+
+# Бюджеты в секундах; замер — лучший из нескольких запусков
+IMPORT_BUDGET = 1.8
+FIRST_PAINT_BUDGET = 3.0
+
+# Библиотеки, которые не должны импортироваться до первой отрисовки
+HEAVY_MODULES = ['plotly.express', 'duckdb', 'scipy', 'geopandas', 'folium',
+                 'statsmodels', 'seaborn', 'matplotlib']
+
+IMPORT_PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import streamlit, pandas
+import datastore, figures
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "heavy": [m for m in %r if m in sys.modules]}))
+'''
+
+FIRST_PAINT_PROBE = '''
+import json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(%r, default_timeout=120)
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "errors": [str(e.value) for e in at.exception]}))
+'''
+
+
+def probe(code, env=None):
+    """Выполнить code в новом процессе Python и вернуть напечатанный им JSON"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=DASHBOARDS, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET)
+    parser.add_argument('--paint-budget', type=float, default=FIRST_PAINT_BUDGET)
+    args = parser.parse_args()
+
+    imports = [probe(IMPORT_PROBE % HEAVY_MODULES) for _ in range(args.repeat)]
+    import_time = min(run['seconds'] for run in imports)
+    heavy = sorted({module for run in imports for module in run['heavy']})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'final_dataframe.csv')
+        make_frame(args.rows).to_csv(path, index=False)
+        paints = []
+        for i in range(args.repeat):
+            # свой каталог рабочего набора на каждый запуск: меряем именно холодный старт
+            env = dict(os.environ, DASHBOARD_DATA=path,
+                       DASHBOARD_WORKING_SET_DIR=os.path.join(tmp, f'working_set_{i}'))
+            paints.append(probe(FIRST_PAINT_PROBE % os.path.join(DASHBOARDS, 'app.py'), env))
+    paint_time = min(run['seconds'] for run in paints)
+    errors = [error for run in paints for error in run['errors']]
+
+    print(f"rows: {args.rows:,}")
+    print(f"{'':<24}{'measured, s':>12}{'budget, s':>12}")
+    print(f"{'import':<24}{import_time:12.2f}{args.import_budget:12.2f}")
+    print(f"{'first paint':<24}{paint_time:12.2f}{args.paint_budget:12.2f}")
+
+    failures = []
+    if import_time > args.import_budget:
+        failures.append(f"import takes {import_time:.2f} s, budget {args.import_budget:.2f} s")
+    if paint_time > args.paint_budget:
+        failures.append(f"first paint takes {paint_time:.2f} s, budget {args.paint_budget:.2f} s")
+    if heavy:
+        failures.append(f"imported at startup: {', '.join(heavy)}")
+    if errors:
+        failures.append(f"app raised: {errors[0]}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
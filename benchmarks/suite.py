@@ -0,0 +1,341 @@
+"""Набор бенчмарков конвейера: от страницы aviasales до запросов дашборда
+
+Запуск из корня проекта:
+    python benchmarks/suite.py --rows 1000 100000 1000000 --json results.json
+    python benchmarks/suite.py --rows 1000 100000 1000000 --baseline results.json
+
+Данные синтетические, но собраны из реальных маршрутов
+data/popular_destinations_9may.csv: страницы с JSON popular_destinations
+и таблицы в формате final_dataframe.csv нужного числа строк (от 1e3 до
+1e7). Каждый случай (извлечение и сохранение данных, загрузка таблицы,
+гео-группы, агрегаты, запросы фильтров дашборда) выполняется в отдельном
+процессе. Для каждого случая записываются время (лучшее и медиана),
+пиковый объём выделенной памяти по tracemalloc и пиковый RSS процесса.
+С --baseline результаты сравниваются с сохранёнными ранее. Скрипт
+завершается с кодом 1, если какой-то случай стал медленнее или тяжелее
+больше чем на --tolerance.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'dashboards'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+from aggregates import build_cube, geo_group_column, get_geo_group
+from bench_load import SOURCE, make_frame
+from gazetteer import get_gazetteer
+from main import extract_destinations_data, save_to_csv
+from metrics import peak_rss_bytes
+from price_index import PriceIndex
+from schema import prepare_frame, read_final_dataframe
+
+DEFAULT_ROWS = [1_000, 10_000, 100_000]
+# страница на 1e7 цен — это несколько ГБ JSON в памяти; выше лимита такие случаи пропускаются
+PAGE_ROWS_LIMIT = 2_000_000
+TOLERANCE = 0.2
+# Метрики для сравнения и шум, ниже которого рост не считается регрессией
+METRICS = {'wall_s': 0.001, 'alloc_peak_bytes': 2**20, 'peak_rss_delta_bytes': 2**20}
+
+
+def make_destinations(rows, seed=0):
+    """Список popular_destinations из rows цен, как в JSON страницы aviasales
+
+    Направления и города вылета берутся из реальных маршрутов и повторяются
+    по кругу, цены отличаются от реальных на ±20%, даты — в ближайшие два месяца.
+    """
+    base = pd.read_csv(SOURCE)
+    gazetteer = get_gazetteer()
+    base['destination_iata'] = gazetteer.lookup(base['destination_city'])['iata'].fillna('')
+    base['origin_iata'] = gazetteer.lookup(base['origin_name'])['iata'].fillna('')
+    routes = [group for _, group in base.groupby('destination_city', sort=False)]
+
+    rng = np.random.default_rng(seed)
+    today = date(2026, 5, 9)
+    destinations = []
+    total = 0
+    while total < rows:
+        group = routes[len(destinations) % len(routes)].iloc[:rows - total]
+        prices = (group['price'].to_numpy() * rng.uniform(0.8, 1.2, len(group))).round()
+        depart = rng.integers(1, 60, len(group))
+        stay = rng.integers(3, 15, len(group))
+        first = group.iloc[0]
+        destinations.append({
+            'destination_city': {'name': first['destination_city'], 'iata': first['destination_iata']},
+            'destination_country': {'name': first['destination_country'], 'iata': ''},
+            'prices': [{
+                'origin_name': origin,
+                'origin_iata': iata,
+                'depart_date': (today + timedelta(days=int(d))).isoformat(),
+                'return_date': (today + timedelta(days=int(d + s))).isoformat(),
+                'price': {'value': int(price), 'currency': 'rub'},
+            } for origin, iata, price, d, s in zip(group['origin_name'], group['origin_iata'], prices, depart, stay)],
+        })
+        total += len(group)
+    return destinations
+
+
+def make_page(destinations, padding_kb=512):
+    """HTML-страница со встроенным JSON popular_destinations и разметкой вокруг"""
+    blob = json.dumps({'popular_destinations': destinations}, ensure_ascii=False)
+    padding = '<div class="filler"></div>' * (padding_kb * 1024 // 26)
+    return f'<html><body>{padding}<script>window.__DATA__={blob};</script>{padding}</body></html>'
+
+
+# Случаи: функция подготовки (rows, seed, tmp) → функция замера (rng).
+# Подготовка в замер не входит; rng меняет параметры запросов между повторами,
+# чтобы не мерить кэши результатов.
+
+def setup_extract(rows, seed, tmp):
+    page = make_page(make_destinations(rows, seed))
+    return lambda rng: extract_destinations_data(page)
+
+
+def setup_save_to_csv(rows, seed, tmp):
+    destinations = make_destinations(rows, seed)
+    path = os.path.join(tmp, 'popular_destinations.csv')
+    return lambda rng: save_to_csv(destinations, path)
+
+
+def setup_load_data(rows, seed, tmp):
+    path = os.path.join(tmp, 'final_dataframe.csv')
+    make_frame(rows, seed).to_csv(path, index=False)
+    return lambda rng: read_final_dataframe(path)
+
+
+def setup_geo_group_apply(rows, seed, tmp):
+    df = make_frame(rows, seed)
+    return lambda rng: df['origin_name'].apply(get_geo_group)
+
+
+def setup_geo_group_column(rows, seed, tmp):
+    df = prepare_frame(make_frame(rows, seed).drop(columns='Type_of_rest'))
+    return lambda rng: geo_group_column(df['origin_name'])
+
+
+def setup_groupby_origin(rows, seed, tmp):
+    df = make_frame(rows, seed)
+    return lambda rng: df.groupby(['origin_name', 'Type_of_rest'])['price'].agg(['mean', 'min', 'max', 'count'])
+
+
+def setup_crosstab(rows, seed, tmp):
+    df = make_frame(rows, seed)
+    df['geo_group'] = geo_group_column(df['origin_name'])
+    return lambda rng: pd.crosstab(df['geo_group'], df['Type_of_rest'], normalize='index')
+
+
+def setup_build_cube(rows, seed, tmp):
+    df = prepare_frame(make_frame(rows, seed))
+    return lambda rng: build_cube(df)
+
+
+def setup_cube_queries(rows, seed, tmp):
+    cube = build_cube(prepare_frame(make_frame(rows, seed)))
+    origins = cube.counts('origin_name').index.tolist()
+
+    def run(rng):
+        origin = rng.choice(origins)
+        cube.rollup(['origin_name'])
+        cube.crosstab('geo_group', 'Type_of_rest', normalize='index')
+        cube.describe(['Type_of_rest'], where={'origin_name': origin})
+        cube.rollup(['destination_city', 'Type_of_rest'], where={'origin_name': origin})
+    return run
+
+
+def setup_price_filter(rows, seed, tmp):
+    from query import PriceQueries
+
+    df = prepare_frame(make_frame(rows, seed))
+    queries = PriceQueries(df)
+    low, high = float(df['price'].min()), float(df['price'].max())
+    return lambda rng: queries.rows_from_price(round(rng.uniform(low, high), 2))
+
+
+def setup_compare_origins(rows, seed, tmp):
+    from query import PriceQueries
+
+    df = prepare_frame(make_frame(rows, seed))
+    queries = PriceQueries(df)
+    origins = df['origin_name'].cat.categories.tolist()
+    return lambda rng: queries.compare_origins(sorted(rng.choice(origins, size=min(3, len(origins)), replace=False)))
+
+
+def setup_budget_filter(rows, seed, tmp):
+    df = prepare_frame(make_frame(rows, seed))
+    index = PriceIndex.build(df)
+    origins = df['origin_name'].cat.categories.tolist()
+    return lambda rng: df.iloc[index.within_budget(rng.choice(origins), int(rng.integers(1_000, 50_000)))]
+
+
+def setup_cheapest(rows, seed, tmp):
+    df = prepare_frame(make_frame(rows, seed))
+    index = PriceIndex.build(df)
+    origins = df['origin_name'].cat.categories.tolist()
+    return lambda rng: df.iloc[index.cheapest(rng.choice(origins), None, 5)]
+
+
+CASES = {
+    'extract_destinations_data': setup_extract,
+    'save_to_csv': setup_save_to_csv,
+    'load_data': setup_load_data,
+    'geo_group_apply': setup_geo_group_apply,
+    'geo_group_column': setup_geo_group_column,
+    'groupby_origin_rest': setup_groupby_origin,
+    'crosstab_geo_rest': setup_crosstab,
+    'build_cube': setup_build_cube,
+    'cube_queries': setup_cube_queries,
+    'filter_price': setup_price_filter,
+    'filter_compare_origins': setup_compare_origins,
+    'filter_budget': setup_budget_filter,
+    'filter_cheapest': setup_cheapest,
+}
+PAGE_CASES = {'extract_destinations_data', 'save_to_csv'}
+
+
+def measure(case, rows, repeat, seed):
+    """Замер одного случая в текущем процессе"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # сообщения скрейпера («Destinations data saved ...») не смешиваем с JSON результата
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = CASES[case](rows, seed, tmp)
+            setup_rss = peak_rss_bytes()
+            rng = np.random.default_rng(seed)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run(rng)
+                times.append(time.perf_counter() - start)
+            peak_rss = peak_rss_bytes()
+
+            # отдельный прогон под tracemalloc: он замедляет код, поэтому не входит во время
+            tracemalloc.start()
+            run(rng)
+            _, alloc_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return {
+        'case': case,
+        'rows': rows,
+        'repeat': repeat,
+        'wall_s': min(times),
+        'wall_median_s': float(np.median(times)),
+        'alloc_peak_bytes': alloc_peak,
+        'peak_rss_bytes': peak_rss,
+        'peak_rss_delta_bytes': None if peak_rss is None else peak_rss - setup_rss,
+    }
+
+
+def run_case(case, rows, repeat, seed):
+    """Замер в отдельном процессе: пиковый RSS не зависит от предыдущих случаев"""
+    result = subprocess.run(
+        [sys.executable, __file__, '--worker', case, '--rows', str(rows), '--repeat', str(repeat),
+         '--seed', str(seed)],
+        capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'case': case, 'rows': rows, 'error': result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    """Отношения метрик к базовому прогону; список регрессий (случай, строки, метрика, отношение)"""
+    previous = {(r['case'], r['rows']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    print(f"{'case':<28}{'rows':>10}" + ''.join(f'{name:>24}' for name in METRICS))
+    for result in results:
+        before = previous.get((result['case'], result['rows']))
+        if before is None or 'error' in result:
+            continue
+        cells = []
+        for name, noise in METRICS.items():
+            old, new = before.get(name), result.get(name)
+            if not old or new is None:
+                cells.append(f"{'n/a':>24}")
+                continue
+            ratio = new / old
+            flag = ratio > 1 + tolerance and new - old > noise
+            if flag:
+                regressions.append((result['case'], result['rows'], name, ratio))
+            cells.append(f"{ratio:>21.2f}x{' !' if flag else '  '}")
+        print(f"{result['case']:<28}{result['rows']:>10,}" + ''.join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--page-rows-limit', type=int, default=PAGE_ROWS_LIMIT,
+                        help='не строить страницы больше этого числа цен')
+    parser.add_argument('--json', help='сохранить результаты в файл JSON')
+    parser.add_argument('--baseline', help='сравнить с результатами из файла JSON')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='допустимый рост метрики относительно базового прогона (0.2 = 20%%)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.rows[0], args.repeat, args.seed)))
+        return
+
+    results = []
+    print(f"{'case':<28}{'rows':>10}{'best, ms':>12}{'median, ms':>12}{'alloc, MB':>12}{'RSS +MB':>10}")
+    for rows in args.rows:
+        for case in args.cases:
+            if case in PAGE_CASES and rows > args.page_rows_limit:
+                print(f"{case:<28}{rows:>10,}  skipped: page larger than --page-rows-limit")
+                continue
+            result = run_case(case, rows, args.repeat, args.seed)
+            results.append(result)
+            if 'error' in result:
+                print(f"{case:<28}{rows:>10,}  error: {result['error']}")
+                continue
+            rss = result['peak_rss_delta_bytes']
+            print(f"{case:<28}{rows:>10,}{result['wall_s'] * 1000:12.2f}{result['wall_median_s'] * 1000:12.2f}"
+                  f"{result['alloc_peak_bytes'] / 2**20:12.1f}{'n/a' if rss is None else f'{rss / 2**20:.1f}':>10}")
+
+    report = {
+        'meta': {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'seed': args.seed,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failures = [result for result in results if 'error' in result]
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        for case, rows, name, ratio in regressions:
+            print(f"REGRESSION: {case} at {rows:,} rows: {name} x{ratio:.2f}")
+        failures += regressions
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
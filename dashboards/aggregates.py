@@ -0,0 +1,193 @@
+"""Файл с агрегированным «кубом» цен, из которого строятся страницы дашборда"""
+
+import numpy as np
+import pandas as pd
+
+# Географические группы городов вылета
+GEO_GROUPS = {
+    'Дальний Восток': ['Владивосток', 'Хабаровск'],
+    'Урал': ['Екатеринбург', 'Уфа', 'Тюмень', 'Пермь', 'Челябинск'],
+    'Сибирь': ['Иркутск', 'Красноярск', 'Новосибирск', 'Омск', 'Томск', 'Барнаул'],
+    'Центральная Россия': ['Москва', 'Казань', 'Нижний Новгород', 'Самара', 'Воронеж',
+                          'Ярославль', 'Тула', 'Рязань', 'Смоленск', 'Тверь', 'Иваново'],
+    'Северо-Запад': ['Санкт-Петербург', 'Калининград', 'Мурманск', 'Архангельск',
+                    'Петрозаводск', 'Великий Новгород', 'Псков'],
+    'Юг России': ['Сочи', 'Волгоград', 'Махачкала', 'Минеральные Воды',
+                 'Владикавказ', 'Ставрополь', 'Краснодар', 'Ростов-на-Дону', 'Астрахань'],
+    'Международные': ['Дубай', 'Абу-Даби', 'Мале', 'Бангкок', 'Коломбо', 'Сингапур',
+                     'Минск', 'Пхукет', 'Стамбул', 'Эль-Нидо', 'Себу', 'Катиклан',
+                     'Гонконг', 'Барселона', 'Баку', 'Вена', 'Белград', 'Астана',
+                     'Пекин', 'Шанхай', 'Канкун', 'Пунта-Кана', 'Санто-Доминго', 'Мехико']
+}
+CITY_TO_GEO_GROUP = {city: group for group, cities in GEO_GROUPS.items() for city in cities}
+OTHER_GEO_GROUP = 'Другие'
+
+DIMENSIONS = ['origin_name', 'destination_city', 'destination_country', 'Type_of_rest', 'geo_group']
+
+# Границы корзин гистограммы-«скетча» для квантилей: логарифмическая шкала,
+# шаг около 2%, поэтому квантили считаются с такой же относительной точностью
+PRICE_BIN_EDGES = np.geomspace(100, 2_000_000, 513)
+
+
+def get_geo_group(city):
+    """Географическая группа города вылета"""
+    return CITY_TO_GEO_GROUP.get(city, OTHER_GEO_GROUP)
+
+
+def geo_group_column(origins):
+    """Географические группы для целого столбца городов вылета"""
+    return origins.map(CITY_TO_GEO_GROUP).fillna(OTHER_GEO_GROUP)
+
+
+class PriceCube:
+    """Куб агрегатов: город вылета × направление × тип отдыха × гео-группа
+
+    Для каждой ячейки хранятся count, sum, sum of squares, min, max и
+    гистограмма цен. Все эти величины складываются, поэтому любые
+    срезы и группировки считаются по ячейкам, а не по исходным строкам.
+    """
+
+    def __init__(self, cells, hist):
+        self.cells = cells
+        self.hist = hist
+
+    @classmethod
+    def build(cls, df):
+        """Построение куба по исходной таблице за один проход"""
+        data = df[[c for c in DIMENSIONS if c in df.columns] + ['price']]
+        if 'geo_group' not in data.columns:
+            data = data.assign(geo_group=geo_group_column(df['origin_name']))
+        price = data['price'].astype('float64')
+        data = data.assign(price=price, price_sq=price ** 2)
+
+        grouped = data.groupby(DIMENSIONS, sort=False, dropna=False, observed=True)
+        cells = grouped.agg(count=('price', 'count'), sum=('price', 'sum'),
+                            sumsq=('price_sq', 'sum'), min=('price', 'min'),
+                            max=('price', 'max')).reset_index()
+
+        bins = np.clip(np.searchsorted(PRICE_BIN_EDGES, price.to_numpy(), side='right') - 1,
+                       0, len(PRICE_BIN_EDGES) - 2)
+        hist = np.zeros((len(cells), len(PRICE_BIN_EDGES) - 1), dtype=np.int32)
+        np.add.at(hist, (grouped.ngroup().to_numpy(), bins), 1)
+        return cls(cells, hist)
+
+    def merge(self, other):
+        """Новый куб из двух кубов (например, старые данные + новый снимок)
+
+        Совпадающие ячейки складываются, гистограммы суммируются.
+        """
+        cells = pd.concat([self.cells.astype(object), other.cells.astype(object)], ignore_index=True)
+        cells = cells.astype({column: self.cells[column].dtype for column in ('count', 'sum', 'sumsq', 'min', 'max')})
+        grouped = cells.groupby(DIMENSIONS, sort=False, dropna=False)
+        merged = grouped.agg(count=('count', 'sum'), sum=('sum', 'sum'), sumsq=('sumsq', 'sum'),
+                             min=('min', 'min'), max=('max', 'max')).reset_index()
+        hist = np.zeros((len(merged), self.hist.shape[1]), dtype=self.hist.dtype)
+        np.add.at(hist, grouped.ngroup().to_numpy(), np.vstack([self.hist, other.hist]))
+        return PriceCube(merged, hist)
+
+    def _select(self, where):
+        mask = np.ones(len(self.cells), dtype=bool)
+        for column, value in (where or {}).items():
+            if isinstance(value, (list, tuple, set, pd.Index, np.ndarray)):
+                mask &= self.cells[column].isin(list(value)).to_numpy()
+            else:
+                mask &= (self.cells[column] == value).to_numpy()
+        return mask
+
+    def rollup(self, by, where=None, with_hist=False):
+        """Агрегаты по измерениям by с фильтром where {измерение: значение или список}
+
+        Порядок групп — порядок их первого появления в исходных данных.
+        """
+        mask = self._select(where)
+        cells = self.cells[mask]
+        group_ids = cells.groupby(by, sort=False, dropna=True, observed=True).ngroup().to_numpy()
+        keep = group_ids >= 0
+        cells, group_ids = cells[keep], group_ids[keep]
+
+        result = cells.groupby(by, sort=False, observed=True).agg(
+            count=('count', 'sum'), sum=('sum', 'sum'), sumsq=('sumsq', 'sum'),
+            min=('min', 'min'), max=('max', 'max')).reset_index()
+        result['mean'] = result['sum'] / result['count']
+        n = result['count']
+        variance = (result['sumsq'] - result['sum'] ** 2 / n) / (n - 1)
+        result['std'] = np.sqrt(variance.clip(lower=0)).where(n > 1)
+        if with_hist:
+            hist = np.zeros((len(result), self.hist.shape[1]), dtype=np.int64)
+            np.add.at(hist, group_ids, self.hist[mask][keep])
+            return result, hist
+        return result
+
+    def counts(self, dimension, where=None):
+        """Аналог value_counts() по одному измерению"""
+        result = self.rollup([dimension], where)
+        return result.set_index(dimension)['count'].sort_values(ascending=False, kind='stable')
+
+    def total(self, where=None, percentiles=()):
+        """Агрегаты по всем выбранным ячейкам сразу; квантили percentiles — по гистограмме"""
+        mask = self._select(where)
+        cells = self.cells[mask]
+        count = cells['count'].sum()
+        total_sum = cells['sum'].sum()
+        variance = (cells['sumsq'].sum() - total_sum ** 2 / count) / (count - 1) if count > 1 else float('nan')
+        result = {
+            'count': int(count),
+            'mean': total_sum / count if count else float('nan'),
+            'std': float(np.sqrt(max(variance, 0))) if count > 1 else float('nan'),
+            'min': cells['min'].min(),
+            'max': cells['max'].max(),
+        }
+        if percentiles and count:
+            hist = self.hist[mask].sum(axis=0, keepdims=True)
+            summary = pd.DataFrame({'count': [count], 'min': [result['min']], 'max': [result['max']]})
+            for q in percentiles:
+                result[f'{q:.0%}'] = float(_quantiles(hist, summary, q)[0])
+        return result
+
+    def describe(self, by, where=None, percentiles=(0.25, 0.5, 0.75)):
+        """Аналог groupby(by)['price'].describe() с квантилями по гистограмме"""
+        result, hist = self.rollup(by, where, with_hist=True)
+        table = result.set_index(by)[['count', 'mean', 'std', 'min']].copy()
+        for q in percentiles:
+            table[f'{q:.0%}'] = _quantiles(hist, result, q)
+        table['max'] = result['max'].to_numpy()
+        table['count'] = table['count'].astype('float64')
+        return table
+
+    def crosstab(self, index, columns, normalize=False):
+        """Аналог pd.crosstab по количеству записей"""
+        counts = self.rollup([index, columns]).astype({index: object, columns: object})
+        table = counts.pivot(index=index, columns=columns, values='count')
+        table = table.fillna(0).sort_index().sort_index(axis=1)
+        if normalize == 'index':
+            table = table.div(table.sum(axis=1), axis=0)
+        return table
+
+
+def _quantiles(hist, result, q):
+    """Квантиль q для каждой строки гистограммы с интерполяцией, как в pandas
+
+    Берутся две соседние порядковые статистики вокруг позиции q * (n - 1);
+    значение каждой оценивается серединой её корзины и ограничивается min/max.
+    """
+    n = result['count'].to_numpy()
+    position = q * (n - 1)
+    low, high = np.floor(position).astype(np.int64), np.ceil(position).astype(np.int64)
+    cumulative = np.cumsum(hist, axis=1)
+    centers = np.sqrt(PRICE_BIN_EDGES[:-1] * PRICE_BIN_EDGES[1:])
+    lo_bound, hi_bound = result['min'].to_numpy(), result['max'].to_numpy()
+
+    def order_statistic(rank):
+        # первая корзина, в которой накопленное число цен превышает rank
+        index = (cumulative <= rank[:, None]).sum(axis=1)
+        value = np.clip(centers[np.minimum(index, len(centers) - 1)], lo_bound, hi_bound)
+        value = np.where(rank == 0, lo_bound, value)
+        return np.where(rank == n - 1, hi_bound, value)
+
+    low_value, high_value = order_statistic(low), order_statistic(high)
+    return low_value + (high_value - low_value) * (position - low)
+
+
+def build_cube(df):
+    """Построение куба агрегатов для дашборда"""
+    return PriceCube.build(df)
@@ -1,8 +1,16 @@
 """Файл для дашборда"""
 
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+
+from datastore import DataStore
+from figures import FigureCache
+from gazetteer import get_gazetteer
+from routes import MAX_ZOOM, MIN_ZOOM, VIEWS
+from stat_tests import TestCache
 
 
 st.set_page_config(
@@ -13,49 +21,38 @@ st.set_page_config(
 )
 
 
-# ЗАГРУЗКА ДАННЫХ
-@st.cache_data
-def load_data():
-    """Загрузка и кэширование данных"""
-    return pd.read_csv("data/final_dataframe.csv")
-
-@st.cache_data
-def get_coordinates():
-    """Словарь координат для городов"""
-    return {
-        'Коломбо': [6.9271, 79.8612],
-        'Мале': [4.1755, 73.5093],
-        'Ташкент': [41.2995, 69.2401],
-        'Бангкок': [13.7563, 100.5018],
-        'Белград': [44.7866, 20.4489],
-        'Дубай': [25.276987, 55.296249],
-        'Стамбул': [41.0082, 28.9784],
-        'Манила': [14.5995, 120.9842],
-        'Подгорица': [42.4411, 19.2636],
-        'Маврикий': [-20.348404, 57.552152],
-        'Токио': [35.6762, 139.6503],
-        'Варадеро': [23.1460, -81.2752]
-    }
-
-# Загрузка данных
-df = load_data()
-city_coords = get_coordinates()
+DATA_SOURCE = os.environ.get("DASHBOARD_DATA", "data/final_dataframe.csv")
+REFRESH_SECONDS = int(os.environ.get("DASHBOARD_REFRESH_SECONDS", "30"))
 
 
-# НАВИГАЦИОННОЕ МЕНЮ
-st.sidebar.title("Анализ популярных направлений")
-pages = {
-    "Главная": "Обзор данных и целей исследования",
-    "Данные": "Исходные данные и базовый анализ",
-    "EDA": "Углубленный разведочный анализ",
-    "Тренды": "Анализ закономерностей",
-    "Выводы": "Итоги и рекомендации"
-}
-page = st.sidebar.radio("Разделы:", list(pages.keys()))
+# ЗАГРУЗКА ДАННЫХ
+@st.cache_resource
+def get_store():
+    """Хранилище данных, общее для всех сессий; новые данные подхватываются в фоне"""
+    store = DataStore(DATA_SOURCE, poll_interval=REFRESH_SECONDS)
+    store.start_watcher()
+    return store
+
+@st.cache_resource
+def get_figures():
+    """Кэш графиков: прогревается в фоне при загрузке каждой новой версии данных"""
+    store = get_store()
+    figures = FigureCache()
+    store.subscribe(figures.warm)
+    figures.warm_in_background(store.state)
+    return figures
+
+@st.cache_resource
+def get_tests():
+    """Кэш статистических тестов по версиям данных, общий для всех сессий"""
+    return TestCache()
 
 
 # СОДЕРЖАНИЕ СТРАНИЦ
-if page == "Главная":
+def home_page(data):
+    """Главная: обзор данных и целей исследования"""
+    df = data.df
+
     # Заголовок и описание
     st.title("Анализ цен на авиабилеты в майские праздники 2025")
     
@@ -86,11 +83,8 @@ if page == "Главная":
     
     # Блок 2: Визуализация
     with st.container():
-        st.map(pd.DataFrame({
-        "lat": [6.9271, 4.1755, 41.2995, 25.2048],  # Координаты популярных направлений
-        "lon": [79.8612, 73.5093, 69.2401, 55.2708],
-        "city": ["Коломбо", "Мале", "Ташкент", "Дубай"]
-    }), zoom=1)
+        # Координаты популярных направлений — из справочника городов
+        st.map(get_gazetteer().lookup(pd.Series(["Коломбо", "Мале", "Ташкент", "Дубай"]))[["city", "lat", "lon"]], zoom=1)
     
     # Блок 3: Цели исследования
     with st.container():
@@ -108,14 +102,22 @@ if page == "Главная":
         st.subheader("Пример данных")
         st.dataframe(df.sample(5), height=200)
 
-elif page == "Данные":
+
+def data_page(data):
+    """Данные: таблица с фильтром и базовый анализ цен"""
+    cube = data.cube
+    queries = data.queries
+    figures = get_figures()
+
     # Основной контент страницы
     st.header("Исходные данные")
     
+    totals = cube.total(percentiles=(0.25, 0.5, 0.75))
+
     # Фильтры данных
     with st.expander("Фильтры", expanded=True):
-        min_price = st.slider("Минимальная цена", float(df["price"].min()), float(df["price"].max()), float(df["price"].min()))
-        filtered_df = df[df["price"] >= min_price]
+        min_price = st.slider("Минимальная цена", float(totals['min']), float(totals['max']), float(totals['min']))
+        filtered_df = queries.rows_from_price(min_price)
     
     # Отображение данных
     st.dataframe(filtered_df, height=400, use_container_width=True)
@@ -130,21 +132,21 @@ elif page == "Данные":
     with metric_col1:
         st.metric(
             label="Всего записей", 
-            value=len(df),
+            value=totals['count'],
             help="Общее количество записей в наборе данных"
         )
     with metric_col2:
         st.metric(
             label="Уникальных городов вылета", 
-            value=df["origin_name"].nunique(),
+            value=len(cube.counts('origin_name')),
             help="Количество различных городов отправления"
         )
     with metric_col3:
-        avg_price = df['price'].mean()
+        avg_price = totals['mean']
         st.metric(
             label="Средняя стоимость", 
             value=f"{avg_price:,.2f} руб",
-            help=f"Средняя цена билета (от {df['price'].min():,.0f} до {df['price'].max():,.0f} руб)"
+            help=f"Средняя цена билета (от {totals['min']:,.0f} до {totals['max']:,.0f} руб)"
         )
 
     # 2. Анализ распределения цен
@@ -154,42 +156,12 @@ elif page == "Данные":
     dist_tab1, dist_tab2 = st.tabs(["Гистограмма с боксиграммой", "Статистические показатели"])
 
     with dist_tab1:
-        # Гистограмма с боксиграммой
-        fig = px.histogram(
-            df,
-            x="price",
-            nbins=30,
-            title="Распределение цен на авиабилеты",
-            labels={"price": "Цена (руб)", "count": "Количество билетов"},
-            color_discrete_sequence=["#1f77b4"],
-            opacity=0.8,
-            marginal="box",
-            hover_data=["origin_name", "destination_city"]
-        )
-        
-        # Настройка внешнего вида
-        fig.update_layout(
-            bargap=0.1,
-            xaxis_title="Цена билета (руб)",
-            yaxis_title="Количество билетов",
-            hovermode="x unified",
-            plot_bgcolor="rgba(0,0,0,0)",
-            xaxis=dict(showgrid=True, gridcolor="lightgray"),
-            yaxis=dict(showgrid=True, gridcolor="lightgray")
-        )
-        
-        # Добавляем вертикальную линию среднего значения
-        fig.add_vline(
-            x=avg_price, 
-            line_dash="dot",
-            annotation_text=f"Среднее: {avg_price:,.0f} руб",
-            annotation_position="top"
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        # Гистограмма с боксиграммой и линией среднего
+        st.plotly_chart(figures.get('price_histogram', data), use_container_width=True)
 
     with dist_tab2:
-        # Статистические показатели в виде колонок
+        # Статистические показатели в виде колонок (квантили — по гистограмме куба, с точностью ~2%;
+        # мода по гистограмме не считается, её один раз на версию данных считает DataState)
         col1, col2, col3 = st.columns(3)
         
         with col1:
@@ -197,21 +169,21 @@ elif page == "Данные":
             ### Мода
             **{} руб**  
             Наиболее часто встречающаяся цена билета
-            """.format(df["price"].mode()[0]))
+            """.format(data.price_mode))
         
         with col2:
             st.markdown("""
             ### Медиана
-            **{} руб**  
+            **≈{:,.0f} руб**  
             50% билетов дешевле этой цены
-            """.format(df["price"].median()))
+            """.format(totals['50%']))
         
         with col3:
             st.markdown("""
             ### Среднее
             **{} руб**  
             Общий средний показатель по всем билетам
-            """.format(round(df["price"].mean(), 2)))
+            """.format(round(totals['mean'], 2)))
         
         # Дополнительные показатели
         st.markdown("""
@@ -219,62 +191,30 @@ elif page == "Данные":
         - **Стандартное отклонение:** {:.2f} руб
         - **Размах цен:** от {:,} до {:,} руб
         - **Квартили:** 
-        - Q1 (25%): {:,} руб 
-        - Q3 (75%): {:,} руб
+        - Q1 (25%): ≈{:,.0f} руб 
+        - Q3 (75%): ≈{:,.0f} руб
         """.format(
-            df["price"].std(),
-            df["price"].min(),
-            df["price"].max(),
-            df["price"].quantile(0.25),
-            df["price"].quantile(0.75)
+            totals['std'],
+            totals['min'],
+            totals['max'],
+            totals['25%'],
+            totals['75%']
         ))
 
+
 # 3. Раздел «EDA»
-elif page == "EDA":
+def eda_page(data):
+    """EDA: карта направлений и сравнение цен по городам и типам отдыха"""
+    cube = data.cube
+    figures = get_figures()
+
     st.header("Первичный анализ данных")
     
     # 1. Карта направлений с plotly
     st.subheader("География популярных направлений")
     
-    # Создаём DataFrame с координатами
-    city_coords = {
-        'Коломбо': [6.9271, 79.8612],
-        'Мале': [4.1755, 73.5093],
-        'Ташкент': [41.2995, 69.2401],
-        'Бангкок': [13.7563, 100.5018],
-        'Белград': [44.7866, 20.4489],
-        'Дубай': [25.276987, 55.296249],
-        'Стамбул': [41.0082, 28.9784],
-        'Манила': [14.5995, 120.9842],
-        'Подгорица': [42.4411, 19.2636],
-        'Маврикий': [-20.348404, 57.552152],
-        'Токио': [35.6762, 139.6503],
-        'Варадеро': [23.1460, -81.2752]
-    }
-    
-    # Группируем данные
-    city_stats = df.groupby(['destination_city', 'destination_country']).agg(
-        avg_price=('price', 'mean'),
-        flight_count=('price', 'count')
-    ).reset_index()
-    
-    # Добавляем координаты
-    city_stats['lat'] = city_stats['destination_city'].map(lambda x: city_coords.get(x, [0,0])[0])
-    city_stats['lon'] = city_stats['destination_city'].map(lambda x: city_coords.get(x, [0,0])[1])
-    
-    # Создаём интерактивную карту
-    fig = px.scatter_geo(city_stats,
-                        lat='lat',
-                        lon='lon',
-                        color='avg_price',
-                        size='flight_count',
-                        hover_name='destination_city',
-                        hover_data=['destination_country', 'avg_price', 'flight_count'],
-                        projection='natural earth',
-                        title='Распределение направлений по средней цене и количеству рейсов',
-                        color_continuous_scale='Viridis')
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # Интерактивная карта: цвет — средняя цена, размер — число рейсов
+    st.plotly_chart(figures.get('destinations_map', data), use_container_width=True)
     
     # 2. Аналитические выводы по карте
     st.markdown("""
@@ -290,50 +230,32 @@ elif page == "EDA":
     - Дальние направления (Япония, Куба) — от 25 тыс. руб
     """)
 
+    # Маршруты: агрегируются и кластеризуются на сервере, в браузер уходит только видимое
+    st.subheader("Маршруты из городов вылета")
+    view_col, zoom_col = st.columns(2)
+    with view_col:
+        # кроме областей карту можно центрировать на городе вылета из справочника
+        route_origins = cube.counts('origin_name').index.to_numpy(dtype=object)
+        route_origins = route_origins[get_gazetteer().positions(route_origins) >= 0].tolist()
+        route_view = st.selectbox("Область карты", list(VIEWS) + route_origins)
+    with zoom_col:
+        route_zoom = st.slider("Масштаб", MIN_ZOOM, MAX_ZOOM, MIN_ZOOM)
+    st.plotly_chart(figures.get('route_map', data, view=route_view, zoom=route_zoom), use_container_width=True)
+
     # 3. Анализ цен по городам отправления (с фильтрацией)
     st.subheader("Сравнение цен по городам вылета (3+ направлений)")
     
     # Фильтруем города с 3+ направлениями
-    city_counts = df['origin_name'].value_counts()
+    city_counts = cube.counts('origin_name')
     valid_cities = city_counts[city_counts >= 3].index.tolist()
-    filtered_df = df[df['origin_name'].isin(valid_cities)]
     
     # Рассчитываем средние цены
-    avg_prices = filtered_df.groupby('origin_name', as_index=False)['price'].mean()
+    avg_prices = cube.rollup(['origin_name'], where={'origin_name': valid_cities})
+    avg_prices = avg_prices[['origin_name', 'mean']].rename(columns={'mean': 'price'})
     min_price = avg_prices['price'].min()
-    max_price = avg_prices['price'].max()
-    
-    # Создаем интерактивный график
-    fig = px.bar(
-        avg_prices.sort_values('price'),
-        x='origin_name',
-        y='price',
-        color='price',
-        color_continuous_scale=[(0, '#1f77b4'), (1, '#ff7f0e')],
-        range_color=[min_price, max_price],
-        title='Средняя стоимость авиабилетов из городов с 3+ направлениями',
-        labels={'origin_name': 'Город отправления', 'price': 'Средняя цена (руб)'},
-        text_auto='.0f',
-        height=500
-    )
     
-    # Выделяем минимальное и максимальное значения
-    fig.update_traces(
-        marker_line_color='rgba(0,0,0,0.7)',
-        marker_line_width=1.5,
-        textposition='outside'
-    )
-    
-    # Настройки отображения
-    fig.update_layout(
-        xaxis_tickangle=-45,
-        yaxis_range=[min_price*0.9, max_price*1.1],
-        hovermode='x',
-        coloraxis_showscale=False,
-        plot_bgcolor='rgba(0,0,0,0)'
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # Интерактивный график
+    st.plotly_chart(figures.get('origin_prices_bar', data), use_container_width=True)
     
     # 4. Выводы
     st.markdown("""
@@ -358,7 +280,8 @@ elif page == "EDA":
     """.format(
         int(avg_prices[avg_prices['origin_name'] == 'Москва']['price'].values[0]),
         city_counts['Москва'],
-        filtered_df[filtered_df['origin_name'] == 'Владивосток'][['destination_city', 'price']].to_string(index=False),
+        cube.rollup(['destination_city'], where={'origin_name': 'Владивосток'})
+            .rename(columns={'mean': 'price'})[['destination_city', 'price']].to_string(index=False),
         city_counts['Владивосток'],
         int(avg_prices[avg_prices['origin_name'] == 'Владивосток']['price'].values[0]),
         avg_prices.sort_values('price', ascending=False).iloc[0]['origin_name'],
@@ -370,52 +293,16 @@ elif page == "EDA":
     st.header("Анализ цен по городам отправления и типам отдыха")
     
     # Подготовка данных - фильтрация городов с 3+ направлениями
-    city_counts = df['origin_name'].value_counts()
-    filtered_df = df[df['origin_name'].isin(city_counts[city_counts > 2].index)]
-    
-    # Создание интерактивного графика
-    fig = px.bar(
-        filtered_df,
-        x='origin_name',
-        y='price',
-        color='Type_of_rest',
-        barmode='group',
-        title='Средняя стоимость билетов по городам отправления и типам отдыха',
-        labels={
-            'origin_name': 'Город отправления',
-            'price': 'Цена (руб)',
-            'Type_of_rest': 'Тип отдыха'
-        },
-        color_discrete_sequence=px.colors.qualitative.Set2,
-        hover_data=['destination_city']
-    )
+    valid_cities = city_counts[city_counts > 2].index.tolist()
+    rest_stats = cube.rollup(['Type_of_rest'], where={'origin_name': valid_cities})
     
-    # Настройка внешнего вида
-    fig.update_layout(
-        xaxis_tickangle=-45,
-        yaxis_gridcolor='lightgray',
-        plot_bgcolor='rgba(0,0,0,0)',
-        legend_title_text='Тип отдыха',
-        hovermode='x unified',
-        height=600
-    )
-    
-    # Добавление средних линий для каждого типа
-    for rest_type in filtered_df['Type_of_rest'].unique():
-        mean_price = filtered_df[filtered_df['Type_of_rest'] == rest_type]['price'].mean()
-        fig.add_hline(
-            y=mean_price, 
-            line_dash='dot',
-            line_color=px.colors.qualitative.Set2[list(filtered_df['Type_of_rest'].unique()).index(rest_type)],
-            annotation_text=f'Среднее {rest_type}: {mean_price:,.0f} руб',
-            annotation_position='top right'
-        )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # Интерактивный график со средними линиями для каждого типа
+    st.plotly_chart(figures.get('origin_rest_bar', data), use_container_width=True)
     
     # 5. Выводы
     st.subheader("Ключевые выводы:")
-    dist_tab1, dist_tab2 = st.tabs(["Региональные различия", "Разница по типам отдыха"])
+    dist_tab1, dist_tab2, dist_tab3 = st.tabs(["Региональные различия", "Разница по типам отдыха",
+                                               "Статистические тесты"])
 
     with dist_tab1:
         st.markdown("""
@@ -426,8 +313,8 @@ elif page == "EDA":
         - Самые низкие цены в **Москве** и **Иркутске** (от {:,} руб) благодаря:
             - Высокой конкуренции авиакомпаний
             - Выгодному географическому положению """.format(
-            filtered_df['price'].max(),
-            filtered_df['price'].min()
+            rest_stats['max'].max(),
+            rest_stats['min'].min()
         ))
 
     with dist_tab2:
@@ -453,65 +340,29 @@ elif page == "EDA":
             ### Городской отдых:
             - Дешевле в Красноярске и Новосибирске
             - В Иркутске цены низкие из-за близости к Азии""")
+
+    with dist_tab3:
+        with st.spinner("Считаем тесты..."):
+            tests = get_tests().get(data)
+        st.markdown("""
+        Критерий Краскела-Уоллиса по каждой группировке и попарные сравнения
+        (Манн-Уитни и Уэлч) с поправкой Бенджамини-Хохберга. Учитываются группы
+        из 3 и более билетов.""")
+        st.dataframe(tests['kruskal'], hide_index=True, use_container_width=True)
+        pairwise = tests['pairwise']
+        st.dataframe(
+            pairwise[pairwise['u_significant']][['dimension', 'group_a', 'group_b', 'mean_a', 'mean_b',
+                                                 'u_p_adjusted', 'welch_p_adjusted']],
+            hide_index=True, use_container_width=True)
     
     
     st.header("🌍 Распределение типов отдыха по регионам")
     
-    # 1. Создаем функцию для группировки городов
-    def get_geo_group(city):
-        groups = {
-            'Дальний Восток': ['Владивосток', 'Хабаровск'],
-            'Урал': ['Екатеринбург', 'Уфа', 'Тюмень', 'Пермь', 'Челябинск'],
-            'Сибирь': ['Иркутск', 'Красноярск', 'Новосибирск', 'Омск', 'Томск', 'Барнаул'],
-            'Центральная Россия': ['Москва', 'Казань', 'Нижний Новгород', 'Самара', 'Воронеж',
-                                  'Ярославль', 'Тула', 'Рязань', 'Смоленск', 'Тверь', 'Иваново'],
-            'Северо-Запад': ['Санкт-Петербург', 'Калининград', 'Мурманск', 'Архангельск',
-                            'Петрозаводск', 'Великий Новгород', 'Псков'],
-            'Юг России': ['Сочи', 'Волгоград', 'Махачкала', 'Минеральные Воды',
-                         'Владикавказ', 'Ставрополь', 'Краснодар', 'Ростов-на-Дону', 'Астрахань'],
-            'Международные': ['Дубай', 'Абу-Даби', 'Мале', 'Бангкок', 'Коломбо', 'Сингапур',
-                             'Минск', 'Пхукет', 'Стамбул', 'Эль-Нидо', 'Себу', 'Катиклан',
-                             'Гонконг', 'Барселона', 'Баку', 'Вена', 'Белград', 'Астана',
-                             'Пекин', 'Шанхай', 'Канкун', 'Пунта-Кана', 'Санто-Доминго', 'Мехико']
-        }
-        for group, cities in groups.items():
-            if city in cities:
-                return group
-        return 'Другие'
-
-    # 2. Применяем группировку
-    df['geo_group'] = df['origin_name'].apply(get_geo_group)
-    
-    # 3. Создаем кросс-таблицу
-    cross_tab = pd.crosstab(
-        index=df['geo_group'],
-        columns=df['Type_of_rest'],
-        normalize='index'
-    ).round(3) * 100
-    
-    # 4. Строим интерактивную тепловую карту
-    fig = px.imshow(
-        cross_tab,
-        labels=dict(x="Тип отдыха", y="Регион", color="Доля, %"),
-        color_continuous_scale='YlGnBu',
-        text_auto=".1f",
-        aspect="auto"
-    )
+    # 1. Создаем кросс-таблицу по географическим группам городов вылета
+    cross_tab = cube.crosstab('geo_group', 'Type_of_rest', normalize='index').round(3) * 100
     
-    # 5. Настраиваем оформление
-    fig.update_layout(
-        title="Предпочтения типов отдыха по регионам (%)",
-        xaxis_title="Тип отдыха",
-        yaxis_title="Географическая группа",
-        height=600,
-        coloraxis_colorbar=dict(
-            title="Доля, %",
-            ticksuffix="%"
-        )
-    )
-    
-    # 6. Отображаем график
-    st.plotly_chart(fig, use_container_width=True)
+    # 2. Интерактивная тепловая карта
+    st.plotly_chart(figures.get('rest_heatmap', data), use_container_width=True)
     
     # 8. Добавляем аналитические выводы
     st.markdown("""
@@ -539,46 +390,62 @@ cross_tab.idxmax(axis=1)[cross_tab.max(axis=1).idxmin()],
 ", ".join(cross_tab[(cross_tab.max(axis=1) - cross_tab.min(axis=1)) < 15].index.tolist())
 ))
 
-elif page == "Тренды":
+
+def trends_page(data):
+    """Тренды: статистика по городу, сравнение городов и подбор по бюджету"""
+    df = data.df
+    cube = data.cube
+    queries = data.queries
+    price_index = data.price_index
+
     # Ценовые тренды
-    city_counts = df['origin_name'].value_counts()
-    filtered_df = df[df['origin_name'].isin(city_counts[city_counts > 2].index)]
+    city_counts = cube.rollup(['origin_name'])
+    frequent_cities = city_counts.loc[city_counts['count'] > 2, 'origin_name']
 
     st.header("Анализ ценовых трендов")
     selected_city = st.selectbox(
             "Выберите город для анализа:",
-            filtered_df['origin_name'].unique()
+            frequent_cities
         ) 
-    city_data = filtered_df[filtered_df['origin_name'] == selected_city]
     col1, col2 = st.columns(2)
     with col1:
         st.markdown(f"**Статистика по {selected_city}:**")
-        st.dataframe(city_data.groupby('Type_of_rest')['price'].describe().style.format('{:.1f}'))
+        city_describe = cube.describe(['Type_of_rest'], where={'origin_name': selected_city}).sort_index()
+        st.dataframe(city_describe.style.format('{:.1f}'))
         
     with col2:
         st.markdown("**Топ направлений:**")
-        st.dataframe(city_data.sort_values('price', ascending=False).head(3)[['destination_city', 'Type_of_rest', 'price']])
+        city_top = cube.rollup(['destination_city', 'Type_of_rest'], where={'origin_name': selected_city})
+        city_top = city_top.rename(columns={'max': 'price'})
+        st.dataframe(city_top.sort_values('price', ascending=False).head(3)[['destination_city', 'Type_of_rest', 'price']])
 
     #Сводная таблица цен по городам
     st.header("Сводная таблица цен")
+    origins = city_counts['origin_name'].tolist()
     compare_cities = st.multiselect(
     "Сравните города отправления",
-    options=df['origin_name'].unique(),
+    options=origins,
     default=["Москва", "Санкт-Петербург"]
     )
-    comparison_df = df[df['origin_name'].isin(compare_cities)].groupby('origin_name').agg({
-        'price': ['mean', 'min', 'max'],
-        'destination_city': 'nunique'
-    })
+    comparison_df = queries.compare_origins(compare_cities).set_index('origin_name')
+    # 95% бутстрэп-интервалы средней и медианы: у городов с 3-4 записями они широкие
+    intervals = data.intervals.astype({'origin_name': object}).set_index('origin_name')
+    comparison_df = comparison_df.join(intervals[['mean_low', 'mean_high', 'median', 'median_low', 'median_high']])
+    comparison_df = comparison_df[['mean', 'mean_low', 'mean_high', 'median', 'median_low', 'median_high',
+                                   'min', 'max', 'nunique']]
+    comparison_df.columns = pd.MultiIndex.from_tuples([
+        ('price', 'mean'), ('price', 'mean 95% low'), ('price', 'mean 95% high'),
+        ('price', 'median'), ('price', 'median 95% low'), ('price', 'median 95% high'),
+        ('price', 'min'), ('price', 'max'), ('destination_city', 'nunique')])
     st.dataframe(comparison_df.style.format('{:.1f}'))
 
 
     #Анализ "что если" с кнопкой
     st.subheader("Сценарий 'Что если'")
-    base_city = st.selectbox("Город вылета", df['origin_name'].unique())
+    base_city = st.selectbox("Город вылета", origins)
     budget = st.slider("Ваш бюджет (руб)", min_value=1000, value=20000)
     if st.button("Показать доступные направления"):
-        result_df = df[(df['origin_name'] == base_city) & (df['price'] <= budget)]
+        result_df = df.iloc[price_index.within_budget(base_city, budget)]
         st.write(f"Найденo {len(result_df)} направлений:")
         st.dataframe(result_df)
 
@@ -586,21 +453,21 @@ elif page == "Тренды":
     st.subheader("Самые выгодные предложения")
     col1, col2 = st.columns(2)
     with col1:
-        city_filter = st.selectbox("Город отправления", ["Все"] + list(df['origin_name'].unique()))
+        city_filter = st.selectbox("Город отправления", ["Все"] + origins)
     with col2:
-        rest_type_filter = st.selectbox("Тип отдыха", ["Все"] + list(df['Type_of_rest'].unique()))
+        rest_type_filter = st.selectbox("Тип отдыха", ["Все"] + cube.rollup(['Type_of_rest'])['Type_of_rest'].tolist())
 
-    filtered_df = df
-    if city_filter != "Все":
-        filtered_df = filtered_df[filtered_df['origin_name'] == city_filter]
-    if rest_type_filter != "Все":
-        filtered_df = filtered_df[filtered_df['Type_of_rest'] == rest_type_filter]
-
-    top5 = filtered_df.sort_values('price').head(5)
+    top5 = df.iloc[price_index.cheapest(
+        origin=None if city_filter == "Все" else city_filter,
+        rest_type=None if rest_type_filter == "Все" else rest_type_filter,
+        k=5
+    )]
     st.dataframe(top5)
 
+
 # 5. Раздел «Выводы»
-elif page == "Выводы":
+def conclusions_page(data):
+    """Выводы: инсайты и рекомендации"""
     st.header("Ключевые инсайты и рекомендации")
     
     # 1. Основные инсайты (в виде аккордеона)
@@ -671,4 +538,30 @@ elif page == "Выводы":
         ["Пляжный", "Городской", "Культурный", "Другое"]
     )
     if st.button("Отправить"):
-        st.toast(f"Спасибо! Ваш выбор: {user_feedback}", icon="👍")
\ No newline at end of file
+        st.toast(f"Спасибо! Ваш выбор: {user_feedback}", icon="👍")
+
+
+# НАВИГАЦИОННОЕ МЕНЮ
+pages = {
+    "Главная": ("Обзор данных и целей исследования", home_page),
+    "Данные": ("Исходные данные и базовый анализ", data_page),
+    "EDA": ("Углубленный разведочный анализ", eda_page),
+    "Тренды": ("Анализ закономерностей", trends_page),
+    "Выводы": ("Итоги и рекомендации", conclusions_page)
+}
+
+# Загрузка данных: одна версия на весь перезапуск скрипта
+data = get_store().state
+render_started = time.perf_counter()
+
+st.sidebar.title("Анализ популярных направлений")
+page = st.sidebar.radio("Разделы:", list(pages.keys()))
+st.sidebar.caption(f"Версия данных: {data.version} · записей: {len(data.df)}")
+
+# Каждая страница считает только свои данные
+pages[page][1](data)
+
+# Время построения страницы; заодно запускается прогрев графиков, если его ещё не было
+figures = get_figures()
+st.sidebar.caption(f"Страница «{page}» построена за {(time.perf_counter() - render_started) * 1000:.0f} мс · "
+                   f"графики из кэша: {figures.hits}/{figures.hits + figures.misses}")
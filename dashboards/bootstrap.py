@@ -0,0 +1,124 @@
+"""Файл с бутстрэп-интервалами для средних, медиан и квантилей цен сразу по всем группам
+
+Группы одного размера n обрабатываются вместе: одна матрица индексов
+resamples × n (номера наблюдений в каждой выборке с возвращением) общая
+для всех таких групп. Из неё получается матрица частот наблюдений.
+Средние — это произведение матрицы частот на матрицу цен. Цены в группах
+отсортированы, поэтому квантиль выборки находится по накопленным частотам,
+без сортировки самих выборок. Если матрица индексов не помещается в
+max_elements, выборки генерируются порциями (потоковый режим), так что
+память не растёт с размером групп.
+
+Интервалы процентильные. Генератор случайных чисел задаётся seed, поэтому
+повторный расчёт с теми же параметрами даёт те же интервалы.
+"""
+
+import numpy as np
+
+DEFAULT_RESAMPLES = 10_000
+MAX_ELEMENTS = 20_000_000  # элементов в одной порции матрицы индексов (~160 МБ)
+
+
+def statistic_name(statistic):
+    """Имя столбца для статистики: 'mean', 'median' или квантиль (0.9 → 'q90')"""
+    if isinstance(statistic, str):
+        return statistic
+    return f'q{statistic * 100:g}'
+
+
+def _quantile_level(statistic):
+    if statistic == 'median':
+        return 0.5
+    if isinstance(statistic, str):
+        raise ValueError(f'unknown statistic: {statistic!r}')
+    return float(statistic)
+
+
+def _positions(n, level):
+    """Соседние позиции и вес для квантиля с линейной интерполяцией (как в np.quantile)"""
+    position = level * (n - 1)
+    low = int(np.floor(position))
+    return low, min(low + 1, n - 1), position - low
+
+
+def _resample(values, indices, statistics):
+    """Статистики выборок: values — отсортированные группы (k × n), indices — (b × n)"""
+    k, n = values.shape
+    b = len(indices)
+    # частота каждого наблюдения в каждой выборке
+    counts = np.bincount((indices + np.arange(b)[:, None] * n).ravel(), minlength=b * n).reshape(b, n)
+    cumulative = None
+    result = {}
+    for statistic in statistics:
+        if statistic == 'mean':
+            result[statistic] = values @ counts.T / n
+            continue
+        if cumulative is None:
+            cumulative = counts.cumsum(axis=1)
+        low, high, weight = _positions(n, _quantile_level(statistic))
+        # номер наблюдения на позиции p отсортированной выборки — сколько накопленных частот не больше p
+        low, high = (cumulative <= low).sum(axis=1), (cumulative <= high).sum(axis=1)
+        result[statistic] = values[:, low] * (1 - weight) + values[:, high] * weight
+    return result
+
+
+def bootstrap_ci(df, by, value='price', statistics=('mean',), n_resamples=DEFAULT_RESAMPLES,
+                 confidence=0.95, seed=0, max_elements=MAX_ELEMENTS):
+    """Точечные оценки и бутстрэп-интервалы статистик value для всех групп by
+
+    statistics — 'mean', 'median' и уровни квантилей (например, 0.25).
+    Для каждой статистики в результате три столбца: оценка, <имя>_low и
+    <имя>_high. Для группы из одного наблюдения интервал вырождается в точку.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    names = [statistic_name(statistic) for statistic in statistics]
+    keys = df[by].reset_index(drop=True)
+    prices = df[value].to_numpy(dtype='float64')
+    keep = ~np.isnan(prices)
+    grouped = keys[keep].groupby(by, observed=True, sort=True)
+    codes = grouped.ngroup().to_numpy()
+    groups = grouped.size()
+    sizes = groups.to_numpy()
+
+    # цены, отсортированные по группе и внутри группы
+    prices = prices[keep][np.lexsort((prices[keep], codes))]
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    rng = np.random.default_rng(seed)
+    tail = (1 - confidence) / 2
+    columns = {name: np.empty(len(sizes)) for name in names}
+    columns.update({f'{name}_{side}': np.empty(len(sizes)) for name in names for side in ('low', 'high')})
+
+    for n in np.unique(sizes):
+        members = np.flatnonzero(sizes == n)
+        values = prices[starts[members][:, None] + np.arange(n)]
+        for statistic, name in zip(statistics, names):
+            if statistic == 'mean':
+                columns[name][members] = values.mean(axis=1)
+            else:
+                low, high, weight = _positions(n, _quantile_level(statistic))
+                columns[name][members] = values[:, low] * (1 - weight) + values[:, high] * weight
+
+        samples = {statistic: [] for statistic in statistics}
+        batch = max(1, max_elements // n)
+        for start in range(0, n_resamples, batch):
+            indices = rng.integers(0, n, size=(min(batch, n_resamples - start), n))
+            for statistic, sample in _resample(values, indices, statistics).items():
+                samples[statistic].append(sample)
+
+        for statistic, name in zip(statistics, names):
+            low, high = np.quantile(np.hstack(samples[statistic]), [tail, 1 - tail], axis=1)
+            columns[f'{name}_low'][members] = low
+            columns[f'{name}_high'][members] = high
+
+    result = groups.index.to_frame(index=False)
+    result['n'] = sizes
+    for name in names:
+        for column in (name, f'{name}_low', f'{name}_high'):
+            result[column] = columns[column]
+    return result
+
+
+def error_bars(frame, name='mean'):
+    """Длины усов вверх и вниз от оценки для plotly (error_y, error_y_minus)"""
+    return frame[f'{name}_high'] - frame[name], frame[name] - frame[f'{name}_low']
@@ -0,0 +1,363 @@
+"""Файл с версионированным хранилищем данных дашборда и фоновым отслеживанием обновлений"""
+
+import glob
+import hashlib
+import io
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from aggregates import build_cube
+from bootstrap import bootstrap_ci
+from price_index import PriceIndex
+from schema import CATEGORY_COLUMNS, PRICE_DTYPE, concat_frames, prepare_frame, read_final_dataframe
+
+SNAPSHOT_COLUMNS = ['destination_city', 'destination_country', 'origin_name', 'price']
+WORKING_SET_DIR = os.environ.get("DASHBOARD_WORKING_SET_DIR", "data/.working_set")
+INTERVAL_RESAMPLES = 1000  # выборок бутстрэпа для интервалов на графиках и в таблицах
+
+
+def price_mode(df):
+    """Самая частая цена (точная, как df['price'].mode()[0]); по кубу её не посчитать"""
+    mode = df['price'].mode()
+    return float(mode.iloc[0]) if len(mode) else float('nan')
+
+
+def origin_intervals(df):
+    """Бутстрэп-интервалы средней и медианной цены для всех городов вылета"""
+    return bootstrap_ci(df, 'origin_name', statistics=('mean', 'median'), n_resamples=INTERVAL_RESAMPLES)
+
+
+class DataState:
+    """Неизменяемый набор данных одной версии: таблица и всё, что из неё построено
+
+    Куб, ценовой индекс, запросы DuckDB, бутстрэп-интервалы по городам
+    вылета и мода цен строятся лениво, при первом обращении: страница, которой нужна
+    только таблица, не платит за остальное, а duckdb даже не импортируется.
+    """
+
+    def __init__(self, version, df, factories, table=None):
+        self.version = version
+        self.df = df
+        self.table = table
+        self._factories = dict(factories)
+        self._built = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        with self._lock:
+            if name not in self._built:
+                self._built[name] = self._factories.pop(name)()
+            return self._built[name]
+
+    @property
+    def cube(self):
+        return self._get('cube')
+
+    @property
+    def price_index(self):
+        return self._get('price_index')
+
+    @property
+    def queries(self):
+        return self._get('queries')
+
+    @property
+    def intervals(self):
+        return self._get('intervals')
+
+    @property
+    def price_mode(self):
+        return self._get('price_mode')
+
+    @classmethod
+    def build(cls, version, df, table=None):
+        """Состояние по таблице df; table — та же таблица в Arrow (с row_id) для DuckDB"""
+        def queries():
+            from query import PriceQueries  # duckdb нужен только страницам с запросами
+            return PriceQueries(table if table is not None else df)
+
+        return cls(version, df, {
+            'cube': lambda: build_cube(df),
+            'price_index': lambda: PriceIndex.build(df),
+            'queries': queries,
+            'intervals': lambda: origin_intervals(df),
+            'price_mode': lambda: price_mode(df),
+        }, table)
+
+    def append(self, version, new_rows, table=None):
+        """Новое состояние: к таблице, кубу, индексу и DuckDB дописываются только новые строки
+
+        Таблица DuckDB общая для всех версий, но каждая версия читает
+        только свои строки. Из прежней версии берутся только уже
+        построенные части, а не она сама: иначе каждая версия держала бы
+        предыдущую вместе с её таблицей, а построение части шло бы по всей
+        цепочке версий. Что у прежней версии не построено, новая строит
+        с нуля. Бутстрэп-интервалы и моду нельзя сложить, их новая версия
+        считает заново. table — новая версия рабочего набора, отображённая
+        в память (с row_id): тогда таблица и запросы DuckDB читают её на месте.
+        """
+        new_rows = prepare_frame(new_rows)
+        if table is not None:
+            df = table.drop_columns(['row_id']).to_pandas(split_blocks=True)
+        else:
+            df = concat_frames(self.df, new_rows)
+        state = DataState.build(version, df, table)
+
+        with self._lock:
+            cube, index, queries = (self._built.get(name) for name in ('cube', 'price_index', 'queries'))
+        if cube is not None:
+            state._factories['cube'] = lambda: cube.merge(build_cube(new_rows))
+        if index is not None:
+            def price_index():
+                extended = index.copy()
+                extended.extend(new_rows)
+                return extended
+            state._factories['price_index'] = price_index
+        if queries is not None and table is None:
+            state._factories['queries'] = lambda: queries.append(new_rows)
+        return state
+
+
+class DataStore:
+    """Текущая версия данных дашборда с «горячей» перезагрузкой
+
+    Источник — CSV-файл или каталог снимков Parquet (data/snapshots).
+    Для CSV версия — число прочитанных байт и их хэш; об изменении файла
+    говорят его размер и время изменения. Если файл только дописали в
+    конец, читается лишь новый хвост до последней полной строки. Для
+    каталога снимков версия — число прочитанных файлов, новые файлы
+    дописываются по одному.
+    Полная перезагрузка нужна, только если CSV переписан целиком.
+    """
+
+    def __init__(self, source, poll_interval=30, working_set_dir=WORKING_SET_DIR):
+        self.source = source
+        self.working_set_dir = working_set_dir
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._csv_stamp = None
+        self._csv_offset = 0
+        self._csv_hash = None
+        self._seen_files = set()
+        self._listeners = []
+        self.state = self._load()
+
+    @property
+    def is_snapshot_dir(self):
+        return os.path.isdir(self.source)
+
+    # Загрузка с нуля
+    def _load(self):
+        if self.is_snapshot_dir:
+            files = self._snapshot_files()
+            self._seen_files = set(files)
+            version = f'snapshots:{len(files)}'
+            read = lambda: prepare_frame(_read_snapshots(files))
+        else:
+            self._csv_stamp = _csv_stamp(self.source)
+            self._csv_offset, self._csv_hash = _csv_fingerprint(self.source)
+            version = self._csv_version()
+            # читаются ровно те байты, по которым посчитан хэш: строки,
+            # дописанные после этого, прочитает следующая проверка
+            offset = self._csv_offset
+            read = lambda: read_final_dataframe(io.BufferedReader(_FilePrefix(self.source, offset)))
+        if not self.working_set_dir:
+            return DataState.build(version, read())
+        table = map_working_set(self.source, version, read, self.working_set_dir)
+        df = table.drop_columns(['row_id']).to_pandas(split_blocks=True)
+        return DataState.build(version, df, table)
+
+    def _snapshot_files(self):
+        return sorted(glob.glob(os.path.join(self.source, '**', '*.parquet'), recursive=True))
+
+    # Проверка обновлений
+    def refresh(self):
+        """Подхватить новые данные; возвращает True, если версия сменилась"""
+        with self._lock:
+            changed = self._refresh()
+            state = self.state
+        if changed:
+            for callback in self._listeners:
+                callback(state)
+        return changed
+
+    def _refresh(self):
+        if self.is_snapshot_dir:
+            new_files = [f for f in self._snapshot_files() if f not in self._seen_files]
+            if not new_files:
+                return False
+            self._seen_files.update(new_files)
+            self.state = self._append(f'snapshots:{len(self._seen_files)}', _read_snapshots(new_files))
+            return True
+
+        stamp = _csv_stamp(self.source)
+        if stamp == self._csv_stamp:
+            return False
+        self._csv_stamp = stamp
+        if (os.path.getsize(self.source) >= self._csv_offset
+                and _hash(self.source, self._csv_offset).digest() == self._csv_hash.digest()):
+            tail = _read_csv_tail(self.source, self._csv_offset)
+            if not tail:
+                return False  # дописывается первая новая строка
+            rows = _parse_csv_tail(self.source, tail, list(self.state.df.columns))
+            # смещение и хэш сдвигаются ровно на прочитанные байты
+            self._csv_offset += len(tail)
+            self._csv_hash.update(tail)
+            self.state = self._append(self._csv_version(), rows)
+        else:
+            self.state = self._load()
+        return True
+
+    def _append(self, version, rows):
+        """Новая версия с дописанными строками
+
+        Если данные отображены в память, для новой версии записывается и
+        отображается новый рабочий набор (это делает первый процесс, которому
+        он нужен), иначе после первого же дописывания каждый процесс держал бы
+        свою копию всей таблицы.
+        """
+        rows = prepare_frame(rows)
+        table = None
+        if self.working_set_dir and self.state.table is not None:
+            base = self.state.table
+            table = map_working_set(self.source, version, lambda: _append_rows(base, rows), self.working_set_dir)
+        return self.state.append(version, rows, table)
+
+    def _csv_version(self):
+        return f'csv:{self._csv_offset}-{self._csv_hash.hexdigest()[:16]}'
+
+    def subscribe(self, callback):
+        """Вызывать callback(state) после каждой смены версии (в потоке, который её обнаружил)"""
+        self._listeners.append(callback)
+
+    def start_watcher(self):
+        """Фоновый поток, который раз в poll_interval секунд вызывает refresh()"""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name='data-watcher', daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:  # недописанный файл и т.п. — попробуем в следующий раз
+                print(f"Data refresh failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+
+def map_working_set(source, version, read, working_set_dir=WORKING_SET_DIR):
+    """Рабочий набор данных версии version как Arrow-таблица, отображённая в память
+
+    Первый процесс, которому нужна эта версия, вызывает read() (DataFrame
+    или Arrow-таблица без row_id) и сохраняет результат в несжатый файл
+    Arrow IPC; остальные процессы
+    и все сессии только отображают его в память (только для чтения),
+    поэтому страницы памяти с данными у них общие.
+    """
+    prefix = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:12]
+    name = f"{prefix}-{hashlib.sha1(version.encode('utf-8')).hexdigest()[:12]}.arrow"
+    path = os.path.join(working_set_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(working_set_dir, exist_ok=True)
+        table = read()
+        if isinstance(table, pd.DataFrame):
+            table = pa.Table.from_pandas(table, preserve_index=False)
+        table = table.append_column('row_id', pa.array(range(table.num_rows), pa.int64()))
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        # старые версии этого источника больше не нужны (уже открытые отображения
+        # в других процессах при этом остаются рабочими)
+        for other in glob.glob(os.path.join(working_set_dir, f'{prefix}-*.arrow')):
+            if other != path:
+                try:
+                    os.remove(other)
+                except OSError:
+                    pass
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def _append_rows(table, rows):
+    """Arrow-таблица без row_id: строки table, за ними rows, одним куском и с общими словарями категорий"""
+    table = table.drop_columns(['row_id'])
+    rows = pa.Table.from_pandas(rows[table.column_names], schema=table.schema, preserve_index=False)
+    return pa.concat_tables([table, rows]).unify_dictionaries().combine_chunks()
+
+
+def _csv_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _FilePrefix(io.RawIOBase):
+    """Первые length байт файла как поток только для чтения"""
+
+    def __init__(self, path, length):
+        self._file = open(path, 'rb')
+        self._remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)[:self._remaining]
+        read = self._file.readinto(view)
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _hash(path, length):
+    """SHA-256 первых length байт файла (объект hashlib, его можно продолжать)"""
+    sha = hashlib.sha256()
+    with _FilePrefix(path, length) as f:
+        while chunk := f.read(1 << 20):
+            sha.update(chunk)
+    return sha
+
+
+def _csv_fingerprint(path):
+    """Размер файла до последнего полного перевода строки и хэш этой части"""
+    with open(path, 'rb') as f:
+        data_size = os.path.getsize(path)
+        f.seek(max(0, data_size - 1))
+        if f.read(1) != b'\n':
+            # последняя строка дописывается прямо сейчас — её прочитаем позже
+            f.seek(0)
+            data_size = f.read().rfind(b'\n') + 1
+    return data_size, _hash(path, data_size)
+
+
+def _read_csv_tail(path, offset):
+    """Байты после offset до последнего полного перевода строки"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        tail = f.read()
+    return tail[:tail.rfind(b'\n') + 1]
+
+
+def _parse_csv_tail(path, tail, columns):
+    names = pd.read_csv(path, nrows=0).columns.tolist()
+    df = pd.read_csv(io.BytesIO(tail), header=None, names=names,
+                     dtype={column: 'category' for column in CATEGORY_COLUMNS if column in names}
+                     | {'price': PRICE_DTYPE})
+    return df[[column for column in columns if column in df.columns]]
+
+
+def _read_snapshots(files):
+    if not files:
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in SNAPSHOT_COLUMNS[:-1]}
+                            | {'price': pd.Series(dtype=PRICE_DTYPE)})
+    return pd.concat([pd.read_parquet(f, columns=SNAPSHOT_COLUMNS) for f in files], ignore_index=True)
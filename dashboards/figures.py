@@ -0,0 +1,370 @@
+"""Файл с построением тяжёлых графиков дашборда и кэшем их готовых спецификаций"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.io as pio
+
+from bootstrap import bootstrap_ci, error_bars
+from datastore import INTERVAL_RESAMPLES
+from gazetteer import get_gazetteer
+from routes import MIN_ZOOM, arc_lines, bucket_labels, price_edges, route_layer, route_stats, view_center
+
+# plotly.express импортируется внутри функций: на импорт уходит около 0.3 с,
+# а страницам без графиков он не нужен
+
+# Цвета ценовых корзин маршрутов: от дешёвых (синий) к дорогим (красный)
+ROUTE_COLORS = ['#2c7bb6', '#00a6ca', '#90eb9d', '#f9d057', '#f29e2e', '#d7191c']
+
+
+def price_histogram(data, nbins=30):
+    """Гистограмма цен с боксиграммой и линией среднего
+
+    Корзины и квартили считаются здесь, и в спецификацию попадают только
+    nbins столбцов и пять чисел боксиграммы, а не все цены.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    avg_price = data.cube.total()['mean']
+    prices = data.df['price'].dropna().to_numpy()
+    counts, edges = np.histogram(prices, bins=nbins)
+
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.02)
+    fig.add_trace(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="Цена: %{customdata[0]:,.0f}–%{customdata[1]:,.0f} руб<br>"
+                      "Количество билетов: %{y}<extra></extra>",
+        marker_color="#1f77b4",
+        opacity=0.8,
+        showlegend=False
+    ), row=2, col=1)
+
+    if len(prices):
+        # боксиграмма по готовым квартилям; усы — крайние цены внутри 1.5·IQR
+        q1, median, q3 = np.quantile(prices, [0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        fig.add_trace(go.Box(
+            y=["Цена"],
+            q1=[q1], median=[median], q3=[q3], mean=[avg_price],
+            lowerfence=[prices[prices >= q1 - 1.5 * iqr].min()],
+            upperfence=[prices[prices <= q3 + 1.5 * iqr].max()],
+            orientation="h",
+            marker_color="#1f77b4",
+            showlegend=False
+        ), row=1, col=1)
+
+    # Настройка внешнего вида
+    fig.update_layout(
+        title="Распределение цен на авиабилеты",
+        bargap=0.1,
+        hovermode="x unified",
+        plot_bgcolor="rgba(0,0,0,0)"
+    )
+    fig.update_xaxes(showgrid=True, gridcolor="lightgray")
+    fig.update_xaxes(title_text="Цена билета (руб)", row=2, col=1)
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    fig.update_yaxes(title_text="Количество билетов", showgrid=True, gridcolor="lightgray", row=2, col=1)
+
+    # Добавляем вертикальную линию среднего значения
+    fig.add_vline(
+        x=avg_price,
+        line_dash="dot",
+        annotation_text=f"Среднее: {avg_price:,.0f} руб",
+        annotation_position="top",
+        row=2, col=1
+    )
+    return fig
+
+
+def destinations_map(data):
+    """Карта направлений: цвет — средняя цена, размер — число рейсов"""
+    import plotly.express as px
+
+    city_stats = data.cube.rollup(['destination_city', 'destination_country']).rename(
+        columns={'mean': 'avg_price', 'count': 'flight_count'})
+
+    # Добавляем координаты из справочника; города без координат на карту не попадают
+    city_stats['lat'], city_stats['lon'] = get_gazetteer().coordinates(city_stats['destination_city'])
+    city_stats = city_stats.dropna(subset=['lat', 'lon'])
+
+    return px.scatter_geo(city_stats,
+                          lat='lat',
+                          lon='lon',
+                          color='avg_price',
+                          size='flight_count',
+                          hover_name='destination_city',
+                          hover_data=['destination_country', 'avg_price', 'flight_count'],
+                          projection='natural earth',
+                          title='Распределение направлений по средней цене и количеству рейсов',
+                          color_continuous_scale='Viridis')
+
+
+def origin_prices_bar(data, min_directions=3):
+    """Средняя цена из городов вылета, у которых не меньше min_directions записей, с 95% интервалами"""
+    import plotly.express as px
+
+    city_counts = data.cube.counts('origin_name')
+    valid_cities = city_counts[city_counts >= min_directions].index.tolist()
+    avg_prices = data.cube.rollup(['origin_name'], where={'origin_name': valid_cities})
+    avg_prices = avg_prices[['origin_name', 'mean']].rename(columns={'mean': 'price'})
+    min_price = avg_prices['price'].min()
+    max_price = avg_prices['price'].max()
+
+    # бутстрэп-интервалы средней: у городов с 3-4 записями они широкие
+    intervals = data.intervals[['origin_name', 'mean', 'mean_low', 'mean_high']]
+    avg_prices = avg_prices.merge(intervals.astype({'origin_name': object}),
+                                  on='origin_name', how='left')
+    avg_prices['error_plus'], avg_prices['error_minus'] = error_bars(avg_prices)
+
+    fig = px.bar(
+        avg_prices.sort_values('price'),
+        x='origin_name',
+        y='price',
+        color='price',
+        color_continuous_scale=[(0, '#1f77b4'), (1, '#ff7f0e')],
+        range_color=[min_price, max_price],
+        title=f'Средняя стоимость авиабилетов из городов с {min_directions}+ направлениями',
+        labels={'origin_name': 'Город отправления', 'price': 'Средняя цена (руб)',
+                'mean_low': '95% ДИ от', 'mean_high': '95% ДИ до'},
+        error_y='error_plus',
+        error_y_minus='error_minus',
+        hover_data={'mean_low': ':.0f', 'mean_high': ':.0f', 'error_plus': False, 'error_minus': False},
+        text_auto='.0f',
+        height=500
+    )
+
+    # Выделяем минимальное и максимальное значения
+    fig.update_traces(
+        marker_line_color='rgba(0,0,0,0.7)',
+        marker_line_width=1.5,
+        textposition='outside'
+    )
+
+    # Настройки отображения
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        yaxis_range=[min(min_price, avg_prices['mean_low'].min())*0.9,
+                     max(max_price, avg_prices['mean_high'].max())*1.1],
+        hovermode='x',
+        coloraxis_showscale=False,
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+
+def origin_rest_bar(data, min_directions=3):
+    """Сгруппированные столбцы цен по городам вылета и типам отдыха с линиями средних и 95% интервалами"""
+    import plotly.express as px
+
+    city_counts = data.cube.counts('origin_name')
+    valid_cities = city_counts[city_counts >= min_directions].index.tolist()
+    origin_rest_prices = data.cube.rollup(['origin_name', 'Type_of_rest'], where={'origin_name': valid_cities})
+    origin_rest_prices = origin_rest_prices.rename(columns={'mean': 'price', 'count': 'flight_count'})
+
+    keys = ['origin_name', 'Type_of_rest']
+    intervals = bootstrap_ci(data.df[data.df['origin_name'].isin(valid_cities)], keys,
+                             n_resamples=INTERVAL_RESAMPLES).drop(columns='n')
+    origin_rest_prices = origin_rest_prices.merge(intervals.astype({key: object for key in keys}), on=keys, how='left')
+    origin_rest_prices['error_plus'], origin_rest_prices['error_minus'] = error_bars(origin_rest_prices)
+    rest_stats = data.cube.rollup(['Type_of_rest'], where={'origin_name': valid_cities})
+    rest_types = rest_stats['Type_of_rest'].tolist()
+
+    fig = px.bar(
+        origin_rest_prices,
+        x='origin_name',
+        y='price',
+        color='Type_of_rest',
+        category_orders={'Type_of_rest': rest_types},
+        barmode='group',
+        title='Средняя стоимость билетов по городам отправления и типам отдыха',
+        labels={
+            'origin_name': 'Город отправления',
+            'price': 'Цена (руб)',
+            'Type_of_rest': 'Тип отдыха'
+        },
+        color_discrete_sequence=px.colors.qualitative.Set2,
+        error_y='error_plus',
+        error_y_minus='error_minus',
+        hover_data={'flight_count': True, 'min': True, 'max': True,
+                    'error_plus': False, 'error_minus': False}
+    )
+
+    # Настройка внешнего вида
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        yaxis_gridcolor='lightgray',
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend_title_text='Тип отдыха',
+        hovermode='x unified',
+        height=600
+    )
+
+    # Добавление средних линий для каждого типа
+    for i, (rest_type, mean_price) in enumerate(zip(rest_types, rest_stats['mean'])):
+        fig.add_hline(
+            y=mean_price,
+            line_dash='dot',
+            line_color=px.colors.qualitative.Set2[i],
+            annotation_text=f'Среднее {rest_type}: {mean_price:,.0f} руб',
+            annotation_position='top right'
+        )
+    return fig
+
+
+def rest_heatmap(data):
+    """Тепловая карта долей типов отдыха по географическим группам городов вылета"""
+    import plotly.express as px
+
+    cross_tab = data.cube.crosstab('geo_group', 'Type_of_rest', normalize='index').round(3) * 100
+    fig = px.imshow(
+        cross_tab,
+        labels=dict(x="Тип отдыха", y="Регион", color="Доля, %"),
+        color_continuous_scale='YlGnBu',
+        text_auto=".1f",
+        aspect="auto"
+    )
+
+    # Настраиваем оформление
+    fig.update_layout(
+        title="Предпочтения типов отдыха по регионам (%)",
+        xaxis_title="Тип отдыха",
+        yaxis_title="Географическая группа",
+        height=600,
+        coloraxis_colorbar=dict(
+            title="Доля, %",
+            ticksuffix="%"
+        )
+    )
+    return fig
+
+
+def route_map(data, view='Весь мир', zoom=MIN_ZOOM):
+    """Маршруты из городов вылета: кластеры городов и дуги, окрашенные по средней цене"""
+    import plotly.graph_objects as go
+
+    routes = route_stats(data)
+    edges = price_edges(routes)
+    clusters, visible = route_layer(routes, view, zoom, edges=edges)
+    labels = bucket_labels(edges)
+
+    fig = go.Figure()
+    for bucket, (lat, lon) in sorted(arc_lines(visible).items()):
+        color = ROUTE_COLORS[bucket * (len(ROUTE_COLORS) - 1) // max(len(labels) - 1, 1)]
+        fig.add_trace(go.Scattergeo(lat=lat, lon=lon, mode='lines', line=dict(width=1.5, color=color),
+                                    opacity=0.7, name=labels[bucket], legendgroup=labels[bucket],
+                                    hoverinfo='skip'))
+        # подсказка маршрута — на середине дуги
+        routes_in_bucket = visible[visible['bucket'] == bucket]
+        fig.add_trace(go.Scattergeo(
+            lat=((routes_in_bucket['origin_lat'] + routes_in_bucket['destination_lat']) / 2).round(3),
+            lon=((routes_in_bucket['origin_lon'] + routes_in_bucket['destination_lon']) / 2).round(3),
+            mode='markers', marker=dict(size=5, color=color), legendgroup=labels[bucket], showlegend=False,
+            hovertext=[f'{origin} → {destination}<br>Предложений: {count}<br>'
+                       f'Средняя цена: {mean:,.0f} руб<br>Минимальная: {low:,.0f} руб'
+                       for origin, destination, count, mean, low in zip(
+                           routes_in_bucket['origin_label'], routes_in_bucket['destination_label'],
+                           routes_in_bucket['count'], routes_in_bucket['mean'], routes_in_bucket['min'])],
+            hoverinfo='text'))
+
+    fig.add_trace(go.Scattergeo(
+        lat=clusters['lat'].round(3), lon=clusters['lon'].round(3), mode='markers',
+        marker=dict(size=(6 + 3 * np.sqrt(clusters['count'])).clip(upper=40).round(1), color='#333333',
+                    opacity=0.8, line=dict(width=1, color='white')),
+        hovertext=[f'{label}<br>Предложений: {count}' for label, count in zip(clusters['label'], clusters['count'])],
+        hoverinfo='text', name='Города'))
+
+    center_lat, center_lon = view_center(view)
+    fig.update_geos(projection_type='natural earth', projection_scale=2 ** (zoom - 1),
+                    center=dict(lat=center_lat, lon=center_lon), projection_rotation=dict(lon=center_lon),
+                    showcountries=True, countrycolor='lightgray', showland=True, landcolor='#f5f5f5')
+    fig.update_layout(title='Маршруты из городов вылета по средней цене', height=600,
+                      legend_title_text='Средняя цена', margin=dict(l=0, r=0, t=50, b=0))
+    return fig
+
+
+FIGURES = {
+    'price_histogram': price_histogram,
+    'destinations_map': destinations_map,
+    'origin_prices_bar': origin_prices_bar,
+    'origin_rest_bar': origin_rest_bar,
+    'rest_heatmap': rest_heatmap,
+    'route_map': route_map,
+}
+
+
+class FigureCache:
+    """Кэш готовых графиков, общий для всех сессий
+
+    Ключ — имя графика, версия данных и параметры. Хранится JSON-спецификация
+    фигуры, поэтому при повторном показе не нужно заново запускать plotly
+    express и проверять все трассы: get() отдаёт словарь, который можно сразу
+    передать в st.plotly_chart. Старые версии вытесняются по LRU, а прогрев
+    удаляет графики версий старше keep_versions последних: сессии, ещё
+    открытые на предыдущей версии, продолжают получать их из кэша.
+    """
+
+    def __init__(self, max_entries=64, keep_versions=2):
+        self.max_entries = max_entries
+        self.keep_versions = keep_versions
+        self.hits = 0
+        self.misses = 0
+        self._specs = OrderedDict()
+        self._building = {}
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, data, **params):
+        """Спецификация графика name для состояния данных data"""
+        key = (name, data.version, tuple(sorted(params.items())))
+        while True:
+            with self._lock:
+                spec = self._specs.get(key)
+                if spec is not None:
+                    self._specs.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(spec)
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    break
+            # этот график уже строит другой поток (например, прогрев) — ждём его
+            building.wait()
+
+        try:
+            # строим вне блокировки: другие графики в это время отдаются из кэша
+            spec = pio.to_json(FIGURES[name](data, **params), validate=False)
+            with self._lock:
+                self.misses += 1
+                self._specs[key] = spec
+                while len(self._specs) > self.max_entries:
+                    self._specs.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+        return json.loads(spec)
+
+    def warm(self, data):
+        """Построить все графики с параметрами по умолчанию для новой версии данных
+
+        Спецификации версий старше keep_versions последних прогретых удаляются.
+        """
+        with self._lock:
+            self._versions[data.version] = None
+            self._versions.move_to_end(data.version)
+            while len(self._versions) > self.keep_versions:
+                self._versions.popitem(last=False)
+            for key in [key for key in self._specs if key[1] not in self._versions]:
+                del self._specs[key]
+        for name in FIGURES:
+            self.get(name, data)
+
+    def warm_in_background(self, data):
+        """warm() в отдельном потоке, чтобы не задерживать отрисовку страницы"""
+        threading.Thread(target=self.warm, args=(data,), name='figure-warmup', daemon=True).start()
@@ -0,0 +1,143 @@
+"""Файл с офлайн-справочником городов (координаты, страна, регион) и пространственным индексом"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+EARTH_RADIUS_KM = 6371.0088
+FIELDS = ['city', 'iata', 'country', 'region', 'lat', 'lon']
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по большому кругу в километрах (работает с массивами)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64')) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _unit_vectors(lat, lon):
+    """Точки на единичной сфере: в них евклидово расстояние монотонно по дуге"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def _km_to_chord(km):
+    return 2 * np.sin(np.minimum(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class Gazetteer:
+    """Справочник городов в виде массивов с KD-деревом по координатам
+
+    Запись ищется по русскому названию города или коду IATA. Поиск
+    по столбцу векторизован: для категориального столбца справочник
+    применяется только к категориям. KD-дерево (scipy) строится при
+    первом пространственном запросе и хранит точки на единичной сфере,
+    поэтому ближайшие соседи и поиск в радиусе считаются по дуге.
+    """
+
+    def __init__(self, frame):
+        frame = frame.reset_index(drop=True)
+        self.city = frame['city'].to_numpy(dtype=object)
+        self.iata = frame['iata'].fillna('').to_numpy(dtype=object)
+        self.country = pd.Categorical(frame['country'])
+        self.region = pd.Categorical(frame['region'])
+        self.lat = frame['lat'].to_numpy(dtype='float64')
+        self.lon = frame['lon'].to_numpy(dtype='float64')
+        # один хэш-индекс для названий и кодов IATA: позиция ключа → номер записи
+        has_iata = self.iata != ''
+        self._keys = pd.Index(np.concatenate([self.city, self.iata[has_iata]]))
+        self._key_rows = np.concatenate([np.arange(len(frame)), np.flatnonzero(has_iata)])
+        self._tree = None
+
+    @classmethod
+    def load(cls, path=GAZETTEER_FILE):
+        return cls(pd.read_csv(path, dtype={'iata': str}))
+
+    def __len__(self):
+        return len(self.city)
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            from scipy.spatial import cKDTree  # scipy нужен только пространственным запросам
+            self._tree = cKDTree(_unit_vectors(self.lat, self.lon))
+        return self._tree
+
+    def positions(self, keys):
+        """Номера записей для названий или кодов IATA; -1 — город не найден"""
+        if isinstance(keys, pd.Series) and isinstance(keys.dtype, pd.CategoricalDtype):
+            codes = keys.cat.codes.to_numpy()
+            category_rows = self.positions(keys.cat.categories.to_numpy(dtype=object))
+            return np.where(codes >= 0, category_rows[codes], -1)
+        found = self._keys.get_indexer(np.asarray(keys, dtype=object))
+        return np.where(found >= 0, self._key_rows[found], -1)
+
+    def records(self, rows, index=None):
+        """Таблица записей по их номерам (для -1 — пропуски)"""
+        rows = np.asarray(rows)
+        known = rows >= 0
+        take = np.where(known, rows, 0)
+        frame = pd.DataFrame({
+            'city': self.city[take],
+            'iata': self.iata[take],
+            'country': self.country.take(take),
+            'region': self.region.take(take),
+            'lat': self.lat[take],
+            'lon': self.lon[take],
+        }, index=index)
+        if not known.all():
+            frame.loc[~known] = np.nan
+        return frame
+
+    def lookup(self, keys):
+        """Справочные поля для каждого значения keys (например, целого столбца)"""
+        return self.records(self.positions(keys), index=keys.index if isinstance(keys, pd.Series) else None)
+
+    def coordinates(self, keys):
+        """Широты и долготы для keys; для неизвестных городов — NaN"""
+        rows = self.positions(keys)
+        known = rows >= 0
+        return np.where(known, self.lat[rows], np.nan), np.where(known, self.lon[rows], np.nan)
+
+    def distance_km(self, origins, destinations):
+        """Расстояние по большому кругу для каждой пары (город вылета, город назначения)"""
+        return haversine_km(*self.coordinates(origins), *self.coordinates(destinations))
+
+    def subset(self, keys):
+        """Справочник только из городов keys (неизвестные пропускаются)"""
+        rows = np.unique(self.positions(pd.unique(np.asarray(keys, dtype=object))))
+        rows = rows[rows >= 0]
+        return Gazetteer(self.records(rows))
+
+    def nearest(self, lat, lon, k=1):
+        """k ближайших городов к каждой точке: (номера записей, расстояния в км)"""
+        distances, rows = self.tree.query(_unit_vectors(np.atleast_1d(lat), np.atleast_1d(lon)), k=k)
+        return rows, _chord_to_km(distances)
+
+    def within(self, lat, lon, radius_km):
+        """Города не дальше radius_km от точки, по возрастанию расстояния"""
+        rows = np.array(self.tree.query_ball_point(_unit_vectors([lat], [lon])[0], _km_to_chord(radius_km)),
+                        dtype='int64')
+        result = self.records(rows)
+        result['distance_km'] = haversine_km(lat, lon, self.lat[rows], self.lon[rows])
+        return result.sort_values('distance_km', ignore_index=True)
+
+    def near(self, key, radius_km):
+        """Города не дальше radius_km от города key (по названию или коду IATA)"""
+        row = self.positions([key])[0]
+        if row < 0:
+            raise KeyError(key)
+        return self.within(self.lat[row], self.lon[row], radius_km)
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer(path=GAZETTEER_FILE):
+    """Справочник, загруженный один раз на процесс"""
+    return Gazetteer.load(path)
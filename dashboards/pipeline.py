@@ -0,0 +1,299 @@
+"""Файл с конвейером подготовки данных: load → validate → clean → enrich → publish
+
+Запуск из корня проекта:
+    python dashboards/pipeline.py                               # data/popular_destinations_9may.csv
+    python dashboards/pipeline.py --source data/snapshots       # все снимки Parquet
+    python dashboards/pipeline.py --drop-outliers               # как clean_df в ноутбуке
+
+Каждый файл источника (CSV или файл снимка) — отдельная часть. Результат
+каждого этапа для части сохраняется в data/pipeline под ключом из хэша
+содержимого входа и настроек этапа, поэтому неизменившиеся части и этапы
+пропускаются. Части читаются и пишутся пачками по --chunk-rows строк.
+Если к прежнему набору частей добавились только новые, publish дописывает
+их в конец data/final_dataframe.csv, и дашборд читает только новый хвост.
+Границы выбросов считаются по всему набору, поэтому с --drop-outliers новая
+часть, сдвинувшая границы, заново чистит и переписывает все части.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema import DESTINATION_TO_REST
+
+SOURCE = 'data/popular_destinations_9may.csv'
+OUTPUT = 'data/final_dataframe.csv'
+PIPELINE_DIR = 'data/pipeline'
+CHUNK_ROWS = 100_000
+# меняется при изменении логики этапов: старые результаты тогда не подходят
+PIPELINE_VERSION = 2
+
+TEXT_COLUMNS = ['destination_city', 'destination_country', 'origin_name']
+FINAL_COLUMNS = TEXT_COLUMNS + ['price', 'Type_of_rest']
+PART_SCHEMA = pa.schema([(column, pa.string()) for column in TEXT_COLUMNS]
+                        + [('price', pa.float64()), ('Type_of_rest', pa.string())])
+
+
+def _file_digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _stage_key(name, input_key, config):
+    payload = json.dumps([PIPELINE_VERSION, name, input_key, config], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# Этапы над пачкой строк
+def load_chunk(chunk, context=None):
+    """Только нужные столбцы в общих типах; нечисловая цена становится NaN"""
+    result = pd.DataFrame({column: chunk[column].astype('string') if column in chunk else None
+                           for column in TEXT_COLUMNS})
+    result['price'] = pd.to_numeric(chunk['price'], errors='coerce').astype('float64')
+    result['Type_of_rest'] = chunk['Type_of_rest'].astype('string') if 'Type_of_rest' in chunk else None
+    return result
+
+
+def validate_chunk(chunk, context=None):
+    """Строки с пустыми городами или неположительной ценой отбрасываются"""
+    for column in TEXT_COLUMNS:
+        chunk[column] = chunk[column].str.strip()
+    valid = chunk['price'].gt(0)
+    for column in TEXT_COLUMNS:
+        valid &= chunk[column].fillna('').ne('')
+    return chunk[valid]
+
+
+def iqr_bounds(paths, factor):
+    """Границы выбросов по правилу 1.5·IQR для цены по всем частям сразу (читается только столбец price)"""
+    prices = pd.concat([pq.read_table(path, columns=['price']).column('price').to_pandas() for path in paths]
+                       or [pd.Series(dtype='float64')], ignore_index=True)
+    q1, q3 = prices.quantile(0.25), prices.quantile(0.75)
+    iqr = q3 - q1
+    lower, upper = q1 - factor * iqr, q3 + factor * iqr
+    return {'lower': float(lower), 'upper': float(upper),
+            'outliers': int(((prices < lower) | (prices > upper)).sum())}
+
+
+def clean_chunk(chunk, bounds):
+    return chunk[chunk['price'].between(bounds['lower'], bounds['upper'])]
+
+
+def enrich_chunk(chunk, context=None):
+    """Тип отдыха по городу назначения (если его ещё нет)"""
+    missing = chunk['Type_of_rest'].isna()
+    if missing.any():
+        chunk.loc[missing, 'Type_of_rest'] = chunk.loc[missing, 'destination_city'].map(DESTINATION_TO_REST)
+    return chunk
+
+
+def _iter_source(path, chunk_rows):
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype={column: str for column in TEXT_COLUMNS})
+
+
+def _iter_part(path, chunk_rows):
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+def _format_prices(chunk):
+    """Целые цены пишутся без «.0», как в исходных выгрузках; цены с копейками — как есть
+
+    Формат выбирается для каждого значения, а не для пачки, поэтому одна и
+    та же цена записывается одинаково при любом --chunk-rows.
+    """
+    prices = chunk['price']
+    whole = prices % 1 == 0
+    text = prices.astype(str)
+    text[whole] = prices[whole].astype('int64').astype(str)
+    return chunk.assign(price=text)
+
+
+class Pipeline:
+    """Конвейер подготовки data/final_dataframe.csv с пропуском неизменившихся этапов"""
+
+    def __init__(self, source=SOURCE, output=OUTPUT, workdir=PIPELINE_DIR, chunk_rows=CHUNK_ROWS,
+                 drop_outliers=False, iqr_factor=1.5):
+        self.source = source
+        self.output = output
+        self.workdir = workdir
+        self.chunk_rows = chunk_rows
+        self.drop_outliers = drop_outliers
+        self.iqr_factor = iqr_factor
+        self.manifest_file = os.path.join(workdir, 'manifest.json')
+
+    def partitions(self):
+        """Файлы источника в порядке записи (снимки — по дате и времени сбора)"""
+        if os.path.isdir(self.source):
+            return sorted(glob.glob(os.path.join(self.source, '**', '*.parquet'), recursive=True))
+        return [self.source]
+
+    def run(self, force=False):
+        """Прогнать все этапы; возвращает отчёт по этапам и способ публикации"""
+        report = {stage: {'run': 0, 'skipped': 0, 'rows_in': 0, 'rows_out': 0}
+                  for stage in ('load', 'validate', 'clean', 'enrich')}
+        keep = set()
+        validated = []
+        for path in self.partitions():
+            key, part = self._stage('load', _file_digest(path), {}, path, load_chunk,
+                                    report, keep, force, source=True)
+            validated.append(self._stage('validate', key, {}, part, validate_chunk, report, keep, force))
+
+        # границы выбросов общие для всего набора, поэтому считаются до clean
+        # отдельным проходом по цене всех частей
+        bounds = iqr_bounds([part for _, part in validated], self.iqr_factor)
+        report['clean']['outliers'] = bounds['outliers']
+        clean_config = {'drop': self.drop_outliers}
+        if self.drop_outliers:
+            clean_config |= {'lower': bounds['lower'], 'upper': bounds['upper']}
+
+        parts = []
+        for key, part in validated:
+            key, part = self._stage('clean', key, clean_config, part,
+                                    clean_chunk if self.drop_outliers else None, report, keep, force,
+                                    context=bounds)
+            key, part = self._stage('enrich', key, {'rest': DESTINATION_TO_REST}, part, enrich_chunk,
+                                    report, keep, force)
+            parts.append((key, part))
+        report['publish'] = self._publish(parts, force)
+        self._collect_garbage(keep)
+        return report
+
+    def _stage(self, name, input_key, config, input_path, transform, report, keep, force,
+               context=None, source=False):
+        """Один этап для одной части; результат берётся из data/pipeline, если уже есть
+
+        transform=None — этап только собирает статистику, и его выход
+        совпадает со входом (без копирования файла). context передаётся в
+        transform и должен быть отражён в config, иначе ключ устареет.
+        """
+        key = _stage_key(name, input_key, config)
+        stage_dir = os.path.join(self.workdir, name)
+        stats_path = os.path.join(stage_dir, f'{key}.json')
+        part_path = os.path.join(stage_dir, f'{key}.parquet') if transform is not None else input_path
+        keep.update({stats_path, part_path})
+
+        if not force and os.path.exists(stats_path) and os.path.exists(part_path):
+            with open(stats_path, encoding='utf-8') as f:
+                stats = json.load(f)
+            report[name]['skipped'] += 1
+        else:
+            os.makedirs(stage_dir, exist_ok=True)
+            stats = {'rows_in': 0, 'rows_out': 0}
+            chunks = _iter_source(input_path, self.chunk_rows) if source else _iter_part(input_path, self.chunk_rows)
+            if transform is None:
+                for chunk in chunks:
+                    stats['rows_in'] += len(chunk)
+                stats['rows_out'] = stats['rows_in']
+            else:
+                tmp_path = f'{part_path}.tmp'
+                with pq.ParquetWriter(tmp_path, PART_SCHEMA) as writer:
+                    for chunk in chunks:
+                        stats['rows_in'] += len(chunk)
+                        chunk = transform(chunk, context)
+                        stats['rows_out'] += len(chunk)
+                        writer.write_table(pa.Table.from_pandas(chunk[FINAL_COLUMNS], schema=PART_SCHEMA,
+                                                                preserve_index=False))
+                os.replace(tmp_path, part_path)
+            with open(stats_path, 'w', encoding='utf-8') as f:
+                json.dump(stats, f)
+            report[name]['run'] += 1
+        report[name]['rows_in'] += stats['rows_in']
+        report[name]['rows_out'] += stats['rows_out']
+        return key, part_path
+
+    def _load_manifest(self):
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, encoding='utf-8') as f:
+                return json.load(f)
+        return {'parts': [], 'output': None}
+
+    def _output_stat(self):
+        if not os.path.exists(self.output):
+            return None
+        stat = os.stat(self.output)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _publish(self, parts, force):
+        """Записать итоговый CSV: без изменений, дописыванием новых частей или целиком"""
+        manifest = self._load_manifest()
+        keys = [key for key, _ in parts]
+        published = manifest['parts']
+        intact = manifest['output'] == self._output_stat() and manifest.get('path') == self.output
+        if not force and intact and keys == published:
+            return {'mode': 'unchanged', 'rows': 0}
+
+        if not force and intact and published and keys[:len(published)] == published:
+            mode, new_parts, target, header = 'append', parts[len(published):], self.output, False
+        else:
+            mode, new_parts, target, header = 'rewrite', parts, f'{self.output}.tmp', True
+            os.makedirs(os.path.dirname(self.output) or '.', exist_ok=True)
+            open(target, 'w', encoding='utf-8').close()
+
+        rows = 0
+        with open(target, 'a', encoding='utf-8', newline='') as f:
+            for _, part in new_parts:
+                for chunk in _iter_part(part, self.chunk_rows):
+                    _format_prices(chunk).to_csv(f, index=False, header=header)
+                    header = False
+                    rows += len(chunk)
+            if header:
+                # ни одной строки — всё равно записываем заголовок
+                pd.DataFrame(columns=FINAL_COLUMNS).to_csv(f, index=False)
+        if mode == 'rewrite':
+            os.replace(target, self.output)
+
+        os.makedirs(self.workdir, exist_ok=True)
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({'parts': keys, 'path': self.output, 'output': self._output_stat()}, f)
+        return {'mode': mode, 'rows': rows}
+
+    def _collect_garbage(self, keep):
+        """Удалить результаты этапов, которые не нужны текущему набору частей"""
+        keep = {os.path.abspath(path) for path in keep}
+        for path in glob.glob(os.path.join(self.workdir, '*', '*')):
+            if os.path.abspath(path) not in keep:
+                os.remove(path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare data/final_dataframe.csv for the dashboard")
+    parser.add_argument('--source', default=SOURCE, help="CSV file or snapshot directory")
+    parser.add_argument('--output', default=OUTPUT)
+    parser.add_argument('--workdir', default=PIPELINE_DIR, help="Where stage results are kept")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--drop-outliers', action='store_true',
+                        help="Drop prices outside the IQR bounds of the whole data set")
+    parser.add_argument('--iqr-factor', type=float, default=1.5)
+    parser.add_argument('--force', action='store_true', help="Rerun every stage and rewrite the output")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pipeline = Pipeline(args.source, args.output, args.workdir, args.chunk_rows,
+                        args.drop_outliers, args.iqr_factor)
+    report = pipeline.run(force=args.force)
+    for stage in ('load', 'validate', 'clean', 'enrich'):
+        stats = report[stage]
+        extra = f", outliers {stats['outliers']}" if 'outliers' in stats else ''
+        print(f"{stage:<9} run {stats['run']}, skipped {stats['skipped']}, "
+              f"rows {stats['rows_in']} -> {stats['rows_out']}{extra}")
+    print(f"publish   {report['publish']['mode']}, {report['publish']['rows']} rows -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
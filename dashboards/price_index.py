@@ -0,0 +1,101 @@
+"""Файл с индексом цен для быстрых запросов «в пределах бюджета» и «топ-k дешёвых»"""
+
+import numpy as np
+
+ORIGIN = 'origin_name'
+REST_TYPE = 'Type_of_rest'
+
+
+class PriceIndex:
+    """Отсортированные по цене массивы с номерами строк
+
+    Ключи: (None, None) — все строки, (город, None), (None, тип отдыха)
+    и (город, тип отдыха). Запрос «до бюджета» — это бинарный поиск,
+    «k самых дешёвых» — срез первых k элементов.
+    """
+
+    def __init__(self):
+        self._prices = {}
+        self._rows = {}
+        self.size = 0
+
+    @classmethod
+    def build(cls, df):
+        index = cls()
+        index.extend(df)
+        return index
+
+    def extend(self, df):
+        """Добавление новых строк (например, нового снимка) без перестройки индекса
+
+        Строки получают номера self.size, self.size + 1, ... — как при
+        pd.concat([старая таблица, df]). Затрагиваются только ключи,
+        которые встречаются в df; новые цены вливаются в уже
+        отсортированные массивы слиянием.
+        """
+        positions = np.arange(self.size, self.size + len(df), dtype=np.int64)
+        prices = df['price'].to_numpy(dtype=np.float64)
+        origins = df[ORIGIN].astype('category')
+        rest_types = df[REST_TYPE].astype('category')
+        origin_codes = origins.cat.codes.to_numpy(dtype=np.int64)
+        rest_codes = rest_types.cat.codes.to_numpy(dtype=np.int64)
+        n_rest = len(rest_types.cat.categories)
+
+        # коды ключей для каждого вида индекса: -1 — строка в ключ не попадает
+        key_kinds = {
+            (False, False): np.zeros(len(df), dtype=np.int64),
+            (True, False): origin_codes,
+            (False, True): rest_codes,
+            (True, True): np.where((origin_codes >= 0) & (rest_codes >= 0),
+                                   origin_codes * n_rest + rest_codes, -1),
+        }
+        for (by_origin, by_rest), codes in key_kinds.items():
+            # сортировка по ключу, затем по цене, затем по номеру строки
+            order = np.lexsort((positions, prices, codes))
+            sorted_codes = codes[order]
+            starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+            for start, end in zip(starts, ends):
+                code = sorted_codes[start]
+                if code < 0:
+                    continue
+                if by_origin and by_rest:
+                    origin, rest_type = divmod(code, n_rest)
+                    key = (origins.cat.categories[origin], rest_types.cat.categories[rest_type])
+                elif by_origin:
+                    key = (origins.cat.categories[code], None)
+                elif by_rest:
+                    key = (None, rest_types.cat.categories[code])
+                else:
+                    key = (None, None)
+                rows = order[start:end]
+                self._merge(key, prices[rows], positions[rows])
+        self.size += len(df)
+
+    def copy(self):
+        """Копия для дописывания: массивы общие, они не меняются на месте"""
+        index = PriceIndex()
+        index._prices, index._rows, index.size = dict(self._prices), dict(self._rows), self.size
+        return index
+
+    def _merge(self, key, prices, rows):
+        if key not in self._prices:
+            self._prices[key], self._rows[key] = prices, rows
+            return
+        old_prices, old_rows = self._prices[key], self._rows[key]
+        at = np.searchsorted(old_prices, prices, side='right')
+        self._prices[key] = np.insert(old_prices, at, prices)
+        self._rows[key] = np.insert(old_rows, at, rows)
+
+    def within_budget(self, origin, budget, rest_type=None):
+        """Номера строк с ценой не выше budget (в порядке строк таблицы)"""
+        key = (origin, rest_type)
+        if key not in self._prices:
+            return np.empty(0, dtype=np.int64)
+        end = np.searchsorted(self._prices[key], budget, side='right')
+        return np.sort(self._rows[key][:end])
+
+    def cheapest(self, origin=None, rest_type=None, k=5):
+        """Номера строк k самых дешёвых предложений (по возрастанию цены)"""
+        rows = self._rows.get((origin, rest_type))
+        return rows[:k] if rows is not None else np.empty(0, dtype=np.int64)
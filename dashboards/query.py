@@ -0,0 +1,138 @@
+"""Файл с запросами к данным через встроенную СУБД DuckDB"""
+
+import copy
+import threading
+from functools import lru_cache
+
+import duckdb
+import pyarrow as pa
+
+COLUMN_TYPES = {
+    'destination_city': 'VARCHAR',
+    'destination_country': 'VARCHAR',
+    'origin_name': 'VARCHAR',
+    'price': 'DOUBLE',
+    'Type_of_rest': 'VARCHAR',
+}
+
+
+class PriceQueries:
+    """Параметризованные запросы дашборда к таблице цен
+
+    Данные (путь к CSV или DataFrame) загружаются в DuckDB один раз, с
+    приведением типов и индексом по городу вылета. Arrow-таблица с колонкой
+    row_id не копируется, а читается на месте: категории DuckDB и так
+    читает как VARCHAR, поэтому приводить типы не нужно. Кэшируются только
+    агрегаты (маленькие таблицы), запросы, возвращающие строки, каждый раз
+    выполняются заново: иначе кэш держал бы почти полные копии таблицы.
+    Каждый поток получает свой курсор, поэтому объект можно разделять между
+    сессиями Streamlit.
+
+    Объект — одна версия данных: запросы читают представление с первыми
+    size строками, а append() возвращает новую версию. Поэтому сессии на
+    прежней версии не видят дописанных строк.
+    """
+
+    def __init__(self, source, cache_size=256):
+        self._connection = duckdb.connect(':memory:')
+        self._local = threading.local()
+        self.size = 0
+        self._shared = None
+        if isinstance(source, pa.Table):
+            # Arrow-таблица (например, отображённая в память) читается DuckDB
+            # напрямую, без копии; новая версия такой таблицы — новый PriceQueries
+            self._shared = source
+            self._connection.register('shared_rows', source)
+            columns = ', '.join(f'"{name}"' for name in COLUMN_TYPES)
+            self._connection.execute(f'CREATE VIEW all_prices AS SELECT row_id, {columns} FROM shared_rows')
+        elif isinstance(source, str):
+            self._connection.execute(
+                f'CREATE TABLE all_prices AS SELECT row_number() OVER () - 1 AS row_id, * '
+                f'FROM read_csv(?, header = true, columns = {_struct(COLUMN_TYPES)})',
+                [source])
+        else:
+            self._connection.execute(f'CREATE TABLE all_prices (row_id BIGINT, {_columns_sql()})')
+            self._insert(source)
+        if self._shared is None:
+            self._connection.execute('CREATE INDEX prices_origin ON all_prices (origin_name)')
+        self._cache_size = cache_size
+        self._open(self._connection.execute('SELECT count(*) FROM all_prices').fetchone()[0])
+
+    def _open(self, size):
+        """Версия из первых size строк: своё представление и свой кэш агрегатов"""
+        self.size = size
+        self._view = f'prices_{size}'
+        self._connection.execute(
+            f'CREATE OR REPLACE VIEW {self._view} AS SELECT * FROM all_prices WHERE row_id < {size}')
+        self._cached = lru_cache(maxsize=self._cache_size)(self.run)
+
+    def _insert(self, df):
+        frame = df[list(COLUMN_TYPES)]
+        self._connection.register('new_rows', frame)
+        casts = ', '.join(f'CAST("{name}" AS {kind})' for name, kind in COLUMN_TYPES.items())
+        self._connection.execute(
+            f'INSERT INTO all_prices SELECT ? + row_number() OVER () - 1, {casts} FROM new_rows',
+            [self.size])
+        self._connection.unregister('new_rows')
+
+    def append(self, df):
+        """Новая версия с дописанными строками (номера продолжают существующие)
+
+        Строки попадают в общую таблицу, но эта версия их не видит: её
+        представление ограничено прежним числом строк. Отображённую в
+        память Arrow-таблицу не дописывают.
+        """
+        if self._shared is not None:
+            raise TypeError('Arrow-backed PriceQueries is read-only; build one for the new table instead')
+        self._insert(df)
+        version = copy.copy(self)
+        version._open(self.size + len(df))
+        return version
+
+    def _cursor(self):
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None:
+            cursor = self._local.cursor = self._connection.cursor()
+            if self._shared is not None:
+                # зарегистрированные объекты видны только своему курсору
+                cursor.register('shared_rows', self._shared)
+        return cursor
+
+    def run(self, sql, params=()):
+        """Выполнение запроса без кэша"""
+        params = [list(p) if isinstance(p, tuple) else p for p in params]
+        result = self._cursor().execute(sql, params).df()
+        if 'row_id' in result.columns:
+            # row_id — номер строки в файле, как индекс исходного DataFrame
+            result = result.set_index('row_id').rename_axis(None)
+        return result
+
+    def run_cached(self, sql, params=()):
+        """Выполнение запроса с кэшем по тексту и параметрам — только для небольших результатов
+
+        Результат общий для всех, кто задал те же параметры, менять его нельзя.
+        """
+        key = tuple(tuple(p) if isinstance(p, (list, set)) else p for p in params)
+        return self._cached(sql, key)
+
+    def rows_from_price(self, min_price):
+        """Все строки с ценой не ниже min_price в исходном порядке"""
+        return self.run(f'SELECT * FROM {self._view} WHERE price >= ? ORDER BY row_id', [min_price])
+
+    def compare_origins(self, origins):
+        """Средняя, минимальная и максимальная цена и число направлений по городам вылета"""
+        return self.run_cached(
+            f'''SELECT origin_name, avg(price) AS mean, min(price) AS min, max(price) AS max,
+                      count(DISTINCT destination_city) AS nunique
+               FROM {self._view} WHERE list_contains(?, origin_name)
+               GROUP BY origin_name ORDER BY origin_name''',
+            [list(origins)])
+
+
+def _columns_sql():
+    return ', '.join(f'"{name}" {kind}' for name, kind in COLUMN_TYPES.items())
+
+
+def _struct(columns):
+    fields = ', '.join(f"'{name}': '{kind}'" for name, kind in columns.items())
+    return '{' + fields + '}'
@@ -0,0 +1,203 @@
+"""Файл со слоем маршрутов для карты: агрегаты маршрутов, кластеры по масштабу и дуги большого круга
+
+Маршруты (город вылета → город назначения) агрегируются на сервере по кубу
+цен. На каждом масштабе города, которые на экране ближе CLUSTER_PIXELS друг
+к другу, сливаются в кластер (сетка в проекции Меркатора), а маршруты между
+кластерами складываются. В браузер уходят только видимые в выбранной области
+маршруты, не больше max_routes самых частых, а дуги имеют ограниченное число
+точек. Поэтому размер карты не растёт с числом маршрутов в данных.
+"""
+
+import numpy as np
+import pandas as pd
+
+from gazetteer import get_gazetteer, haversine_km
+
+# Области карты: центр (широта, долгота); кроме них карту можно центрировать на городе
+VIEWS = {
+    'Весь мир': (30, 60),
+    'Россия': (60, 90),
+    'Европа и Ближний Восток': (45, 30),
+    'Азия': (25, 100),
+    'Америка': (20, -80),
+}
+MIN_ZOOM, MAX_ZOOM = 1, 6
+CLUSTER_PIXELS = 40      # города ближе этого расстояния на экране сливаются в кластер
+TILE_PIXELS = 256        # ширина мира в пикселях на масштабе 0, как у веб-карт
+MAX_ROUTES = 300
+PRICE_BUCKETS = 5
+ARC_STEP_KM = 250        # примерно одна точка дуги на столько километров
+MAX_ARC_POINTS = 32
+COORDINATE_DIGITS = 3    # ~100 м: точнее на карте не видно, а JSON короче
+
+
+def route_stats(data):
+    """Все маршруты с числом предложений, ценами и координатами концов"""
+    routes = data.cube.rollup(['origin_name', 'destination_city'])
+    routes = routes[['origin_name', 'destination_city', 'count', 'sum', 'min']].astype(
+        {'origin_name': object, 'destination_city': object})
+    gazetteer = get_gazetteer()
+    routes['origin_lat'], routes['origin_lon'] = gazetteer.coordinates(routes['origin_name'])
+    routes['destination_lat'], routes['destination_lon'] = gazetteer.coordinates(routes['destination_city'])
+    # маршруты с городами не из справочника на карту не попадают
+    return routes.dropna(subset=['origin_lat', 'destination_lat']).reset_index(drop=True)
+
+
+def price_edges(routes, buckets=PRICE_BUCKETS):
+    """Границы ценовых корзин по квантилям средних цен всех маршрутов
+
+    Границы считаются по всем маршрутам, а не только по видимым, поэтому
+    цвет маршрута не меняется при смене области и масштаба. Без маршрутов
+    (пустые данные или ни один город не нашёлся в справочнике) границ нет.
+    """
+    if routes.empty:
+        return np.array([])
+    mean = routes['sum'] / routes['count']
+    return np.unique(np.quantile(mean, np.linspace(0, 1, buckets + 1)[1:-1]).round(-2))
+
+
+def _mercator(lat, lon):
+    """Координаты в проекции Меркатора, нормированные на [0, 1]"""
+    lat = np.radians(np.clip(lat, -85, 85))
+    return (np.asarray(lon) + 180) / 360, (1 - np.log(np.tan(np.pi / 4 + lat / 2)) / np.pi) / 2
+
+
+def cluster_cities(cities, zoom):
+    """Кластеры городов на масштабе zoom
+
+    cities — таблица city, lat, lon, count. Возвращает номер кластера для
+    каждого города и таблицу кластеров: центр (взвешенный по числу
+    предложений), подпись по самому крупному городу, число городов и
+    предложений.
+    """
+    cell = CLUSTER_PIXELS / (TILE_PIXELS * 2 ** zoom)
+    x, y = _mercator(cities['lat'].to_numpy(), cities['lon'].to_numpy())
+    _, labels = np.unique(np.column_stack([np.floor(x / cell), np.floor(y / cell)]), axis=0, return_inverse=True)
+    labels = labels.ravel()
+
+    weight = cities['count'].to_numpy(dtype='float64')
+    total = np.bincount(labels, weight)
+    largest = cities.assign(label=labels).sort_values('count', ascending=False).drop_duplicates('label')
+    largest = largest.set_index('label').sort_index()
+    size = np.bincount(labels)
+    clusters = pd.DataFrame({
+        'lat': np.bincount(labels, weight * cities['lat']) / total,
+        'lon': np.bincount(labels, weight * cities['lon']) / total,
+        'count': total.astype('int64'),
+        'cities': size,
+        'label': [city if n == 1 else f'{city} и ещё {n - 1}' for city, n in zip(largest['city'], size)],
+    })
+    return labels, clusters
+
+
+def view_center(view):
+    """Центр области: одна из VIEWS или город из справочника"""
+    if view in VIEWS:
+        return VIEWS[view]
+    lat, lon = get_gazetteer().coordinates([view])
+    if np.isnan(lat[0]):
+        raise KeyError(view)
+    return float(lat[0]), float(lon[0])
+
+
+def _in_view(lat, lon, center, zoom):
+    """Попадает ли точка в область вокруг center на масштабе zoom (с запасом)"""
+    half_lat, half_lon = 1.2 * 90 / 2 ** (zoom - 1), 1.2 * 180 / 2 ** (zoom - 1)
+    delta_lon = (np.asarray(lon) - center[1] + 180) % 360 - 180
+    return (np.abs(np.asarray(lat) - center[0]) <= half_lat) & (np.abs(delta_lon) <= half_lon)
+
+
+def route_layer(routes, view='Весь мир', zoom=MIN_ZOOM, max_routes=MAX_ROUTES, edges=None):
+    """Видимые кластеры и маршруты между ними для области view и масштаба zoom
+
+    view — название из VIEWS или город, вокруг которого строится карта.
+    Маршруты между одними и теми же кластерами складываются: число
+    предложений и сумма цен суммируются, минимальная цена — минимум.
+    Маршрут виден, если в области хотя бы один его конец; из видимых
+    остаются max_routes самых частых. Возвращает (кластеры, маршруты).
+    """
+    center = view_center(view)
+    cities = pd.concat([
+        pd.DataFrame({'city': routes['origin_name'], 'lat': routes['origin_lat'],
+                      'lon': routes['origin_lon'], 'count': routes['count']}),
+        pd.DataFrame({'city': routes['destination_city'], 'lat': routes['destination_lat'],
+                      'lon': routes['destination_lon'], 'count': routes['count']}),
+    ]).groupby('city', sort=False).agg(lat=('lat', 'first'), lon=('lon', 'first'), count=('count', 'sum'))
+    labels, clusters = cluster_cities(cities.reset_index(), zoom)
+
+    position = cities.index
+    merged = pd.DataFrame({
+        'origin': labels[position.get_indexer(routes['origin_name'])],
+        'destination': labels[position.get_indexer(routes['destination_city'])],
+        'count': routes['count'], 'sum': routes['sum'], 'min': routes['min'],
+    })
+    merged = merged[merged['origin'] != merged['destination']]
+    merged = merged.groupby(['origin', 'destination'], sort=False).agg(
+        count=('count', 'sum'), sum=('sum', 'sum'), min=('min', 'min'), routes=('count', 'size')).reset_index()
+    merged['mean'] = merged['sum'] / merged['count']
+    for end in ('origin', 'destination'):
+        for field in ('lat', 'lon', 'label'):
+            merged[f'{end}_{field}'] = clusters[field].to_numpy()[merged[end]]
+
+    visible = (_in_view(merged['origin_lat'], merged['origin_lon'], center, zoom)
+               | _in_view(merged['destination_lat'], merged['destination_lon'], center, zoom))
+    merged = merged[visible].sort_values(['count', 'mean'], ascending=[False, True]).head(max_routes)
+    edges = price_edges(routes) if edges is None else edges
+    merged['bucket'] = np.searchsorted(edges, merged['mean'], side='right')
+
+    clusters = clusters[_in_view(clusters['lat'], clusters['lon'], center, zoom)]
+    return clusters.reset_index(drop=True), merged.reset_index(drop=True)
+
+
+def great_circle(lat1, lon1, lat2, lon2, points):
+    """Дуги большого круга из points точек: массивы широт и долгот (маршруты × points)"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype='float64'))[:, None] for v in (lat1, lon1, lat2, lon2))
+    start = np.stack([np.cos(lat1) * np.cos(lon1), np.cos(lat1) * np.sin(lon1), np.sin(lat1)], axis=-1)
+    end = np.stack([np.cos(lat2) * np.cos(lon2), np.cos(lat2) * np.sin(lon2), np.sin(lat2)], axis=-1)
+    angle = np.arccos(np.clip((start * end).sum(axis=-1), -1, 1))
+    t = np.linspace(0, 1, points)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # сферическая интерполяция; для совпадающих концов — линейная
+        sin_angle = np.sin(angle)
+        a = np.where(sin_angle > 1e-9, np.sin((1 - t) * angle) / sin_angle, 1 - t)
+        b = np.where(sin_angle > 1e-9, np.sin(t * angle) / sin_angle, t)
+    point = a[..., None] * start + b[..., None] * end
+    lat = np.degrees(np.arcsin(np.clip(point[..., 2], -1, 1)))
+    lon = np.degrees(np.arctan2(point[..., 1], point[..., 0]))
+    return lat, lon
+
+
+def arc_lines(routes):
+    """Дуги маршрутов по ценовым корзинам: {корзина: (широты, долготы)} с None между дугами
+
+    Число точек дуги растёт с её длиной (одна на ARC_STEP_KM), но не больше
+    MAX_ARC_POINTS. Все дуги одной корзины — одна линия plotly с разрывами.
+    """
+    distance = haversine_km(routes['origin_lat'], routes['origin_lon'],
+                            routes['destination_lat'], routes['destination_lon'])
+    points = np.clip(np.ceil(distance / ARC_STEP_KM).astype('int64') + 1, 2, MAX_ARC_POINTS)
+    arcs = [None] * len(routes)
+    for n in np.unique(points):
+        rows = np.flatnonzero(points == n)
+        lat, lon = great_circle(routes['origin_lat'].to_numpy()[rows], routes['origin_lon'].to_numpy()[rows],
+                                routes['destination_lat'].to_numpy()[rows],
+                                routes['destination_lon'].to_numpy()[rows], n)
+        for row, arc_lat, arc_lon in zip(rows, lat.round(COORDINATE_DIGITS), lon.round(COORDINATE_DIGITS)):
+            arcs[row] = arc_lat.tolist(), arc_lon.tolist()
+
+    lines = {}
+    for bucket, arc in zip(routes['bucket'], arcs):
+        lat, lon = lines.setdefault(bucket, ([], []))
+        lat.extend(arc[0] + [None])
+        lon.extend(arc[1] + [None])
+    return lines
+
+
+def bucket_labels(edges):
+    """Подписи ценовых корзин для легенды"""
+    bounds = [f'{edge:,.0f}'.replace(',', ' ') for edge in edges]
+    if not bounds:
+        return ['Все цены']
+    return ([f'до {bounds[0]} руб']
+            + [f'{low}–{high} руб' for low, high in zip(bounds, bounds[1:])]
+            + [f'от {bounds[-1]} руб'])
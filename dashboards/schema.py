@@ -0,0 +1,77 @@
+"""Файл с типизированной схемой данных дашборда"""
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from aggregates import CITY_TO_GEO_GROUP, OTHER_GEO_GROUP
+
+CATEGORY_COLUMNS = ['destination_city', 'destination_country', 'origin_name', 'Type_of_rest']
+# В ценах встречаются копейки (например, 20351.41): int32 их потеряет,
+# а float32 выводит 54792.34 как 54792.33984375, поэтому цена остаётся float64
+PRICE_DTYPE = 'float64'
+
+# Тип отдыха для направлений (как в notebooks/template.ipynb)
+DESTINATION_TO_REST = {
+    'Мале': 'Пляжный отдых',
+    'Дубай': 'Пляжный отдых',
+    'Варадеро': 'Пляжный отдых',
+    'Маврикий': 'Пляжный отдых',
+    'Ташкент': 'Культурный отдых',
+    'Стамбул': 'Культурный отдых',
+    'Белград': 'Культурный отдых',
+    'Токио': 'Культурный отдых',
+    'Коломбо': 'Городской отдых',
+    'Бангкок': 'Городской отдых',
+    'Манила': 'Городской отдых',
+    'Подгорица': 'Городской отдых',
+}
+
+
+def lookup_column(column, mapping, default=None):
+    """Поиск по словарю для категориального столбца
+
+    Словарь применяется только к категориям (их единицы или десятки),
+    а строки получают результат через готовые коды категорий.
+    """
+    categories = column.cat.categories
+    mapped = pd.Series(categories.map(lambda value: mapping.get(value, default)), dtype=object)
+    result_categories = pd.Index(sorted(mapped.dropna().unique()))
+    codes = result_categories.get_indexer(mapped)
+    row_codes = codes[column.cat.codes.to_numpy()]
+    row_codes[column.cat.codes.to_numpy() == -1] = -1
+    return pd.Series(pd.Categorical.from_codes(row_codes, result_categories), index=column.index)
+
+
+def prepare_frame(df):
+    """Приведение таблицы (из CSV или снимка) к схеме дашборда
+
+    Города, страны и типы отдыха хранятся как категории. Столбец
+    geo_group (и Type_of_rest, если его нет) вычисляется здесь один раз
+    по категориям, а не по каждой строке.
+    """
+    df = df.astype({column: 'category' for column in CATEGORY_COLUMNS if column in df.columns}
+                   | {'price': PRICE_DTYPE})
+    if 'Type_of_rest' not in df.columns:
+        df['Type_of_rest'] = lookup_column(df['destination_city'], DESTINATION_TO_REST)
+    df['geo_group'] = lookup_column(df['origin_name'], CITY_TO_GEO_GROUP, OTHER_GEO_GROUP)
+    return df
+
+
+def read_final_dataframe(path):
+    """Чтение итоговой таблицы с компактными типами"""
+    df = pd.read_csv(path, dtype={column: 'category' for column in CATEGORY_COLUMNS}
+                     | {'price': PRICE_DTYPE})
+    return prepare_frame(df)
+
+
+def concat_frames(old, new):
+    """Дописывание строк с объединением категорий (иначе pandas вернёт object)"""
+    new = new[[column for column in old.columns if column in new.columns]]
+    columns = {}
+    for column in old.columns:
+        if isinstance(old[column].dtype, pd.CategoricalDtype) and column in new.columns:
+            columns[column] = union_categoricals([old[column], new[column].astype('category')])
+    result = pd.concat([old, new], ignore_index=True)
+    for column, values in columns.items():
+        result[column] = values
+    return result
@@ -0,0 +1,335 @@
+"""Файл с пакетным движком статистических тестов для сравнения групп цен
+
+Один вызов run_tests() проверяет сразу все группировки (город вылета,
+город назначения, тип отдыха):
+- нормальность каждой группы (Шапиро-Уилк);
+- общий тест Краскела-Уоллиса по всем группам;
+- все пары групп тестами Манна-Уитни и Уэлча.
+
+p-значения каждого семейства тестов корректируются на множественные
+сравнения (по умолчанию FDR Бенджамини-Хохберга). t-тесты Уэлча
+считаются векторно по средним и дисперсиям групп. Тесты Манна-Уитни
+и Шапиро-Уилка пачками раздаются в пул процессов: каждый процесс
+получает группы один раз, при старте. TestCache хранит результаты по
+версии данных, как FigureCache — графики.
+
+Запуск из корня проекта:
+    python dashboards/stat_tests.py --source data/final_dataframe.csv --out data/stat_tests
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# scipy и statsmodels импортируются внутри функций: дашборд не должен
+# загружать их при старте
+
+DIMENSIONS = ['origin_name', 'destination_city', 'Type_of_rest']
+MIN_GROUP_SIZE = 3   # как в ноутбуке: у групп меньше трёх наблюдений тесты не считаются
+PAIRS_PER_TASK = 500
+GROUPS_PER_TASK = 50
+SERIAL_ROWS = 200_000  # на меньших таблицах запуск пула дольше самих тестов
+
+_groups = {}  # группы цен по измерениям в процессе-воркере
+_ties = {}    # (измерение, группа) → уникальные цены группы и их число
+
+
+def _init_worker(groups):
+    global _groups
+    _groups = groups
+    _ties.clear()
+
+
+def _unique_counts(dimension, i):
+    if (dimension, i) not in _ties:
+        values, counts = np.unique(_groups[dimension][i], return_counts=True)
+        _ties[dimension, i] = values, counts.astype('float64')
+    return _ties[dimension, i]
+
+
+def mannwhitney_sorted(x, y, x_ties, y_ties):
+    """Двусторонний тест Манна-Уитни для отсортированных выборок
+
+    x_ties и y_ties — уникальные значения выборок и их число. Ранги
+    объединённой выборки не строятся: U считается бинарным поиском
+    уникальных значений x в y, а поправка на связки — по общим значениям.
+    Совпадает с асимптотическим методом scipy.stats.mannwhitneyu, который
+    scipy выбирает сам, если обе выборки больше 8 или есть связки; иначе
+    возвращает None, и точный тест считает scipy.
+    """
+    from scipy.special import ndtr
+
+    (x_values, x_counts), (y_values, y_counts) = x_ties, y_ties
+    _, x_common, y_common = np.intersect1d(x_values, y_values, assume_unique=True, return_indices=True)
+    n1, n2 = len(x), len(y)
+    has_ties = len(x_common) > 0 or len(x_values) < n1 or len(y_values) < n2
+    if (n1 <= 8 or n2 <= 8) and not has_ties:
+        return None
+
+    below = np.searchsorted(y, x_values, 'left')
+    equal = np.searchsorted(y, x_values, 'right') - below
+    u1 = x_counts @ (below + 0.5 * equal)
+    u = max(u1, n1 * n2 - u1)
+
+    common = x_counts[x_common] + y_counts[y_common]
+    tie_term = ((x_counts ** 3).sum() - n1 + (y_counts ** 3).sum() - n2
+                + (common ** 3 - x_counts[x_common] ** 3 - y_counts[y_common] ** 3).sum())
+    n = n1 + n2
+    s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (u - n1 * n2 / 2 - 0.5) / s
+    return u1, min(max(2 * ndtr(-z), 0.0), 1.0)
+
+
+def _mannwhitney_batch(dimension, pairs):
+    """U-статистики и p-значения Манна-Уитни для пачки пар групп"""
+    from scipy.stats import mannwhitneyu
+
+    groups = _groups[dimension]
+    result = np.empty((len(pairs), 2))
+    for k, (i, j) in enumerate(pairs):
+        test = mannwhitney_sorted(groups[i], groups[j], _unique_counts(dimension, i), _unique_counts(dimension, j))
+        if test is None:
+            test = mannwhitneyu(groups[i], groups[j], alternative='two-sided')
+        result[k] = test
+    return result
+
+
+def _shapiro_batch(dimension, indices):
+    """W-статистики и p-значения Шапиро-Уилка для пачки групп"""
+    from scipy.stats import shapiro
+
+    groups = _groups[dimension]
+    result = np.empty((len(indices), 2))
+    with warnings.catch_warnings():
+        # для групп больше 5000 наблюдений scipy предупреждает о точности p-значения
+        warnings.simplefilter('ignore')
+        for k, i in enumerate(indices):
+            test = shapiro(groups[i])
+            result[k] = test.statistic, test.pvalue
+    return result
+
+
+def group_prices(df, dimension, value='price', min_size=MIN_GROUP_SIZE):
+    """Названия групп и отсортированные массивы цен в них
+
+    Таблица сортируется по коду группы и цене один раз, после чего группы —
+    это срезы одного массива, а не отдельные фильтрации df. Группы меньше
+    min_size отбрасываются.
+    """
+    codes, names = pd.factorize(df[dimension], sort=True)
+    prices = df[value].to_numpy(dtype='float64')
+    keep = (codes >= 0) & ~np.isnan(prices)
+    codes, prices = codes[keep], prices[keep]
+    order = np.lexsort((prices, codes))
+    sizes = np.bincount(codes, minlength=len(names))
+    groups = np.split(prices[order], np.cumsum(sizes)[:-1])
+    names = np.asarray(names, dtype=object)
+    large = np.flatnonzero(sizes >= min_size)
+    return names[large], [groups[i] for i in large]
+
+
+def welch_tests(n, mean, var, i, j):
+    """t-тесты Уэлча для пар групп (i, j) по размерам, средним и дисперсиям групп
+
+    Совпадает с scipy.stats.ttest_ind(..., equal_var=False), но считает все
+    пары одной векторной операцией.
+    """
+    from scipy.stats import t as student
+
+    se_i, se_j = var[i] / n[i], var[j] / n[j]
+    se = se_i + se_j
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistic = (mean[i] - mean[j]) / np.sqrt(se)
+        dof = se ** 2 / (se_i ** 2 / (n[i] - 1) + se_j ** 2 / (n[j] - 1))
+    p_value = 2 * student.sf(np.abs(statistic), dof)
+    # у двух групп с одной и той же ценой разброса нет — тест не определён
+    undefined = se == 0
+    statistic[undefined] = dof[undefined] = p_value[undefined] = np.nan
+    return statistic, dof, p_value
+
+
+def adjust(p_values, method='fdr_bh', alpha=0.05):
+    """Поправка на множественные сравнения; NaN-значения в семейство не входят"""
+    from statsmodels.stats.multitest import multipletests
+
+    p_values = np.asarray(p_values, dtype='float64')
+    adjusted = np.full(len(p_values), np.nan)
+    reject = np.zeros(len(p_values), dtype=bool)
+    defined = ~np.isnan(p_values)
+    if defined.any():
+        reject[defined], adjusted[defined], _, _ = multipletests(p_values[defined], alpha=alpha, method=method)
+    return adjusted, reject
+
+
+def _batches(items, size):
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def run_tests(df, dimensions=DIMENSIONS, value='price', min_size=MIN_GROUP_SIZE,
+              method='fdr_bh', alpha=0.05, workers=None):
+    """Все тесты по всем группировкам за один вызов
+
+    Возвращает словарь таблиц:
+    - 'normality' — Шапиро-Уилк для каждой группы;
+    - 'kruskal' — Краскел-Уоллис для каждого измерения;
+    - 'pairwise' — Манн-Уитни и Уэлч для каждой пары групп.
+
+    Поправка method применяется отдельно к каждому семейству: одному тесту
+    в одном измерении. workers — число процессов (None — по числу ядер,
+    1 — без пула); таблицы меньше SERIAL_ROWS считаются без пула.
+    """
+    from scipy.stats import kruskal
+
+    grouped = {dimension: group_prices(df, dimension, value, min_size) for dimension in dimensions}
+    groups = {dimension: arrays for dimension, (_, arrays) in grouped.items()}
+    pairs = {dimension: np.array(np.triu_indices(len(arrays), k=1)).T for dimension, arrays in groups.items()}
+
+    tasks = []
+    for dimension in dimensions:
+        tasks += [(_shapiro_batch, dimension, batch)
+                  for batch in _batches(np.arange(len(groups[dimension])), GROUPS_PER_TASK)]
+        tasks += [(_mannwhitney_batch, dimension, batch) for batch in _batches(pairs[dimension], PAIRS_PER_TASK)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1 or len(df) < SERIAL_ROWS:
+        _init_worker(groups)
+        try:
+            outputs = [func(dimension, batch) for func, dimension, batch in tasks]
+        finally:
+            _init_worker({})
+    else:
+        # spawn, а не fork: движок вызывается и из многопоточного сервера дашборда
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(groups,)) as pool:
+            futures = [pool.submit(func, dimension, batch) for func, dimension, batch in tasks]
+            outputs = [future.result() for future in futures]
+
+    results = {dimension: {_shapiro_batch: [], _mannwhitney_batch: []} for dimension in dimensions}
+    for (func, dimension, _), output in zip(tasks, outputs):
+        results[dimension][func].append(output)
+
+    normality, kruskal_rows, pairwise = [], [], []
+    for dimension in dimensions:
+        names, arrays = grouped[dimension]
+        n = np.array([len(a) for a in arrays], dtype='float64')
+        mean = np.array([a.mean() for a in arrays])
+        var = np.array([a.var(ddof=1) for a in arrays])
+
+        shapiro = np.concatenate(results[dimension][_shapiro_batch] or [np.empty((0, 2))])
+        p_adjusted, reject = adjust(shapiro[:, 1], method, alpha)
+        normality.append(pd.DataFrame({
+            'dimension': dimension, 'group': names, 'n': n.astype('int64'),
+            'w': shapiro[:, 0], 'p_value': shapiro[:, 1], 'p_adjusted': p_adjusted, 'normal': ~reject,
+        }))
+
+        if len(arrays) >= 2:
+            h, p_value = kruskal(*arrays)
+            kruskal_rows.append({'dimension': dimension, 'groups': len(arrays), 'h': h, 'p_value': p_value})
+
+        i, j = pairs[dimension].T
+        u = np.concatenate(results[dimension][_mannwhitney_batch] or [np.empty((0, 2))])
+        u_adjusted, u_reject = adjust(u[:, 1], method, alpha)
+        t, dof, t_p = welch_tests(n, mean, var, i, j)
+        t_adjusted, t_reject = adjust(t_p, method, alpha)
+        pairwise.append(pd.DataFrame({
+            'dimension': dimension, 'group_a': names[i], 'group_b': names[j],
+            'n_a': n[i].astype('int64'), 'n_b': n[j].astype('int64'),
+            'mean_a': mean[i], 'mean_b': mean[j],
+            'u': u[:, 0], 'u_p_value': u[:, 1], 'u_p_adjusted': u_adjusted, 'u_significant': u_reject,
+            'welch_t': t, 'welch_df': dof, 'welch_p_value': t_p, 'welch_p_adjusted': t_adjusted,
+            'welch_significant': t_reject,
+        }))
+
+    kruskal_table = pd.DataFrame(kruskal_rows, columns=['dimension', 'groups', 'h', 'p_value'])
+    kruskal_table['p_adjusted'], kruskal_table['significant'] = adjust(kruskal_table['p_value'], method, alpha)
+    return {
+        'normality': pd.concat(normality, ignore_index=True),
+        'kruskal': kruskal_table,
+        'pairwise': pd.concat(pairwise, ignore_index=True),
+    }
+
+
+class TestCache:
+    """Результаты run_tests() по версиям данных, общие для всех сессий
+
+    Ключ — версия данных и параметры тестов. Пока один поток считает
+    результаты, остальные с тем же ключом ждут его, а не запускают
+    второй пул процессов. Старые версии вытесняются по LRU.
+    """
+
+    def __init__(self, max_entries=4, workers=None):
+        self.max_entries = max_entries
+        self.workers = workers
+        self._results = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get(self, data, **params):
+        """Результаты тестов для состояния данных data (DataState)"""
+        key = (data.version, tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                                          for name, value in params.items())))
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    return self._results[key]
+                building = self._building.get(key)
+                if building is None:
+                    building = self._building[key] = threading.Event()
+                    break
+            building.wait()
+
+        try:
+            results = run_tests(data.df, workers=self.workers, **params)
+            with self._lock:
+                self._results[key] = results
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._building[key]
+            building.set()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='data/final_dataframe.csv')
+    parser.add_argument('--dimensions', nargs='+', default=DIMENSIONS)
+    parser.add_argument('--min-size', type=int, default=MIN_GROUP_SIZE)
+    parser.add_argument('--method', default='fdr_bh', help='поправка statsmodels multipletests')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию — по числу ядер)')
+    parser.add_argument('--out', help='каталог для CSV с результатами')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.source)
+    results = run_tests(df, args.dimensions, min_size=args.min_size, method=args.method,
+                        alpha=args.alpha, workers=args.workers)
+
+    print(results['kruskal'].to_string(index=False))
+    pairwise = results['pairwise'].groupby('dimension', sort=False)
+    summary = pd.DataFrame({
+        'pairs': pairwise.size(),
+        'mann_whitney': pairwise['u_significant'].sum(),
+        'welch': pairwise['welch_significant'].sum(),
+        'non_normal_groups': results['normality'].groupby('dimension', sort=False)['normal'].agg(lambda s: (~s).sum()),
+    })
+    print(summary.to_string())
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        for name, table in results.items():
+            table.to_csv(os.path.join(args.out, f'{name}.csv'), index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Файл для кэширования скачанных страниц и их повторной обработки без сети"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+CACHE_DIR = 'data/cache'
+CACHE_TTL = 90 * 24 * 3600  # seconds
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+EVICT_INTERVAL = 3600  # seconds between automatic evictions
+STALE_TMP_AGE = 24 * 3600  # a .tmp file this old was left by a crashed put
+
+
+class PageCache:
+    """Content-addressed on-disk store of fetched pages
+
+    Pages are gzipped under pages/<sha256>.html.gz, so identical pages
+    are stored once. index.jsonl records every fetch (url, time, key);
+    entries older than ttl or beyond max_bytes (oldest first) are evicted.
+
+    put() only appends a line to the index. Eviction rewrites the index, so
+    it runs at most once per evict_interval (tracked by the mtime of the
+    .evicted marker, shared by all processes), and max_bytes may be exceeded
+    in between. Index and page changes happen under an exclusive flock on
+    .lock, so concurrent writers do not lose entries.
+    """
+
+    def __init__(self, root=CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, evict_interval=EVICT_INTERVAL):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.index_path = os.path.join(root, 'index.jsonl')
+        self.lock_path = os.path.join(root, '.lock')
+        self.marker_path = os.path.join(root, '.evicted')
+        os.makedirs(os.path.join(root, 'pages'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'raw'), exist_ok=True)
+
+    def _page_path(self, key):
+        return os.path.join(self.root, 'pages', f'{key}.html.gz')
+
+    def _raw_path(self, key):
+        return os.path.join(self.root, 'raw', f'{key}.json.gz')
+
+    @contextmanager
+    def _locked(self, shared=False):
+        """Hold a flock on the cache (shared for readers, exclusive for writers)"""
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return []
+        with self._locked(shared=True), open(self.index_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _write_index(self, entries):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _write_gzip(path, data):
+        """Compress data next to path; return the temporary file to move into place"""
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(data)
+        return tmp_path
+
+    def put(self, url, page_source, extracted=None, fetched_at=None):
+        """Store a fetched page (and optionally its extracted JSON); return its key"""
+        data = page_source.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        # compression happens outside the lock; the files are moved in under it
+        files = []
+        if not os.path.exists(self._page_path(key)):
+            files.append((self._write_gzip(self._page_path(key), data), self._page_path(key)))
+        if extracted is not None and not os.path.exists(self._raw_path(key)):
+            raw = json.dumps(extracted, ensure_ascii=False).encode('utf-8')
+            files.append((self._write_gzip(self._raw_path(key), raw), self._raw_path(key)))
+
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        entry = {'key': key, 'url': url, 'fetched_at': fetched_at.isoformat()}
+        with self._locked():
+            for tmp_path, path in files:
+                os.replace(tmp_path, path)
+            if not os.path.exists(self._page_path(key)):
+                # evicted between the check above and taking the lock
+                os.replace(self._write_gzip(self._page_path(key), data), self._page_path(key))
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            if self._eviction_due():
+                self._evict()
+        return key
+
+    def _eviction_due(self):
+        try:
+            return time.time() - os.path.getmtime(self.marker_path) >= self.evict_interval
+        except OSError:
+            return True
+
+    def load_page(self, key):
+        """Return the cached page text for key"""
+        with gzip.open(self._page_path(key), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def load_raw(self, key):
+        """Return the cached extracted JSON for key, or None"""
+        if not os.path.exists(self._raw_path(key)):
+            return None
+        with gzip.open(self._raw_path(key), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+
+    def entries(self, url=None, since=None, until=None):
+        """Return index entries (oldest first), optionally filtered by url and time"""
+        result = []
+        for entry in self._read_index():
+            fetched_at = datetime.fromisoformat(entry['fetched_at'])
+            if url is not None and entry['url'] != url:
+                continue
+            if since is not None and fetched_at < since:
+                continue
+            if until is not None and fetched_at > until:
+                continue
+            result.append(entry)
+        return result
+
+    def iter_pages(self, url=None, since=None, until=None):
+        """Yield (entry, page_source) for cached fetches without touching the network"""
+        for entry in self.entries(url, since, until):
+            if os.path.exists(self._page_path(entry['key'])):
+                yield entry, self.load_page(entry['key'])
+
+    def evict(self):
+        """Drop expired entries and the oldest pages beyond max_bytes"""
+        with self._locked():
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+        cutoff = time.time() - self.ttl
+        entries = [e for e in entries
+                   if datetime.fromisoformat(e['fetched_at']).timestamp() >= cutoff]
+
+        # Newest fetch of each page decides how long the page is kept
+        last_seen = {}
+        for entry in entries:
+            last_seen[entry['key']] = entry['fetched_at']
+        total = 0
+        keep = set()
+        for key in sorted(last_seen, key=last_seen.get, reverse=True):
+            path = self._page_path(key)
+            if not os.path.exists(path):
+                continue
+            size = os.path.getsize(path)
+            if total + size > self.max_bytes:
+                continue
+            total += size
+            keep.add(key)
+
+        for folder, suffix in (('pages', '.html.gz'), ('raw', '.json.gz')):
+            for name in os.listdir(os.path.join(self.root, folder)):
+                path = os.path.join(self.root, folder, name)
+                if name.endswith(suffix):
+                    if name[:-len(suffix)] not in keep:
+                        os.remove(path)
+                elif os.path.getmtime(path) < time.time() - STALE_TMP_AGE:
+                    # .tmp files of puts that are still compressing are kept
+                    os.remove(path)
+        self._write_index([e for e in entries if e['key'] in keep])
+        with open(self.marker_path, 'w'):
+            pass
@@ -0,0 +1,150 @@
+"""Файл для фонового периодического сбора цен с сохранением только изменений
+
+Пример запуска из папки scripts (сбор раз в час):
+    python daemon.py --interval 60
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from cache import CACHE_DIR, PageCache
+from metrics import metrics, span
+from main import BASE_URL, flatten_destinations, get_popular_destinations
+from storage import write_snapshot
+
+KEY_COLUMNS = ['destination_city', 'destination_country', 'origin_name']
+CHANGES_DIR = 'data/changes'
+STATE_FILE = 'data/daemon_state.parquet'
+CHANGE_LOG = 'data/change_log.jsonl'
+
+
+def diff_prices(previous, current):
+    """Compare two captures keyed by destination city, country and origin
+
+    Returns a frame with old_price, new_price and change ('added',
+    'changed' or 'removed') for every key whose price is not the same.
+    """
+    merged = previous[KEY_COLUMNS + ['price']].merge(
+        current[KEY_COLUMNS + ['price']], on=KEY_COLUMNS, how='outer',
+        suffixes=('_old', '_new'), indicator=True)
+    merged = merged.rename(columns={'price_old': 'old_price', 'price_new': 'new_price'})
+    merged['change'] = merged['_merge'].map({'right_only': 'added', 'left_only': 'removed',
+                                             'both': 'changed'}).astype(str)
+    changed = (merged['_merge'] != 'both') | (merged['old_price'] != merged['new_price'])
+    return merged.loc[changed, KEY_COLUMNS + ['old_price', 'new_price', 'change']].reset_index(drop=True)
+
+
+class ScrapeDaemon:
+    """Runs captures on a fixed interval and stores only the price changes
+
+    The HTTP session and the browser pool are module-level singletons in
+    main.py, so they stay warm between captures.
+    """
+
+    def __init__(self, url=BASE_URL, interval=3600, changes_dir=CHANGES_DIR,
+                 state_file=STATE_FILE, change_log=CHANGE_LOG, cache=None):
+        self.url = url
+        self.interval = interval
+        self.changes_dir = changes_dir
+        self.state_file = state_file
+        self.change_log = change_log
+        self.cache = cache
+        self.stop_event = threading.Event()
+        self.previous = self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            return pd.read_parquet(self.state_file)
+        return pd.DataFrame({column: pd.Series(dtype=object) for column in KEY_COLUMNS}
+                            | {'price': pd.Series(dtype='float64')})
+
+    def capture(self):
+        """Run one capture and return the number of changed keys"""
+        captured_at = datetime.now(timezone.utc)
+        destinations = get_popular_destinations(self.url, cache=self.cache)
+        if not destinations:
+            print(f"[{captured_at:%Y-%m-%d %H:%M}] No destinations found")
+            return 0
+
+        with span('diff') as record:
+            table = flatten_destinations(destinations)
+            current = table.to_pandas().drop_duplicates(KEY_COLUMNS, keep='last')
+            changes = diff_prices(self.previous, current)
+            record['rows'] = len(current)
+            record['changed'] = len(changes)
+
+        if not changes.empty:
+            changed_keys = changes.loc[changes['change'] != 'removed', KEY_COLUMNS]
+            delta = current.merge(changed_keys, on=KEY_COLUMNS)
+            if not delta.empty:
+                with span('write_changes', rows=len(delta)):
+                    write_snapshot(delta, captured_at=captured_at, root=self.changes_dir)
+            self._append_log(changes, captured_at)
+
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        current[KEY_COLUMNS + ['price']].to_parquet(self.state_file, index=False)
+        self.previous = current
+        print(f"[{captured_at:%Y-%m-%d %H:%M}] {len(current)} prices, {len(changes)} changed")
+        return len(changes)
+
+    def _append_log(self, changes, captured_at):
+        records = changes.astype(object).where(changes.notna(), None).to_dict('records')
+        with open(self.change_log, 'a', encoding='utf-8') as f:
+            for record in records:
+                record['captured_at'] = captured_at.isoformat()
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def run(self, once=False):
+        """Capture on schedule until stop() is called or a signal arrives"""
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                with span('capture'):
+                    self.capture()
+            except Exception as e:  # keep the daemon alive on a bad capture
+                print(f"Capture failed: {e}")
+            if once:
+                break
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Periodically scrape Aviasales and store price changes")
+    parser.add_argument('--url', default=BASE_URL)
+    parser.add_argument('--interval', type=float, default=60, help="minutes between captures")
+    parser.add_argument('--once', action='store_true', help="run a single capture and exit")
+    parser.add_argument('--changes-dir', default=CHANGES_DIR, help="snapshot store for changed rows")
+    parser.add_argument('--state-file', default=STATE_FILE)
+    parser.add_argument('--change-log', default=CHANGE_LOG)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--metrics-file', help="append per-phase timings as JSON lines ('-' for stderr)")
+    parser.add_argument('--metrics-port', type=int, help="serve Prometheus metrics on this port")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics.configure(args.metrics_file)
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    cache = None if args.no_cache else PageCache(args.cache_dir)
+    daemon = ScrapeDaemon(args.url, args.interval * 60, args.changes_dir, args.state_file,
+                          args.change_log, cache)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Файл для быстрого поиска chromedriver без обращения к сети"""
+
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from webdriver_manager.chrome import ChromeDriverManager
+
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'aviasales-scraper', 'driver.json')
+DRIVER_CACHE_MAX_AGE = 7 * 24 * 3600  # re-resolve weekly to follow Chrome updates
+OFFLINE = os.environ.get('SCRAPER_DRIVER_OFFLINE', '') not in ('', '0', 'false')
+
+
+def driver_version(path):
+    """Return the output of `chromedriver --version`, or None if it cannot run"""
+    try:
+        result = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def load_cached_driver(cache_file=DRIVER_CACHE_FILE, max_age=DRIVER_CACHE_MAX_AGE):
+    """Return the cached driver path if it is still present and valid, else None"""
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    path = cached.get('path')
+    if not path or not os.access(path, os.X_OK):
+        return None
+    if max_age is not None and time.time() - cached.get('resolved_at', 0) > max_age:
+        return None
+    if driver_version(path) != cached.get('version'):
+        return None
+    return path
+
+
+def save_cached_driver(path, cache_file=DRIVER_CACHE_FILE):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file, 'w', encoding='utf-8') as f:
+        json.dump({'path': path, 'version': driver_version(path), 'resolved_at': time.time()}, f)
+
+
+def resolve_driver_path(offline=None, cache_file=DRIVER_CACHE_FILE):
+    """Return a chromedriver path, calling ChromeDriverManager only when needed
+
+    Lookup order: CHROMEDRIVER_PATH, the local cache, chromedriver on PATH
+    (offline mode only), then ChromeDriverManager().install(), whose result
+    is cached. In offline mode the manager is never used and a missing
+    driver raises RuntimeError.
+    """
+    offline = OFFLINE if offline is None else offline
+    env_path = os.environ.get('CHROMEDRIVER_PATH')
+    if env_path:
+        return env_path
+
+    # In offline mode a stale cache is better than nothing
+    path = load_cached_driver(cache_file, max_age=None if offline else DRIVER_CACHE_MAX_AGE)
+    if path:
+        return path
+
+    if offline:
+        path = shutil.which('chromedriver')
+        if path:
+            return path
+        raise RuntimeError("No cached chromedriver found; run once online or set CHROMEDRIVER_PATH")
+
+    path = ChromeDriverManager().install()
+    save_cached_driver(path, cache_file)
+    return path
+
+
+def startup_report(offline=None, cache_file=DRIVER_CACHE_FILE):
+    """Time driver resolution through the manager (cold) and from the cache (warm)
+
+    In offline mode the manager is not called: the cold measurement is
+    reported as skipped (cold_seconds is None) and only the warm lookup runs.
+    """
+    offline = OFFLINE if offline is None else offline
+    cold = None
+    if not offline:
+        start = time.perf_counter()
+        path = ChromeDriverManager().install()
+        cold = time.perf_counter() - start
+        save_cached_driver(path, cache_file)
+
+    start = time.perf_counter()
+    path = resolve_driver_path(offline, cache_file=cache_file)
+    warm = time.perf_counter() - start
+
+    print(f"chromedriver: {path} ({driver_version(path)})")
+    if cold is None:
+        print("cold start (ChromeDriverManager().install()):  skipped (offline)")
+    else:
+        print(f"cold start (ChromeDriverManager().install()): {cold * 1000:8.1f} ms")
+    print(f"warm start (local cache):                     {warm * 1000:8.1f} ms")
+    return {'path': path, 'cold_seconds': cold, 'warm_seconds': warm}
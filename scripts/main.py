@@ -1,114 +1,490 @@
 """Файл для парсинга данных с AviaSales"""
 
-import time
-import json
+import argparse
+import atexit
 import csv
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timezone
+import json
 import re
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
-from webdriver_manager.chrome import ChromeDriverManager
 
-def setup_driver():
+import drivers
+from cache import CACHE_DIR, PageCache
+from metrics import metrics, span
+from storage import SNAPSHOT_DIR, write_snapshot
+
+BASE_URL = "https://www.aviasales.ru"
+REQUEST_TIMEOUT = (5, 20)  # (connect, read) in seconds
+HTTP_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+PAGE_READY_TIMEOUT = 15  # seconds to wait for the destinations data in the browser
+DESTINATIONS_SCRIPT = (By.XPATH, "//script[contains(text(), '\"popular_destinations\"')]")
+
+DESTINATIONS_KEY = 'popular_destinations'
+REPLAY_DIR = 'data/replay'  # kept apart from the live store, which already holds these captures
+
+_decoder = json.JSONDecoder()
+_KEY_SEPARATOR = re.compile(r'\s*:\s*')
+_WHITESPACE = re.compile(r'\s*')
+
+# Flat table produced from the nested JSON; the first four columns match the old CSV
+FLAT_SCHEMA = pa.schema([
+    ('destination_city', pa.string()),
+    ('destination_country', pa.string()),
+    ('origin_name', pa.string()),
+    ('price', pa.float64()),
+    ('destination_iata', pa.string()),
+    ('destination_country_iata', pa.string()),
+    ('origin_iata', pa.string()),
+    ('depart_date', pa.string()),
+    ('return_date', pa.string()),
+    ('currency', pa.string()),
+])
+_PLACE_TYPE = pa.struct([('name', pa.string()), ('iata', pa.string())])
+# the fields of the page JSON that flatten_destinations reads
+DESTINATION_TYPE = pa.struct([
+    ('destination_city', _PLACE_TYPE),
+    ('destination_country', _PLACE_TYPE),
+    ('prices', pa.list_(pa.struct([
+        ('origin_name', pa.string()),
+        ('origin_iata', pa.string()),
+        ('depart_date', pa.string()),
+        ('return_date', pa.string()),
+        ('price', pa.struct([('value', pa.float64()), ('currency', pa.string())])),
+    ]))),
+])
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+CSV_COLUMNS = ['destination_city', 'destination_country', 'origin_name', 'price']
+
+_session = None
+_driver_pool = None
+
+def make_session(retries=2, pool_maxsize=8):
+    """Return a new HTTP session with connection pooling
+
+    With retries > 0 the adapter itself retries failed requests and 429/5xx
+    responses; with retries=0 every call is exactly one request, for callers
+    that rate-limit and back off on their own.
+    """
+    max_retries = Retry(total=retries, backoff_factor=0.5,
+                        status_forcelist=(429, 500, 502, 503, 504)) if retries else 0
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=max_retries)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+def get_session():
+    """Return a shared HTTP session with connection pooling and retries"""
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+def fetch_page_source(url=BASE_URL, session=None, timeout=REQUEST_TIMEOUT):
+    """Download the page over plain HTTP and return it as text"""
+    session = session or get_session()
+    with span('http_fetch', url=url) as record:
+        response = session.get(url, timeout=timeout)
+        record['http_status'] = response.status_code
+        response.raise_for_status()
+        # Without an explicit charset requests falls back to ISO-8859-1 for text/html
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            response.encoding = 'utf-8'
+        record['bytes'] = len(response.content)
+        return response.text
+
+def setup_driver(offline=None):
     """Set up and return the Selenium WebDriver"""
     options = Options()
     options.add_argument('--headless')  # Run in background mode
     options.add_argument('--disable-gpu')
-    service = Service(ChromeDriverManager().install())
-    return webdriver.Chrome(service=service, options=options)
+    with span('driver_install', offline=bool(drivers.OFFLINE if offline is None else offline)):
+        service = Service(drivers.resolve_driver_path(offline))
+    with span('driver_start'):
+        return webdriver.Chrome(service=service, options=options)
 
-def get_popular_destinations():
-    """Scrape popular destinations from Aviasales"""
-    driver = setup_driver()
-    
-    try:
+class DriverPool:
+    """A small pool of long-lived headless drivers reused across fetches"""
+
+    def __init__(self, size=2):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._drivers = []
+
+    @contextmanager
+    def driver(self):
+        """Borrow a driver; it is discarded instead of returned if it breaks"""
+        self._slots.acquire()
+        try:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = setup_driver()
+                with self._lock:
+                    self._drivers.append(driver)
+        except BaseException:
+            # a driver that failed to start must not keep its slot
+            self._slots.release()
+            raise
+        try:
+            yield driver
+        except WebDriverException:
+            self._discard(driver)
+            raise
+        else:
+            self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def _discard(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        """Quit every driver owned by the pool"""
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+        self._idle = queue.LifoQueue()
+
+def get_driver_pool(size=2):
+    """Return the shared driver pool, creating it on first use"""
+    global _driver_pool
+    if _driver_pool is None:
+        _driver_pool = DriverPool(size)
+        atexit.register(_driver_pool.close)
+    return _driver_pool
+
+def fetch_page_source_with_browser(url=BASE_URL, timeout=PAGE_READY_TIMEOUT, pool=None):
+    """Render the page in headless Chrome and return its source
+
+    Returns as soon as the script with the destinations data is present
+    in the DOM, or an empty string if it does not appear within timeout.
+    """
+    pool = pool or get_driver_pool()
+    with pool.driver() as driver:
         # Navigate to the main page 
-        url = "https://www.aviasales.ru"
-        driver.get(url)
+        with span('browser_get', url=url):
+            driver.get(url)
         
-        # Wait for the page to load
-        time.sleep(5)
+        # Wait until the destinations data is rendered
+        try:
+            with span('browser_wait'):
+                WebDriverWait(driver, timeout, poll_frequency=0.2).until(
+                    EC.presence_of_element_located(DESTINATIONS_SCRIPT))
+        except TimeoutException:
+            print(f"Destinations data did not appear within {timeout} s")
+            return ''
         
         # Get page source
-        page_source = driver.page_source
-        
-        # Extract popular destinations data
-        popular_destinations = extract_destinations_data(page_source)
-        
-        return popular_destinations
+        with span('browser_page_source') as record:
+            page_source = driver.page_source
+            record['chars'] = len(page_source)
+        return page_source
+
+def get_popular_destinations(url=BASE_URL, use_browser=False, cache=None):
+    """Scrape popular destinations from Aviasales
+
+    The page is fetched over plain HTTP first; Selenium is used only
+    when the embedded destinations data is missing from the response.
+    Fetched pages are stored in cache (a PageCache) when one is given.
+    """
+    if not use_browser:
+        try:
+            page_source = fetch_page_source(url)
+        except requests.RequestException as e:
+            print(f"HTTP fetch failed: {e}")
+        else:
+            popular_destinations = extract_destinations_data(page_source)
+            if popular_destinations:
+                if cache is not None:
+                    cache.put(url, page_source, popular_destinations)
+                return popular_destinations
+        print("Falling back to the browser...")
     
-    finally:
-        driver.quit()
+    page_source = fetch_page_source_with_browser(url)
+    
+    # Extract popular destinations data
+    popular_destinations = extract_destinations_data(page_source)
+    if cache is not None and page_source:
+        cache.put(url, page_source, popular_destinations or None)
+    return popular_destinations
+
+def replay_cache(cache, snapshot_dir=REPLAY_DIR, url=None, since=None, until=None):
+    """Re-parse cached pages offline and write one snapshot per cached fetch
+
+    Each snapshot is named after the fetch time and page key, so replaying
+    the same cache again replaces the earlier files instead of adding copies.
+    """
+    replayed = 0
+    for entry, page_source in cache.iter_pages(url, since, until):
+        destinations = extract_destinations_data(page_source)
+        if not destinations:
+            print(f"No destinations in cached page {entry['key'][:12]} ({entry['fetched_at']})")
+            continue
+        captured_at = datetime.fromisoformat(entry['fetched_at'])
+        name = f"{captured_at.strftime('%H%M%S%f')}-{entry['key'][:16]}"
+        write_snapshot(flatten_destinations(destinations), captured_at=captured_at, root=snapshot_dir, name=name)
+        replayed += 1
+    print(f"Replayed {replayed} cached pages into {snapshot_dir}")
+    return replayed
+
+def _value_offset(html_content, key, start=0):
+    """Return the offset of the JSON value stored under "key", or -1"""
+    marker = f'"{key}"'
+    pos = html_content.find(marker, start)
+    while pos != -1:
+        match = _KEY_SEPARATOR.match(html_content, pos + len(marker))
+        if match:
+            return match.end()
+        pos = html_content.find(marker, pos + len(marker))
+    return -1
+
+def find_json_value(html_content, key=DESTINATIONS_KEY):
+    """Decode exactly one JSON value stored under "key" inside the page
+
+    The page is scanned in place: the decoder starts at the value offset
+    and stops at its balanced end, so the rest of the page is never copied.
+    Raises ValueError if the key is missing or the value is not valid JSON.
+    """
+    offset = _value_offset(html_content, key)
+    if offset == -1:
+        raise ValueError(f'"{key}" not found')
+    value, _ = _decoder.raw_decode(html_content, offset)
+    return value
+
+def iter_json_array(html_content, key=DESTINATIONS_KEY):
+    """Yield the items of the JSON array stored under "key" one at a time
+
+    Useful for very large embedded payloads: only one item is decoded
+    and held in memory at a time.
+    """
+    offset = _value_offset(html_content, key)
+    if offset == -1:
+        raise ValueError(f'"{key}" not found')
+    if html_content[offset:offset + 1] != '[':
+        raise ValueError(f'"{key}" is not a JSON array')
+    pos = _WHITESPACE.match(html_content, offset + 1).end()
+    if html_content[pos:pos + 1] == ']':
+        return
+    while True:
+        item, pos = _decoder.raw_decode(html_content, pos)
+        yield item
+        pos = _WHITESPACE.match(html_content, pos).end()
+        separator = html_content[pos:pos + 1]
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' at offset {pos}")
+        pos = _WHITESPACE.match(html_content, pos + 1).end()
 
 def extract_destinations_data(html_content):
     """Extract popular destinations data from the HTML content"""
-    # Find the start of popular destinations data
-    start_marker = '"popular_destinations":'
-    start_index = html_content.find(start_marker)
-    
-    if start_index != -1:
-        try:
-            # Adjust start index to include the start marker
-            json_str = html_content[start_index:]
-            
-            # Find the end of the JSON array marked by ']}]'
-            end_index = json_str.find(']}]')
-            if end_index != -1:
-                # Include the end marker in the extracted string
-                json_str = json_str[:end_index + 3]
-                
-                # Parse the complete JSON string
-                # Add the opening brace to make it valid JSON
-                json_data = json.loads('{' + json_str + '}')
-                # print(json_str)
-                # raise Exception("Stop here")
-                return json_data['popular_destinations']
-            else:
-                print("Could not find the end of the JSON array")
-                return []
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
-            return []
-    else:
+    with span('extract', chars=len(html_content)) as record:
+        popular_destinations = _extract_destinations(html_content)
+        record['destinations'] = len(popular_destinations)
+    return popular_destinations
+
+def _extract_destinations(html_content):
+    try:
+        popular_destinations = find_json_value(html_content)
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON: {e}")
+        return []
+    except ValueError:
         print("No popular destinations data found in the HTML")
         return []
+    
+    if not isinstance(popular_destinations, list):
+        print(f"Unexpected popular destinations payload: {type(popular_destinations).__name__}")
+        return []
+    return popular_destinations
+
+def flatten_destinations(destinations):
+    """Turn the nested destinations -> prices structure into a flat Arrow table
+
+    The JSON is converted once to a nested Arrow array of DESTINATION_TYPE
+    (unknown keys are dropped, missing ones become nulls), the price lists
+    are flattened, and destination fields are repeated to the price rows
+    with take() on the list parent indices, so no Python loop runs per row.
+    """
+    nested = pa.array(destinations, type=DESTINATION_TYPE)
+    price_lists = pc.struct_field(nested, 'prices')
+    prices = pc.list_flatten(price_lists)
+    parents = pc.list_parent_indices(price_lists)
+    
+    def destination_field(*path):
+        return pc.struct_field(nested, list(path)).take(parents)
+    
+    columns = {
+        'destination_city': destination_field('destination_city', 'name'),
+        'destination_country': destination_field('destination_country', 'name'),
+        'origin_name': pc.struct_field(prices, 'origin_name'),
+        'price': pc.struct_field(prices, ['price', 'value']),
+        'destination_iata': destination_field('destination_city', 'iata'),
+        'destination_country_iata': destination_field('destination_country', 'iata'),
+        'origin_iata': pc.struct_field(prices, 'origin_iata'),
+        'depart_date': pc.struct_field(prices, 'depart_date'),
+        'return_date': pc.struct_field(prices, 'return_date'),
+        'currency': pc.struct_field(prices, ['price', 'currency']),
+    }
+    return pa.table(columns, schema=FLAT_SCHEMA)
+
+def write_csv(table, output_file, columns=CSV_COLUMNS):
+    """Write the given columns in the layout of the original CSV export, quoting only where needed
+
+    Parquet and Feather keep every column of FLAT_SCHEMA; the CSV keeps the
+    columns the notebook and dashboards/pipeline.py read. Whole prices are
+    written without ".0", as they came in the JSON.
+    """
+    values = []
+    for name in columns:
+        column = table.column(name).to_pylist()
+        if name == 'price':
+            column = [int(p) if p is not None and p.is_integer() else p for p in column]
+        values.append(column)
+    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(columns)
+        writer.writerows(zip(*values))
 
-def save_to_csv(destinations, output_file='data/popular_destinations.csv'):
-    """Save the destinations data to a CSV file"""
+def write_table(table, output_file, file_format='csv', csv_columns=CSV_COLUMNS):
+    """Write the flat table to CSV (csv_columns only), Parquet or Feather in one call"""
+    if file_format == 'csv':
+        write_csv(table, output_file, csv_columns)
+    elif file_format == 'parquet':
+        pq.write_table(table, output_file, compression='zstd')
+    elif file_format == 'feather':
+        feather.write_feather(table, output_file, compression='zstd')
+    else:
+        raise ValueError(f"Unknown output format: {file_format}")
+
+def save_to_csv(destinations, output_file='data/popular_destinations.csv', file_format='csv'):
+    """Save the destinations data to a CSV (or Parquet/Feather) file"""
     if not destinations:
         print("No destinations data to save")
         return
     
-    with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['destination_city', 'destination_country', 'origin_name', 'price']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for destination in destinations:
-            dest_city = destination['destination_city']['name']
-            dest_country = destination['destination_country']['name']
-            
-            for price_info in destination['prices']:
-                writer.writerow({
-                    'destination_city': dest_city,
-                    'destination_country': dest_country,
-                    'origin_name': price_info['origin_name'],
-                    'price': price_info['price']['value']
-                })
-                
+    with span('flatten') as record:
+        table = flatten_destinations(destinations)
+        record['rows'] = table.num_rows
+    with span('save', format=file_format, rows=table.num_rows):
+        write_table(table, output_file, file_format)
     print(f"Destinations data saved to {output_file}")
 
-def main():
+def save_snapshot(destinations, root=SNAPSHOT_DIR):
+    """Append the destinations data to the partitioned snapshot store"""
+    if not destinations:
+        print("No destinations data to save")
+        return None
+    
+    with span('snapshot') as record:
+        table = flatten_destinations(destinations)
+        record['rows'] = table.num_rows
+        path = write_snapshot(table, root=root)
+    print(f"Snapshot saved to {path}")
+    return path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape popular destinations from Aviasales")
+    parser.add_argument('--url', default=BASE_URL, help="page to scrape")
+    parser.add_argument('--browser', action='store_true',
+                        help="skip the HTTP fetch and render the page in Chrome")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv',
+                        help="format of the output file")
+    parser.add_argument('--output', help="output file (default: data/popular_destinations.<format>)")
+    parser.add_argument('--offline-driver', action='store_true',
+                        help="never call ChromeDriverManager; use the cached or local chromedriver")
+    parser.add_argument('--driver-report', action='store_true',
+                        help="measure cold vs warm chromedriver resolution and exit")
+    parser.add_argument('--snapshot-dir',
+                        help=f"root of the snapshot store (default: {SNAPSHOT_DIR}, {REPLAY_DIR} with --replay)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="raw page cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="do not store fetched pages")
+    parser.add_argument('--metrics-file',
+                        help="append per-phase timings as JSON lines ('-' for stderr)")
+    parser.add_argument('--metrics-prom', help="write Prometheus text metrics to this file on exit")
+    parser.add_argument('--replay', action='store_true',
+                        help="re-parse cached pages into --snapshot-dir without any network")
+    parser.add_argument('--since', type=_parse_day, help="replay pages fetched on or after YYYY-MM-DD")
+    parser.add_argument('--until', type=_parse_day, help="replay pages fetched up to YYYY-MM-DD")
+    return parser.parse_args(argv)
+
+def _parse_day(value):
+    return datetime.combine(datetime.strptime(value, '%Y-%m-%d').date(), dt_time(), timezone.utc)
+
+def main(argv=None):
+    args = parse_args(argv)
+    metrics.configure(args.metrics_file)
+    try:
+        with span('run', mode='replay' if args.replay else 'scrape'):
+            run(args)
+    finally:
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+        metrics.configure(None)
+
+def run(args):
+    if args.offline_driver:
+        drivers.OFFLINE = True
+    if args.driver_report:
+        drivers.startup_report()
+        return
+    
+    cache = None if args.no_cache else PageCache(args.cache_dir)
+    
+    if args.replay:
+        if cache is None:
+            print("--replay needs the page cache")
+            return
+        until = args.until.replace(hour=23, minute=59, second=59) if args.until else None
+        replay_cache(cache, args.snapshot_dir or REPLAY_DIR, since=args.since, until=until)
+        return
+    
     print("Fetching popular destinations from Aviasales...")
-    destinations = get_popular_destinations()
+    destinations = get_popular_destinations(args.url, use_browser=args.browser, cache=cache)
     
     if destinations:
         print(f"Found {len(destinations)} destination entries")
-        save_to_csv(destinations)
+        output_file = args.output or f'data/popular_destinations.{args.format}'
+        save_to_csv(destinations, output_file, file_format=args.format)
+        save_snapshot(destinations, root=args.snapshot_dir or SNAPSHOT_DIR)
     else:
         print("No destinations found")
 
@@ -0,0 +1,141 @@
+"""Файл для замеров времени и ресурсов по этапам сбора данных"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the process, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Metrics:
+    """Collects timed spans per pipeline phase
+
+    Every finished span is aggregated for the Prometheus text format and,
+    if a sink is configured, written to it as one JSON line.
+    """
+
+    def __init__(self):
+        self.sink = None
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def configure(self, path=None):
+        """Write JSON lines to path ('-' for stderr); None disables output"""
+        if self.sink not in (None, sys.stderr):
+            self.sink.close()
+        if path is None:
+            self.sink = None
+        elif path == '-':
+            self.sink = sys.stderr
+        else:
+            self.sink = open(path, 'a', encoding='utf-8', buffering=1)
+
+    @contextmanager
+    def span(self, phase, **fields):
+        """Time a phase; the yielded dict takes extra fields such as bytes or rows"""
+        record = {'phase': phase, **fields}
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield record
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            record['status'] = status
+            record['peak_rss_bytes'] = peak_rss_bytes()
+            self._record(record)
+
+    def _record(self, record):
+        with self._lock:
+            stats = self._phases.setdefault(record['phase'], {
+                'count': 0, 'errors': 0, 'seconds_sum': 0.0, 'last_seconds': 0.0, 'values': {}})
+            stats['count'] += 1
+            stats['errors'] += record['status'] == 'error'
+            stats['seconds_sum'] += record['seconds']
+            stats['last_seconds'] = record['seconds']
+            for key, value in record.items():
+                if key not in ('seconds', 'peak_rss_bytes') and isinstance(value, (int, float)) \
+                        and not isinstance(value, bool):
+                    stats['values'][key] = value
+            if self.sink is not None:
+                line = {'time': datetime.now(timezone.utc).isoformat(), **record}
+                self.sink.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+
+    def render_prometheus(self, prefix='scraper'):
+        """Return the aggregated spans in the Prometheus text exposition format"""
+        families = {
+            'phase_runs_total': 'counter',
+            'phase_errors_total': 'counter',
+            'phase_seconds_total': 'counter',
+            'phase_last_seconds': 'gauge',
+            'phase_last_value': 'gauge',
+        }
+        samples = {name: [] for name in families}
+        with self._lock:
+            for phase, stats in sorted(self._phases.items()):
+                label = f'phase="{phase}"'
+                samples['phase_runs_total'].append(f'{{{label}}} {stats["count"]}')
+                samples['phase_errors_total'].append(f'{{{label}}} {stats["errors"]}')
+                samples['phase_seconds_total'].append(f'{{{label}}} {stats["seconds_sum"]:.6f}')
+                samples['phase_last_seconds'].append(f'{{{label}}} {stats["last_seconds"]:.6f}')
+                for key, value in sorted(stats['values'].items()):
+                    samples['phase_last_value'].append(f'{{{label},field="{key}"}} {value}')
+        lines = []
+        for name, kind in families.items():
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            lines.extend(f'{prefix}_{name}{sample}' for sample in samples[name])
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append(f'# TYPE {prefix}_peak_rss_bytes gauge')
+            lines.append(f'{prefix}_peak_rss_bytes {peak}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Write the text format to a file, e.g. for the node_exporter textfile collector"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+
+    def serve(self, port, host='0.0.0.0'):
+        """Expose /metrics over HTTP from a background thread and return the server"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+metrics = Metrics()
+span = metrics.span
@@ -0,0 +1,93 @@
+"""Файл для хранения снимков (snapshots) цен в Parquet, разбитых по дате сбора"""
+
+import os
+import uuid
+from datetime import date, datetime, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = 'data/snapshots'
+PARTITION_KEY = 'capture_date'
+TIMESTAMP_COLUMN = 'captured_at'
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_KEY, pa.date32())]), flavor='hive')
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def write_snapshot(table, captured_at=None, root=SNAPSHOT_DIR, name=None):
+    """Append one capture to the store and return the written file path
+
+    table is a pyarrow Table, a pandas DataFrame or a list of row dicts.
+    Every call writes a new file into the capture_date=YYYY-MM-DD
+    partition, so earlier captures are never overwritten. With a name the
+    file is part-<name>.parquet and replaces an earlier file of that name,
+    so writing the same capture twice keeps one copy.
+    """
+    if isinstance(table, list):
+        table = pa.Table.from_pylist(table)
+    elif not isinstance(table, pa.Table):
+        table = pa.Table.from_pandas(table, preserve_index=False)
+    captured_at = captured_at or datetime.now(timezone.utc)
+    if captured_at.tzinfo is None:
+        captured_at = captured_at.replace(tzinfo=timezone.utc)
+
+    stamp = pa.array([captured_at] * table.num_rows, type=pa.timestamp('us', tz='UTC'))
+    if TIMESTAMP_COLUMN in table.column_names:
+        table = table.drop_columns([TIMESTAMP_COLUMN])
+    table = table.append_column(TIMESTAMP_COLUMN, stamp)
+
+    partition = os.path.join(root, f'{PARTITION_KEY}={captured_at.date().isoformat()}')
+    os.makedirs(partition, exist_ok=True)
+    if name is None:
+        file_name = f"part-{captured_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+    else:
+        file_name = f'part-{name}.parquet'
+    path = os.path.join(partition, file_name)
+    # readers of the store only ever see complete files
+    tmp_path = os.path.join(partition, f'.{file_name}.{uuid.uuid4().hex[:8]}.tmp')
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return path
+
+
+def snapshot_dataset(root=SNAPSHOT_DIR):
+    """Open the store as a pyarrow dataset with the capture_date partition"""
+    return ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+
+
+def read_snapshots(start=None, end=None, columns=None, filter=None, root=SNAPSHOT_DIR):
+    """Load captures between start and end (inclusive) as a pandas DataFrame
+
+    Partitions outside the date range are skipped without being opened,
+    only the requested columns are read, and filter (a pyarrow dataset
+    expression such as ds.field('price') < 20000) is pushed down to the
+    Parquet row groups.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"No snapshots found in {root}")
+    expression = filter
+    if start is not None:
+        bound = ds.field(PARTITION_KEY) >= _as_date(start)
+        expression = bound if expression is None else expression & bound
+    if end is not None:
+        bound = ds.field(PARTITION_KEY) <= _as_date(end)
+        expression = bound if expression is None else expression & bound
+    table = snapshot_dataset(root).to_table(columns=columns, filter=expression)
+    return table.to_pandas()
+
+
+def list_capture_dates(root=SNAPSHOT_DIR):
+    """Return the sorted capture dates present in the store"""
+    if not os.path.isdir(root):
+        return []
+    prefix = f'{PARTITION_KEY}='
+    return sorted(date.fromisoformat(name[len(prefix):])
+                  for name in os.listdir(root) if name.startswith(prefix))
@@ -0,0 +1,177 @@
+"""Файл для параллельного сбора цен по многим городам вылета и датам поездки
+
+Пример запуска из папки scripts:
+    python sweep.py --origins MOW LED SVX --windows 2025-04-30:2025-05-09 2025-06-12:2025-06-15
+"""
+
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+
+import pyarrow as pa
+import requests
+
+from cache import CACHE_DIR, PageCache
+from main import (BASE_URL, CSV_COLUMNS, OUTPUT_FORMATS, extract_destinations_data, fetch_page_source,
+                  flatten_destinations, make_session, write_table)
+from storage import write_snapshot
+
+URL_TEMPLATE = BASE_URL + '/?origin_iata={origin}&depart_date={depart_date}&return_date={return_date}'
+DEFAULT_WINDOWS = [('2025-04-30', '2025-05-09')]
+# Sweep tables have extra sweep_origin/window_* columns, so they get their own
+# store: mixed schemas in one dataset would break storage.read_snapshots
+SWEEP_SNAPSHOT_DIR = 'data/sweeps'
+SWEEP_COLUMNS = ['sweep_origin', 'window_start', 'window_end']
+
+
+class HostRateLimiter:
+    """Spaces out requests to the same host to at most rate per second"""
+
+    def __init__(self, rate=2.0):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def is_retryable(error):
+    """Connection errors, timeouts, 429 and 5xx are worth retrying; other 4xx are permanent"""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and (response.status_code == 429 or response.status_code >= 500)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def fetch_with_retries(url, limiter, retries=3, backoff=1.0, session=None):
+    """Fetch a page under the rate limit, retrying transient errors with exponential backoff
+
+    session must not retry on its own (see make_session(retries=0)), otherwise
+    its extra requests would bypass the rate limiter and this backoff.
+    """
+    session = session or make_session(retries=0)
+    for attempt in range(retries + 1):
+        limiter.wait(url)
+        try:
+            return fetch_page_source(url, session=session)
+        except requests.RequestException as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff * 2 ** attempt * (1 + random.random() / 2)
+            print(f"{url}: {e}; retrying in {delay:.1f} s")
+            time.sleep(delay)
+
+
+def build_tasks(origins, windows, url_template=URL_TEMPLATE):
+    """Return one (origin, depart_date, return_date, url) task per combination"""
+    return [(origin, depart, ret,
+             url_template.format(origin=origin, depart_date=depart, return_date=ret))
+            for origin in origins for depart, ret in windows]
+
+
+def run_sweep(origins, windows=DEFAULT_WINDOWS, url_template=URL_TEMPLATE, concurrency=4,
+              rate=2.0, retries=3, backoff=1.0, cache=None):
+    """Scrape every origin x window page concurrently and merge the results
+
+    Returns the merged Arrow table (with sweep_origin, window_start and
+    window_end columns) and a dict of run statistics.
+    """
+    limiter = HostRateLimiter(rate)
+    tasks = build_tasks(origins, windows, url_template)
+    tables = []
+    failed = 0
+    start = time.perf_counter()
+
+    # retries and backoff happen only in fetch_with_retries, under the rate limit
+    with make_session(retries=0, pool_maxsize=max(concurrency, 1)) as session, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(fetch_with_retries, task[3], limiter, retries, backoff, session): task
+                   for task in tasks}
+        for future in as_completed(futures):
+            origin, depart, ret, url = futures[future]
+            try:
+                page_source = future.result()
+            except requests.RequestException as e:
+                print(f"{url}: giving up ({e})")
+                failed += 1
+                continue
+            destinations = extract_destinations_data(page_source)
+            if cache is not None:
+                cache.put(url, page_source, destinations or None)
+            if not destinations:
+                failed += 1
+                continue
+            table = flatten_destinations(destinations)
+            n = table.num_rows
+            table = table.append_column('sweep_origin', pa.array([origin] * n, pa.string()))
+            table = table.append_column('window_start', pa.array([depart] * n, pa.string()))
+            table = table.append_column('window_end', pa.array([ret] * n, pa.string()))
+            tables.append(table)
+
+    elapsed = time.perf_counter() - start
+    merged = pa.concat_tables(tables) if tables else None
+    stats = {
+        'pages': len(tasks),
+        'failed': failed,
+        'rows': merged.num_rows if merged is not None else 0,
+        'seconds': round(elapsed, 3),
+        'pages_per_min': round(len(tasks) / elapsed * 60, 1) if elapsed else 0.0,
+    }
+    return merged, stats
+
+
+def _parse_window(value):
+    depart, _, ret = value.partition(':')
+    if not ret:
+        raise argparse.ArgumentTypeError("window must look like YYYY-MM-DD:YYYY-MM-DD")
+    return depart, ret
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep Aviasales over many origins and date windows")
+    parser.add_argument('--origins', nargs='+', required=True, help="origin IATA codes")
+    parser.add_argument('--windows', nargs='+', type=_parse_window, default=DEFAULT_WINDOWS,
+                        help="travel windows as DEPART:RETURN dates")
+    parser.add_argument('--url-template', default=URL_TEMPLATE,
+                        help="page URL with {origin}, {depart_date} and {return_date} fields")
+    parser.add_argument('--concurrency', type=int, default=4, help="parallel fetches")
+    parser.add_argument('--rate', type=float, default=2.0, help="requests per second per host")
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=1.0, help="first retry delay in seconds")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv')
+    parser.add_argument('--output', help="merged output file (default: data/sweep.<format>)")
+    parser.add_argument('--snapshot-dir', default=SWEEP_SNAPSHOT_DIR,
+                        help="snapshot store for sweep tables (kept apart from the main.py store)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = None if args.no_cache else PageCache(args.cache_dir)
+    table, stats = run_sweep(args.origins, args.windows, args.url_template, args.concurrency,
+                             args.rate, args.retries, args.backoff, cache)
+    print(f"Fetched {stats['pages'] - stats['failed']}/{stats['pages']} pages, {stats['rows']} rows "
+          f"in {stats['seconds']} s ({stats['pages_per_min']} pages/min)")
+    if table is None:
+        print("No destinations found")
+        return
+    output_file = args.output or f'data/sweep.{args.format}'
+    write_table(table, output_file, args.format, csv_columns=CSV_COLUMNS + SWEEP_COLUMNS)
+    print(f"Sweep saved to {output_file}")
+    print(f"Snapshot saved to {write_snapshot(table, root=args.snapshot_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""Файл с тестами модулей дашборда: результаты сверяются с тем же расчётом на обычном pandas"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'dashboards'))
+
+from datastore import DataStore
+from pipeline import Pipeline
+from price_index import PriceIndex
+from schema import CATEGORY_COLUMNS, CITY_TO_GEO_GROUP, DESTINATION_TO_REST, OTHER_GEO_GROUP
+
+ORIGINS = ['Москва', 'Казань', 'Сочи', 'Владивосток']
+DESTINATIONS = [('Стамбул', 'Турция', 'Пляжный'), ('Мале', 'Мальдивы', 'Пляжный'),
+                ('Токио', 'Япония', 'Экскурсионный'), ('Ереван', 'Армения', 'Экскурсионный')]
+
+
+def make_frame(rows, seed=0):
+    """Small final_dataframe-like table; a quarter of the prices repeat to check ties"""
+    rng = np.random.default_rng(seed)
+    destinations = [DESTINATIONS[i] for i in rng.integers(0, len(DESTINATIONS), rows)]
+    prices = rng.integers(3_000, 60_000, rows).astype('float64')
+    prices[rng.random(rows) < 0.25] = 15_000
+    prices[rng.random(rows) < 0.2] += 0.5
+    return pd.DataFrame({
+        'destination_city': [city for city, _, _ in destinations],
+        'destination_country': [country for _, country, _ in destinations],
+        'origin_name': rng.choice(ORIGINS, rows),
+        'price': prices,
+        'Type_of_rest': [rest for _, _, rest in destinations],
+    })
+
+
+COLUMNS = ['destination_city', 'destination_country', 'origin_name', 'price', 'Type_of_rest']
+
+
+def plain(df):
+    """Source columns with text as object and a fresh index, so categories compare with pd.read_csv"""
+    df = df[COLUMNS].astype({column: object for column in CATEGORY_COLUMNS})
+    return df.reset_index(drop=True)
+
+
+# PriceIndex
+def _mask(df, origin, rest_type):
+    mask = pd.Series(True, index=df.index)
+    if origin is not None:
+        mask &= df['origin_name'] == origin
+    if rest_type is not None:
+        mask &= df['Type_of_rest'] == rest_type
+    return mask
+
+
+KEYS = [(None, None), ('Москва', None), (None, 'Пляжный'), ('Казань', 'Экскурсионный'), ('Париж', None)]
+
+
+@pytest.mark.parametrize('origin, rest_type', KEYS)
+@pytest.mark.parametrize('budget', [2_000, 15_000, 15_000.5, 40_000, 100_000])
+def test_within_budget_matches_pandas(origin, rest_type, budget):
+    df = make_frame(300)
+    index = PriceIndex.build(df)
+
+    expected = df.index[_mask(df, origin, rest_type) & (df['price'] <= budget)].to_numpy()
+    np.testing.assert_array_equal(index.within_budget(origin, budget, rest_type), expected)
+
+
+@pytest.mark.parametrize('origin, rest_type', KEYS)
+@pytest.mark.parametrize('k', [1, 5, 50, 1000])
+def test_cheapest_matches_pandas(origin, rest_type, k):
+    df = make_frame(300)
+    index = PriceIndex.build(df)
+
+    # equal prices keep the row order, as a stable sort does
+    expected = df[_mask(df, origin, rest_type)].sort_values('price', kind='stable').index[:k].to_numpy()
+    np.testing.assert_array_equal(index.cheapest(origin, rest_type, k), expected)
+
+
+def test_extended_index_matches_a_rebuilt_one():
+    old, new = make_frame(200, seed=1), make_frame(80, seed=2)
+    index = PriceIndex.build(old)
+    extended = index.copy()
+    extended.extend(new)
+    df = pd.concat([old, new], ignore_index=True)
+
+    for origin, rest_type in KEYS:
+        expected = df.index[_mask(df, origin, rest_type) & (df['price'] <= 20_000)].to_numpy()
+        np.testing.assert_array_equal(extended.within_budget(origin, 20_000, rest_type), expected)
+        np.testing.assert_array_equal(extended.cheapest(origin, rest_type, 10),
+                                      PriceIndex.build(df).cheapest(origin, rest_type, 10))
+    # the copy did not change the original
+    assert index.size == len(old)
+    np.testing.assert_array_equal(index.cheapest(k=1000), PriceIndex.build(old).cheapest(k=1000))
+
+
+# DataStore
+@pytest.fixture(params=['in_memory', 'working_set'])
+def working_set_dir(request, tmp_path):
+    return str(tmp_path / 'working_set') if request.param == 'working_set' else None
+
+
+def test_datastore_reads_only_the_appended_tail(tmp_path, working_set_dir):
+    path = str(tmp_path / 'final_dataframe.csv')
+    first, second = make_frame(120, seed=1), make_frame(30, seed=2)
+    first.to_csv(path, index=False)
+    store = DataStore(path, working_set_dir=working_set_dir)
+    old = store.state
+    pd.testing.assert_frame_equal(plain(old.df), plain(pd.read_csv(path)))
+    expected_groups = first['origin_name'].map(CITY_TO_GEO_GROUP).fillna(OTHER_GEO_GROUP)
+    assert old.df['geo_group'].astype(object).tolist() == expected_groups.tolist()
+
+    # the last line is still being written: only the complete rows are read
+    lines = second.to_csv(index=False, header=False)
+    cut = lines.rindex('\n', 0, len(lines) - 1) + 1 + 5
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(lines[:cut])
+    assert store.refresh()
+    assert len(store.state.df) == len(first) + len(second) - 1
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(lines[cut:])
+    assert store.refresh()
+    assert not store.refresh()
+
+    state = store.state
+    assert state.version != old.version
+    pd.testing.assert_frame_equal(plain(state.df), plain(pd.read_csv(path)))
+    assert len(state.queries.rows_from_price(0)) == len(first) + len(second)
+    assert state.cube.total()['count'] == len(first) + len(second)
+    # sessions on the old version keep seeing the old rows
+    pd.testing.assert_frame_equal(plain(old.df), plain(first))
+    assert len(old.queries.rows_from_price(0)) == len(first)
+
+
+def test_datastore_reloads_a_rewritten_csv(tmp_path, working_set_dir):
+    path = str(tmp_path / 'final_dataframe.csv')
+    make_frame(100, seed=1).to_csv(path, index=False)
+    store = DataStore(path, working_set_dir=working_set_dir)
+    version = store.state.version
+
+    rewritten = make_frame(150, seed=3)
+    rewritten.to_csv(path, index=False)
+    assert store.refresh()
+
+    assert store.state.version != version
+    pd.testing.assert_frame_equal(plain(store.state.df), plain(rewritten))
+    expected = rewritten[rewritten['price'] >= 20_000]
+    pd.testing.assert_frame_equal(plain(store.state.queries.rows_from_price(20_000)),
+                                  plain(expected), check_index_type=False)
+
+
+# Pipeline
+def _write_parts(root, frames):
+    os.makedirs(root)
+    for i, df in enumerate(frames):
+        df.drop(columns='Type_of_rest').to_parquet(os.path.join(root, f'part_{i}.parquet'))
+
+
+def _expected_clean(frames, factor=1.5):
+    """The same load → validate → clean as pandas code over the whole data set"""
+    df = pd.concat(frames, ignore_index=True).drop(columns='Type_of_rest')
+    df = df[df['price'].gt(0) & df['origin_name'].ne('')]
+    q1, q3 = df['price'].quantile(0.25), df['price'].quantile(0.75)
+    iqr = q3 - q1
+    return df[df['price'].between(q1 - factor * iqr, q3 + factor * iqr)].reset_index(drop=True)
+
+
+def test_pipeline_drops_outliers_by_bounds_of_the_whole_data_set(tmp_path):
+    # each part alone has no outliers; together the expensive part is one
+    cheap, expensive = make_frame(200, seed=1), make_frame(20, seed=2)
+    expensive['price'] += 500_000
+    cheap.loc[3, 'price'] = -1
+    cheap.loc[4, 'origin_name'] = ''
+    _write_parts(str(tmp_path / 'src'), [cheap, expensive])
+    output = str(tmp_path / 'final_dataframe.csv')
+
+    report = Pipeline(str(tmp_path / 'src'), output, str(tmp_path / 'work'), chunk_rows=16,
+                      drop_outliers=True).run()
+
+    expected = _expected_clean([cheap, expensive])
+    published = pd.read_csv(output)
+    pd.testing.assert_frame_equal(published.drop(columns='Type_of_rest'), expected)
+    assert report['clean']['outliers'] == len(expensive)
+    assert published['Type_of_rest'].equals(published['destination_city'].map(DESTINATION_TO_REST))
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 1000])
+def test_pipeline_formats_each_price_on_its_own(tmp_path, chunk_rows):
+    df = make_frame(50, seed=4)
+    df.loc[0, 'price'] = 24150.5
+    df.loc[1, 'price'] = 21300
+    _write_parts(str(tmp_path / 'src'), [df])
+    output = str(tmp_path / 'final_dataframe.csv')
+
+    Pipeline(str(tmp_path / 'src'), output, str(tmp_path / 'work'), chunk_rows=chunk_rows).run()
+
+    prices = pd.read_csv(output, dtype={'price': str})['price']
+    expected = [str(int(p)) if p.is_integer() else str(p) for p in df['price']]
+    assert prices.tolist() == expected
@@ -0,0 +1,296 @@
+"""Файл с офлайн-тестами парсера: сохранённая страница, локальный HTTP-сервер, кэш и параллельный сбор"""
+
+import functools
+import glob
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+import drivers
+import main
+import sweep
+from cache import PageCache
+from storage import read_snapshots
+
+PAGES_DIR = os.path.join(os.path.dirname(__file__), 'pages')
+PAGE_NAME = 'popular_destinations.html'
+with open(os.path.join(PAGES_DIR, PAGE_NAME), encoding='utf-8') as f:
+    PAGE = f.read()
+PAGE_ROWS = 4
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, '.html': 'text/html; charset=utf-8'}
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def page_server(tmp_path_factory):
+    """Serve the saved pages (and an empty page) from a local http.server"""
+    root = tmp_path_factory.mktemp('site')
+    (root / PAGE_NAME).write_text(PAGE, encoding='utf-8')
+    (root / 'empty.html').write_text('<html><body>Загрузка...</body></html>', encoding='utf-8')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def no_browser(monkeypatch):
+    """Fail the test if the Selenium fallback is used; return the list of its calls otherwise"""
+    calls = []
+
+    def browser(url, *args, **kwargs):
+        calls.append(url)
+        return PAGE
+
+    monkeypatch.setattr(main, 'fetch_page_source_with_browser', browser)
+    return calls
+
+
+def test_find_json_value_decodes_only_the_value():
+    destinations = main.find_json_value(PAGE)
+    assert [d['destination_city']['name'] for d in destinations] == ['Стамбул', 'Мале', 'Токио {центр}']
+    assert destinations[0]['prices'][1]['price']['value'] == 24150.5
+
+
+def test_find_json_value_missing_key():
+    with pytest.raises(ValueError):
+        main.find_json_value('<html><script>{"other": []}</script></html>')
+
+
+def test_iter_json_array_matches_find_json_value():
+    assert list(main.iter_json_array(PAGE)) == main.find_json_value(PAGE)
+
+
+@pytest.mark.parametrize('html', [
+    '<html></html>',
+    '<script>{"popular_destinations": [{"broken": </script>',
+    '<script>{"popular_destinations": {"not": "a list"}}</script>',
+])
+def test_extract_destinations_data_bad_pages(html):
+    assert main.extract_destinations_data(html) == []
+
+
+def test_flatten_destinations():
+    table = main.flatten_destinations(main.extract_destinations_data(PAGE))
+    assert table.schema == main.FLAT_SCHEMA
+    assert table.num_rows == PAGE_ROWS
+    assert table.column('origin_name').to_pylist() == ['Москва', 'Казань', 'Санкт-Петербург', 'Владивосток']
+    assert table.column('price').to_pylist() == [21300, 24150.5, 48990, 35600]
+
+
+def test_http_first_path(page_server, no_browser, tmp_path):
+    url = f'{page_server}/{PAGE_NAME}'
+    cache = PageCache(str(tmp_path / 'cache'))
+
+    destinations = main.get_popular_destinations(url, cache=cache)
+
+    assert len(destinations) == 3
+    assert no_browser == []
+    [entry] = cache.entries()
+    assert entry['url'] == url
+    assert cache.load_page(entry['key']) == PAGE
+    assert cache.load_raw(entry['key']) == destinations
+
+
+def test_browser_fallback_when_data_is_missing(page_server, no_browser):
+    url = f'{page_server}/empty.html'
+    destinations = main.get_popular_destinations(url)
+    assert no_browser == [url]
+    assert len(destinations) == 3
+
+
+def test_browser_fallback_when_http_fails(page_server, no_browser):
+    url = f'{page_server}/missing.html'
+    assert len(main.get_popular_destinations(url)) == 3
+    assert no_browser == [url]
+
+
+def test_replay_cache_is_idempotent(tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    # the cache evicts pages older than its TTL, so fetch times are recent
+    fetched_at = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=1)
+    cache.put('https://www.aviasales.ru', PAGE, fetched_at=fetched_at)
+    cache.put('https://www.aviasales.ru', '<html></html>', fetched_at=fetched_at + timedelta(hours=1))
+    out = str(tmp_path / 'replay')
+
+    assert main.replay_cache(cache, out) == 1
+    assert main.replay_cache(cache, out) == 1
+
+    assert len(glob.glob(os.path.join(out, '*', '*.parquet'))) == 1
+    df = read_snapshots(root=out)
+    assert len(df) == PAGE_ROWS
+    assert df['captured_at'].unique().tolist() == [fetched_at]
+
+
+def test_replay_cache_filters_by_time(tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    for days in (9, 5, 1):
+        cache.put('https://www.aviasales.ru', PAGE, fetched_at=today - timedelta(days=days))
+    out = str(tmp_path / 'replay')
+
+    assert main.replay_cache(cache, out, since=today - timedelta(days=6)) == 2
+
+    captured = sorted(read_snapshots(root=out)['captured_at'].unique())
+    assert captured == [today - timedelta(days=5), today - timedelta(days=1)]
+
+
+def test_sweep_with_stubbed_fetch(monkeypatch, tmp_path):
+    fetched = []
+
+    def fetch(url, session=None, **kwargs):
+        fetched.append(url)
+        return PAGE
+
+    monkeypatch.setattr(sweep, 'fetch_page_source', fetch)
+    cache = PageCache(str(tmp_path / 'cache'))
+    windows = [('2025-05-01', '2025-05-09'), ('2025-06-12', '2025-06-15')]
+
+    table, stats = sweep.run_sweep(['MOW', 'LED'], windows, concurrency=2, rate=0, cache=cache)
+
+    assert sorted(fetched) == sorted(task[3] for task in sweep.build_tasks(['MOW', 'LED'], windows))
+    assert stats['pages'] == 4 and stats['failed'] == 0
+    assert table.num_rows == stats['rows'] == 4 * PAGE_ROWS
+    assert sorted(set(zip(table.column('sweep_origin').to_pylist(), table.column('window_start').to_pylist()))) == [
+        ('LED', '2025-05-01'), ('LED', '2025-06-12'), ('MOW', '2025-05-01'), ('MOW', '2025-06-12')]
+    assert len(cache.entries()) == 4
+
+
+def test_sweep_retries_then_gives_up(monkeypatch):
+    attempts = {}
+
+    def fetch(url, session=None, **kwargs):
+        attempts[url] = attempts.get(url, 0) + 1
+        if 'MOW' in url and attempts[url] < 3:
+            raise requests.ConnectionError('connection reset')
+        if 'LED' in url:
+            raise requests.HTTPError('503 Server Error', response=_response(503))
+        return PAGE
+
+    monkeypatch.setattr(sweep, 'fetch_page_source', fetch)
+    monkeypatch.setattr(sweep.time, 'sleep', lambda seconds: None)
+
+    table, stats = sweep.run_sweep(['MOW', 'LED'], concurrency=2, rate=0, retries=2, backoff=0)
+
+    assert sorted(attempts.values()) == [3, 3]
+    assert stats['failed'] == 1
+    assert table.num_rows == PAGE_ROWS
+
+
+def _response(status):
+    response = requests.Response()
+    response.status_code = status
+    return response
+
+
+@pytest.mark.parametrize('error, retried', [
+    (requests.ConnectionError('reset'), True),
+    (requests.Timeout('read timeout'), True),
+    (requests.HTTPError('429', response=_response(429)), True),
+    (requests.HTTPError('502', response=_response(502)), True),
+    (requests.HTTPError('404', response=_response(404)), False),
+    (requests.HTTPError('403', response=_response(403)), False),
+    (requests.TooManyRedirects('loop'), False),
+])
+def test_fetch_with_retries_retries_only_transient_errors(monkeypatch, error, retried):
+    calls = []
+
+    def fetch(url, session=None, **kwargs):
+        calls.append(url)
+        raise error
+
+    monkeypatch.setattr(sweep, 'fetch_page_source', fetch)
+    monkeypatch.setattr(sweep.time, 'sleep', lambda seconds: None)
+    with pytest.raises(type(error)):
+        sweep.fetch_with_retries('https://www.aviasales.ru', sweep.HostRateLimiter(0), retries=2, backoff=0)
+    assert len(calls) == (3 if retried else 1)
+
+
+def test_sweep_snapshots_go_to_their_own_store():
+    assert sweep.parse_args(['--origins', 'MOW']).snapshot_dir == sweep.SWEEP_SNAPSHOT_DIR != main.SNAPSHOT_DIR
+
+
+def test_host_rate_limiter_spaces_requests(monkeypatch):
+    now = [100.0]
+    slept = []
+    monkeypatch.setattr(sweep.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(sweep.time, 'sleep', slept.append)
+
+    limiter = sweep.HostRateLimiter(rate=4)
+    for _ in range(3):
+        limiter.wait('https://www.aviasales.ru/?origin_iata=MOW')
+    limiter.wait('https://example.com/')
+
+    assert slept == [0.25, 0.5]
+
+
+def test_sweep_session_does_not_retry_by_itself():
+    session = main.make_session(retries=0)
+    assert session.get_adapter('https://www.aviasales.ru').max_retries.total == 0
+    assert main.get_session().get_adapter('https://www.aviasales.ru').max_retries.total == 2
+
+
+def test_cache_stores_identical_pages_once(tmp_path):
+    cache = PageCache(str(tmp_path / 'cache'))
+    keys = {cache.put('https://www.aviasales.ru', PAGE) for _ in range(3)}
+    assert len(keys) == 1
+    assert len(cache.entries()) == 3
+    assert len(os.listdir(tmp_path / 'cache' / 'pages')) == 1
+    assert cache.load_raw(keys.pop()) is None
+
+
+def test_driver_report_offline_skips_the_manager(monkeypatch, tmp_path):
+    driver = tmp_path / 'chromedriver'
+    driver.write_text('#!/bin/sh\necho ChromeDriver 1.0\n')
+    driver.chmod(0o755)
+
+    def manager():
+        raise AssertionError('ChromeDriverManager must not be called offline')
+
+    monkeypatch.setattr(drivers, 'ChromeDriverManager', manager)
+    monkeypatch.setenv('CHROMEDRIVER_PATH', str(driver))
+
+    report = drivers.startup_report(offline=True, cache_file=str(tmp_path / 'driver.json'))
+
+    assert report['path'] == str(driver)
+    assert report['cold_seconds'] is None
+
+
+@pytest.mark.parametrize('evict_interval', [0, 3600])
+def test_cache_concurrent_puts_keep_every_entry(tmp_path, evict_interval):
+    cache = PageCache(str(tmp_path / 'cache'), evict_interval=evict_interval)
+    pages = [PAGE.replace('Стамбул', f'Стамбул {i}') for i in range(40)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        keys = list(pool.map(lambda page: cache.put('https://www.aviasales.ru', page), pages))
+
+    assert sorted(entry['key'] for entry in cache.entries()) == sorted(keys)
+    assert sorted(os.listdir(tmp_path / 'cache' / 'pages')) == sorted(f'{key}.html.gz' for key in keys)
+    assert [cache.load_page(key) for key in keys] == pages
+
+
+def test_save_to_csv_keeps_the_original_layout(tmp_path):
+    path = tmp_path / 'popular_destinations.csv'
+    main.save_to_csv(main.extract_destinations_data(PAGE), str(path))
+    assert path.read_text(encoding='utf-8').splitlines() == [
+        'destination_city,destination_country,origin_name,price',
+        'Стамбул,Турция,Москва,21300',
+        'Стамбул,Турция,Казань,24150.5',
+        'Мале,Мальдивы,Санкт-Петербург,48990',
+        'Токио {центр},Япония,Владивосток,35600',
+    ]